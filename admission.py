@@ -0,0 +1,245 @@
+import os
+import sys
+import math
+import time
+import sqlite3
+import threading
+
+import metrics
+from memory import memory_available
+from puzzle_builder import usable_cpus
+
+# --- Admission Control ---
+# Generation is CPU- and network-heavy, so each request reserves "cost units" before any work
+# starts: one unit per ADMISSION_UNIT_WORDS words requested. A request that doesn't fit is
+# turned away at once with a Retry-After instead of queueing behind the others until the
+# worker times out. Limits apply per worker process and across every worker sharing
+# ADMISSION_DB_PATH (a small SQLite table of in-flight leases). A busy worker whose memory is
+# already near MEMORY_CEILING_MB (see memory.py) takes nothing more until its jobs finish.
+# The defaults assume gthread workers (gunicorn.conf.py): a worker's capacity is its thread count,
+# and the group capacity follows the CPUs, since generation is CPU-bound; it only binds when
+# WEB_CONCURRENCY x GUNICORN_THREADS exceeds it (or for weighted requests).
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', '1') != '0'
+GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 4))
+ADMISSION_WORKER_CAPACITY = int(os.environ.get('ADMISSION_WORKER_CAPACITY', GUNICORN_THREADS)) # Units in flight in one worker
+ADMISSION_GROUP_CAPACITY = int(os.environ.get('ADMISSION_GROUP_CAPACITY', max(2, 2 * usable_cpus()))) # All workers; 0 = no group limit
+ADMISSION_CLIENT_CAPACITY = int(os.environ.get('ADMISSION_CLIENT_CAPACITY', 4)) # Units one client may hold across the group
+# Units only cost-1 requests may use, so a burst of large books can't lock out small ones
+ADMISSION_RESERVED_UNITS = int(os.environ.get('ADMISSION_RESERVED_UNITS', 1))
+ADMISSION_UNIT_WORDS = 500
+ADMISSION_DB_PATH = os.environ.get('ADMISSION_DB_PATH', os.path.join(os.getcwd(), 'cache', 'admission.sqlite3'))
+ADMISSION_LEASE_TTL = 600 # Seconds; leases older than this (e.g. from a killed worker) are ignored
+MAX_RETRY_AFTER = 30 # Seconds
+DEFAULT_UNIT_SECONDS = 2.0 # Retry-After estimate per unit until real durations are known
+
+
+def request_cost(word_count):
+    """Cost units for a generation: 1 for up to 499 words, then one more per 500."""
+    return 1 + int(word_count) // ADMISSION_UNIT_WORDS
+
+
+class Overloaded(Exception):
+    """Raised when a request can't be admitted; status is 429 (this client) or 503 (the server)."""
+
+    def __init__(self, status, reason, retry_after):
+        super().__init__(f"Server busy ({reason}); retry in {retry_after}s.")
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """Capacity held by one admitted request; release() is safe to call more than once."""
+    __slots__ = ('controller', 'cost', 'lease_id', 'started', 'released')
+
+    def __init__(self, controller, cost, lease_id):
+        self.controller = controller
+        self.cost = cost
+        self.lease_id = lease_id
+        self.started = time.monotonic()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class AdmissionController:
+    """Weighted in-flight limits for one worker process plus a shared SQLite lease table."""
+
+    def __init__(self, worker_capacity=ADMISSION_WORKER_CAPACITY, group_capacity=ADMISSION_GROUP_CAPACITY,
+                 client_capacity=ADMISSION_CLIENT_CAPACITY, reserved=ADMISSION_RESERVED_UNITS,
+                 path=ADMISSION_DB_PATH):
+        self.worker_capacity = worker_capacity
+        self.group_capacity = group_capacity
+        self.client_capacity = client_capacity
+        self.reserved = reserved
+        self.path = path
+        self.in_flight = 0
+        self.unit_seconds = DEFAULT_UNIT_SECONDS # Moving average of request seconds per unit
+        self.admitted = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._disk_ok = True
+
+    # --- SQLite Helpers ---
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            # Autocommit mode, so BEGIN IMMEDIATE below controls the write lock explicitly
+            conn = sqlite3.connect(self.path, timeout=2, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " pid INTEGER NOT NULL,"
+                " client TEXT NOT NULL,"
+                " cost INTEGER NOT NULL,"
+                " started_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _take_lease(self, cost, client):
+        """Checks the group and client limits and records a lease. Returns (lease_id, None) or (None, reason)."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM leases WHERE started_at < ?", (time.time() - ADMISSION_LEASE_TTL,))
+            for (pid,) in conn.execute("SELECT DISTINCT pid FROM leases").fetchall():
+                if pid != os.getpid() and not pid_alive(pid):
+                    conn.execute("DELETE FROM leases WHERE pid = ?", (pid,))
+            group_used, client_used = conn.execute(
+                "SELECT COALESCE(SUM(cost), 0), COALESCE(SUM(CASE WHEN client = ? THEN cost END), 0) FROM leases",
+                (client,)).fetchone()
+            if self.client_capacity and client_used and client_used + cost > self.client_capacity:
+                conn.execute("ROLLBACK")
+                return None, 'client'
+            if self.group_capacity and not self._fits(group_used, cost, self.group_capacity):
+                conn.execute("ROLLBACK")
+                return None, 'group'
+            lease_id = conn.execute("INSERT INTO leases (pid, client, cost, started_at) VALUES (?, ?, ?, ?)",
+                                    (os.getpid(), client, cost, time.time())).lastrowid
+            conn.execute("COMMIT")
+            return lease_id, None
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _drop_lease(self, lease_id):
+        self._connect().execute("DELETE FROM leases WHERE id = ?", (lease_id,))
+
+    def _disk_call(self, fn, *args):
+        """Runs a lease-table operation; if SQLite is unusable, only the per-worker limit applies."""
+        if not self._disk_ok:
+            return None
+        try:
+            return fn(*args)
+        except sqlite3.OperationalError as e:
+            # Locked databases are transient; admit on the worker limit alone for this call
+            print(f"⚠️ Admission lease table error: {e}", file=sys.stderr)
+            return None
+        except (sqlite3.DatabaseError, OSError) as e:
+            print(f"⚠️ Admission lease table disabled: {e}", file=sys.stderr)
+            self._disk_ok = False
+            return None
+
+    def _fits(self, used, cost, capacity):
+        # An idle worker/group always takes one request, however large; otherwise requests
+        # bigger than one unit must leave the reserved units free for small ones
+        if used == 0:
+            return True
+        limit = capacity if cost == 1 else capacity - self.reserved
+        return used + cost <= limit
+
+    # --- Public API ---
+
+    def retry_after(self, cost=1):
+        """Seconds a turned-away client should wait: the typical duration of the work in flight."""
+        with self._lock:
+            estimate = self.unit_seconds * max(cost, self.in_flight)
+        return max(1, min(MAX_RETRY_AFTER, math.ceil(estimate)))
+
+    def _reject(self, status, reason, cost):
+        with self._lock:
+            self.rejected += 1
+        metrics.ADMISSION_REJECTIONS.inc(reason=reason)
+        print(f"⚠️ Rejected request costing {cost} units ({reason} limit)", file=sys.stderr)
+        raise Overloaded(status, reason, self.retry_after(cost))
+
+    def acquire(self, cost, client=''):
+        """Reserves capacity for one request, or raises Overloaded. The caller must release the Ticket."""
+        cost = max(1, int(cost))
+        if not ADMISSION_ENABLED:
+            return Ticket(self, 0, None)
+        with self._lock:
+            fits = self._fits(self.in_flight, cost, self.worker_capacity)
+            if fits:
+                self.in_flight += cost
+        if not fits:
+            self._reject(503, 'worker', cost)
+        # An idle worker still takes a request, so memory that won't be returned can't lock it out
+        if fits and self.in_flight > cost and not memory_available():
+            with self._lock:
+                self.in_flight -= cost
+                # Another request may have published the gauge while this one's units were counted
+                metrics.ADMISSION_IN_FLIGHT.set(self.in_flight)
+            self._reject(503, 'memory', cost)
+
+        taken = self._disk_call(self._take_lease, cost, client)
+        lease_id, reason = taken if taken is not None else (None, None)
+        if reason is not None:
+            with self._lock:
+                self.in_flight -= cost
+                metrics.ADMISSION_IN_FLIGHT.set(self.in_flight)
+            self._reject(429 if reason == 'client' else 503, reason, cost)
+        with self._lock:
+            self.admitted += 1
+            metrics.ADMISSION_IN_FLIGHT.set(self.in_flight)
+        return Ticket(self, cost, lease_id)
+
+    def _release(self, ticket):
+        if not ticket.cost:
+            return
+        if ticket.lease_id is not None:
+            self._disk_call(self._drop_lease, ticket.lease_id)
+        elapsed = time.monotonic() - ticket.started
+        with self._lock:
+            self.in_flight -= ticket.cost
+            self.unit_seconds = 0.8 * self.unit_seconds + 0.2 * (elapsed / ticket.cost)
+            metrics.ADMISSION_IN_FLIGHT.set(self.in_flight)
+
+    def stats(self):
+        group_used = self._disk_call(
+            lambda: self._connect().execute("SELECT COALESCE(SUM(cost), 0) FROM leases").fetchone()[0])
+        with self._lock:
+            return {
+                'enabled': ADMISSION_ENABLED,
+                'worker_in_flight': self.in_flight,
+                'worker_capacity': self.worker_capacity,
+                'group_in_flight': group_used,
+                'group_capacity': self.group_capacity,
+                'client_capacity': self.client_capacity,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'seconds_per_unit': round(self.unit_seconds, 3),
+            }
+
+
+admission = AdmissionController()
@@ -1,8 +1,12 @@
 import os
+import re
 import random
 import string
+import tempfile
+import mimetypes
+import uuid
 # FIX 1: Added 'after_this_request' to the import list
-from flask import Flask, request, render_template_string, send_file, redirect, url_for, after_this_request
+from flask import Flask, request, render_template_string, send_file, redirect, url_for, after_this_request, jsonify, Response, stream_with_context
 import sys
 import time
 import traceback 
@@ -11,13 +15,31 @@ from reportlab.lib.units import inch
 # Import the generation function from the external script
 # We make the import non-fatal to allow the server to start and display the error message.
 try:
-    from generator import generate_word_search_pdf
+    from generator import generate_word_search_pdf, iter_word_search_data, export_word_search_data, EXPORT_FORMATS
+    from theme_cache import theme_cache
+    from puzzle_builder import PUZZLE_ENGINES, DEFAULT_PUZZLE_ENGINE, DIFFICULTY_LEVELS, DEFAULT_DIFFICULTY
+    from jobs import job_runner, job_store, STATUS_QUEUED, STATUS_DONE
+    from pdf_cache import pdf_cache, cache_key
+    from batch import load_manifest, run_batch_job
+    from provider_health import health_report
+    from generator import UPSTREAM_TIMEOUT, PageStyle, PAGE_LAYOUTS, DEFAULT_PAGE_LAYOUT
+    from fonts import available_fonts
+    from memory import LOW_MEMORY_MODE
+    import collection as collections_store
+    from admission import admission, request_cost, Overloaded
+    import metrics
 except ImportError as e:
+    Overloaded = None
     # Set a flag and store the error message if the import fails
     generate_word_search_pdf = None
+    theme_cache = None
+    metrics = None
     GENERATOR_IMPORT_ERROR = str(e)
 except Exception as e:
+    Overloaded = None
     generate_word_search_pdf = None
+    theme_cache = None
+    metrics = None
     GENERATOR_IMPORT_ERROR = f"An unexpected error occurred during generator load: {e}"
 
 # --- Configuration ---
@@ -25,6 +47,11 @@ app = Flask(__name__)
 # Create a temporary directory for PDF output
 TEMP_DIR = os.path.join(os.getcwd(), 'temp')
 os.makedirs(TEMP_DIR, exist_ok=True)
+# 'stream' renders into a spooled buffer and streams it (no temp files);
+# 'file' writes to TEMP_DIR and deletes the file after sending
+PDF_OUTPUT_MODE = os.environ.get('PDF_OUTPUT_MODE', 'stream')
+# Buffers larger than this spill to an anonymous (already unlinked) temp file
+PDF_SPOOL_MAX_BYTES = int(os.environ.get('PDF_SPOOL_MAX_BYTES', 16 * 1024 * 1024))
 
 # --- HTML Template (Embedded for simplicity) ---
 
@@ -102,6 +129,66 @@ HTML_TEMPLATE = """
                     <p class="mt-1 text-xs text-gray-500">Physical paper size of the output PDF.</p>
                 </div>
 
+                <div>
+                    <label for="engine" class="block text-sm font-medium text-gray-700">Puzzle Engine</label>
+                    <select name="engine" id="engine"
+                        class="mt-1 block w-full rounded-md border-gray-300 shadow-sm focus:border-indigo-500 focus:ring-indigo-500 p-3 border appearance-none bg-white">
+                        <option value="library" {% if default_params.engine == 'library' %}selected{% endif %}>Standard (word_search_generator)</option>
+                        <option value="native" {% if default_params.engine == 'native' %}selected{% endif %}>Fast (built-in)</option>
+                    </select>
+                    <p class="mt-1 text-xs text-gray-500">The built-in engine drops a word that won't fit instead of skipping the puzzle.</p>
+                </div>
+
+                <div>
+                    <label for="layout" class="block text-sm font-medium text-gray-700">Page Layout</label>
+                    <select name="layout" id="layout"
+                        class="mt-1 block w-full rounded-md border-gray-300 shadow-sm focus:border-indigo-500 focus:ring-indigo-500 p-3 border appearance-none bg-white">
+                        <option value="single" {% if default_params.layout == 'single' %}selected{% endif %}>One puzzle / answer key per page</option>
+                        <option value="compact-keys" {% if default_params.layout == 'compact-keys' %}selected{% endif %}>Several answer keys per page</option>
+                        <option value="compact" {% if default_params.layout == 'compact' %}selected{% endif %}>Several answer keys and small puzzles per page</option>
+                    </select>
+                    <p class="mt-1 text-xs text-gray-500">Compact layouts cut the page count of large books; puzzles are only grouped when they fit at full size.</p>
+                </div>
+
+                <div>
+                    <label for="difficulty" class="block text-sm font-medium text-gray-700">Difficulty</label>
+                    <select name="difficulty" id="difficulty"
+                        class="mt-1 block w-full rounded-md border-gray-300 shadow-sm focus:border-indigo-500 focus:ring-indigo-500 p-3 border appearance-none bg-white">
+                        <option value="easy" {% if default_params.difficulty == 'easy' %}selected{% endif %}>Easy (across and down)</option>
+                        <option value="medium" {% if default_params.difficulty == 'medium' %}selected{% endif %}>Medium (adds diagonals)</option>
+                        <option value="hard" {% if default_params.difficulty == 'hard' %}selected{% endif %}>Hard (all directions, including backwards)</option>
+                    </select>
+                    <p class="mt-1 text-xs text-gray-500">Every word appears exactly once in its grid at any difficulty.</p>
+                </div>
+
+                <div>
+                    <label for="output" class="block text-sm font-medium text-gray-700">Output</label>
+                    <select name="output" id="output"
+                        class="mt-1 block w-full rounded-md border-gray-300 shadow-sm focus:border-indigo-500 focus:ring-indigo-500 p-3 border appearance-none bg-white">
+                        <option value="pdf" {% if default_params.output != 'jsonl' and default_params.output != 'csv' %}selected{% endif %}>PDF book</option>
+                        <option value="jsonl" {% if default_params.output == 'jsonl' %}selected{% endif %}>Data: JSON Lines</option>
+                        <option value="csv" {% if default_params.output == 'csv' %}selected{% endif %}>Data: CSV</option>
+                    </select>
+                    <p class="mt-1 text-xs text-gray-500">Data exports contain grids, word lists and answer positions, without the PDF.</p>
+                </div>
+
+                <div>
+                    <label for="seed" class="block text-sm font-medium text-gray-700">Seed (Optional)</label>
+                    <input type="text" name="seed" id="seed" maxlength="64"
+                        value="{{ default_params.seed or '' }}"
+                        placeholder="e.g., 2024-spring"
+                        class="mt-1 block w-full rounded-md border-gray-300 shadow-sm focus:border-indigo-500 focus:ring-indigo-500 p-3 border">
+                    <p class="mt-1 text-xs text-gray-500">Same seed and settings produce the same book, served instantly from cache.</p>
+                </div>
+
+                <div class="md:col-span-2">
+                    <label for="background" class="inline-flex items-center text-sm text-gray-700">
+                        <input type="checkbox" name="background" id="background" class="rounded border-gray-300 text-indigo-600 mr-2">
+                        Run in the background (recommended for large collections)
+                    </label>
+                    <p id="job-status" class="mt-2 text-sm text-indigo-700" style="display:none;"></p>
+                </div>
+
                 <div class="md:col-span-2 mt-4">
                     <button type="submit" {% if generator_missing %}disabled{% endif %}
                         class="w-full flex justify-center py-3 px-4 border border-transparent rounded-md shadow-lg text-lg font-medium text-white bg-indigo-600 hover:bg-indigo-700 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-indigo-500 transition duration-150 ease-in-out transform hover:scale-105 {% if generator_missing %}opacity-50 cursor-not-allowed{% endif %}">
@@ -127,18 +214,182 @@ HTML_TEMPLATE = """
         const button = form.querySelector('button');
         const spinner = document.getElementById('spinner');
 
-        form.addEventListener('submit', () => {
+        const jobStatus = document.getElementById('job-status');
+        const buttonHtml = button.innerHTML;
+
+        form.addEventListener('submit', (event) => {
+            const background = document.getElementById('background').checked;
+            if (background) {
+                // Job mode: queue the work and poll instead of holding the request open
+                event.preventDefault();
+                runJob();
+            }
             button.disabled = true;
             button.classList.add('bg-indigo-400');
             // Show the spinner and update text
             spinner.style.display = 'inline';
-            button.innerHTML = '<svg class="animate-spin -ml-1 mr-3 h-5 w-5 text-white" fill="none" viewBox="0 0 24 24"><circle class="opacity-25" cx="12" cy="12" r="10" stroke="currentColor" stroke-width="4"></circle><path class="opacity-75" fill="currentColor" d="M4 12a8 8 0 018-8V0C5.373 0 0 5.373 0 12h4zm2 5.291A7.962 7.962 0 014 12H0c0 3.042 1.135 5.824 3 7.938l3-2.647z"></path></svg> Generating... Please Wait (up to 30s)';
+            button.innerHTML = '<svg class="animate-spin -ml-1 mr-3 h-5 w-5 text-white" fill="none" viewBox="0 0 24 24"><circle class="opacity-25" cx="12" cy="12" r="10" stroke="currentColor" stroke-width="4"></circle><path class="opacity-75" fill="currentColor" d="M4 12a8 8 0 018-8V0C5.373 0 0 5.373 0 12h4zm2 5.291A7.962 7.962 0 014 12H0c0 3.042 1.135 5.824 3 7.938l3-2.647z"></path></svg> ' + (background ? 'Queued...' : 'Generating... Please Wait (up to 30s)');
         });
+
+        function resetButton() {
+            button.disabled = false;
+            button.classList.remove('bg-indigo-400');
+            button.innerHTML = buttonHtml;
+        }
+
+        function describe(progress) {
+            const parts = [];
+            if (progress.words_fetched !== undefined) parts.push(`${progress.words_fetched} words fetched`);
+            if (progress.puzzles_total) parts.push(`${progress.puzzles_built || 0}/${progress.puzzles_total} puzzles built`);
+            if (progress.pages_total) parts.push(`${progress.pages_rendered || 0}/${progress.pages_total} pages rendered`);
+            return parts.join(', ');
+        }
+
+        async function runJob() {
+            jobStatus.style.display = 'block';
+            jobStatus.textContent = 'Submitting job...';
+            const response = await fetch('/jobs', { method: 'POST', body: new FormData(form) });
+            const job = await response.json();
+            if (!response.ok) {
+                jobStatus.textContent = `Error: ${job.error}`;
+                resetButton();
+                return;
+            }
+            while (true) {
+                await new Promise(resolve => setTimeout(resolve, 1000));
+                const status = await (await fetch(job.status_url)).json();
+                jobStatus.textContent = `Job ${status.status}: ${describe(status.progress)}`;
+                if (status.status === 'done') {
+                    window.location = status.download_url;
+                    break;
+                }
+                if (status.status === 'failed' || status.error) {
+                    jobStatus.textContent = `Generation failed: ${status.error}`;
+                    break;
+                }
+            }
+            resetButton();
+        }
     </script>
 </body>
 </html>
 """
 
+# --- Request Helpers ---
+
+def request_fields():
+    """The request's fields: a JSON object body, else the form. Raises ValueError for any other JSON body."""
+    if request.is_json:
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object.")
+        return body
+    return request.form
+
+def text_field(form, name, default=None):
+    """A string field (JSON numbers are accepted as text); raises ValueError for lists, objects, etc."""
+    value = form.get(name, default)
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise ValueError(f"{name} must be a string.")
+
+def int_field(form, name, default):
+    """A whole-number field given as a number or a numeric string; raises ValueError otherwise."""
+    value = form.get(name, default)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lstrip('-').isdigit():
+        return int(value)
+    raise ValueError(f"{name} must be a whole number.")
+
+def parse_generation_params(form):
+    """Validates the form (or JSON object) fields and returns generate_word_search_pdf keyword arguments."""
+    themes = text_field(form, 'themes', 'random').strip()
+    word_count = int_field(form, 'word_count', 100)
+    size = int_field(form, 'size', 15)
+    page_size_str = text_field(form, 'page_size', 'letter')
+    engine = text_field(form, 'engine', DEFAULT_PUZZLE_ENGINE)
+    seed = (text_field(form, 'seed') or '').strip() or None
+    layout = text_field(form, 'layout') or DEFAULT_PAGE_LAYOUT
+    difficulty = text_field(form, 'difficulty') or DEFAULT_DIFFICULTY
+    
+    if not themes:
+        raise ValueError("Themes field cannot be empty.")
+    if not (10 <= size <= 25):
+        raise ValueError("Puzzle size must be between 10 and 25.")
+    if not (20 <= word_count <= 2000):
+        raise ValueError("Word count must be between 20 and 2000.")
+    if engine not in PUZZLE_ENGINES:
+        raise ValueError(f"Puzzle engine must be one of: {', '.join(PUZZLE_ENGINES)}.")
+    if seed is not None and len(seed) > 64:
+        raise ValueError("Seed must be at most 64 characters.")
+    if layout not in PAGE_LAYOUTS:
+        raise ValueError(f"Page layout must be one of: {', '.join(PAGE_LAYOUTS)}.")
+    if difficulty not in DIFFICULTY_LEVELS:
+        raise ValueError(f"Difficulty must be one of: {', '.join(DIFFICULTY_LEVELS)}.")
+
+    return {
+        'width': size,
+        'height': size,
+        'themes': themes,
+        'word_count': word_count,
+        'page_size_str': page_size_str,
+        'engine': engine,
+        'seed': seed,
+        'layout': layout,
+        'difficulty': difficulty,
+    }
+
+def make_download_name(themes, session_id=None, extension='pdf'):
+    """Builds a unique, filesystem-safe download filename from the first theme."""
+    session_id = session_id or ''.join(random.choices(string.ascii_letters + string.digits, k=10))
+    # Sanitize themes for filename
+    safe_theme = "".join(c for c in themes.split(',')[0].strip() if c.isalnum()).lower()
+    return f"word_search_collection_{safe_theme or 'puzzles'}_{session_id}.{extension}"
+
+def parse_output_format(form):
+    """Returns 'pdf' or one of the data export formats (jsonl, csv)."""
+    fmt = (text_field(form, 'output') or text_field(form, 'format') or 'pdf').lower()
+    if fmt != 'pdf' and fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Output must be 'pdf' or one of: {', '.join(EXPORT_FORMATS)}.")
+    return fmt
+
+def stream_export(params, fmt):
+    """Streams puzzles as JSON Lines/CSV while they are built; no PDF is rendered."""
+    chunks = iter_word_search_data(fmt=fmt, **params)
+    response = Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f"attachment; filename={make_download_name(params['themes'], extension=fmt)}"
+    return response
+
+def pdf_buffer():
+    """Buffer for one streamed PDF: in memory up to PDF_SPOOL_MAX_BYTES, or on disk from the start in LOW_MEMORY_MODE."""
+    if LOW_MEMORY_MODE:
+        return tempfile.TemporaryFile()
+    return tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_BYTES)
+
+def admit(params):
+    """Reserves capacity for one generation (larger word counts cost more); raises Overloaded when full."""
+    # access_route starts with the X-Forwarded-For client when behind the platform's proxy
+    client = request.access_route[0] if request.access_route else ''
+    return admission.acquire(request_cost(params['word_count']), client)
+
+def overloaded_response(e, html=False):
+    """429/503 with Retry-After, as the form page for browser posts or JSON for API clients."""
+    message = f"The server is busy. Please try again in {e.retry_after} seconds."
+    if html:
+        response = app.make_response((render_template_string(
+            HTML_TEMPLATE, default_params=request.form.to_dict(), error_message=message), e.status))
+    else:
+        response = jsonify({'error': message, 'reason': e.reason, 'retry_after': e.retry_after})
+        response.status_code = e.status
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+if Overloaded is not None:
+    app.register_error_handler(Overloaded, overloaded_response)
+
 # --- Flask Routes ---
 
 @app.route('/')
@@ -148,7 +399,10 @@ def index():
         'themes': 'animals, space, food',
         'word_count': 100,
         'size': 15,
-        'page_size': 'letter'
+        'page_size': 'letter',
+        'engine': DEFAULT_PUZZLE_ENGINE if generate_word_search_pdf else 'library',
+        'layout': DEFAULT_PAGE_LAYOUT if generate_word_search_pdf else 'single',
+        'difficulty': DEFAULT_DIFFICULTY if generate_word_search_pdf else 'hard'
     }
     
     # Check if the generator failed to load
@@ -170,38 +424,56 @@ def generate():
         return render_template_string(HTML_TEMPLATE, default_params=request.form.to_dict(), error_message=error_msg), 500
 
     final_pdf_path = "" # Initialize here for cleanup in the final except block
+    ticket = None # Admission capacity held while this request generates
+
+    # Optional Server-Timing header with per-stage durations for this request
+    trace = metrics.start_trace() if metrics.METRICS_RESPONSE_HEADER else None
+    if trace is not None:
+        @after_this_request
+        def add_server_timing(response):
+            response.headers['Server-Timing'] = trace.server_timing()
+            return response
 
     try:
         # 1. Parse and Validate Parameters
-        themes = request.form.get('themes', 'random').strip()
-        word_count = int(request.form.get('word_count', 100))
-        size = int(request.form.get('size', 15))
-        page_size_str = request.form.get('page_size', 'letter')
-        
-        if not themes:
-            raise ValueError("Themes field cannot be empty.")
-        if not (10 <= size <= 25):
-            raise ValueError("Puzzle size must be between 10 and 25.")
-        if not (20 <= word_count <= 2000):
-            raise ValueError("Word count must be between 20 and 2000.")
+        params = parse_generation_params(request.form)
+        output_format = parse_output_format(request.form)
+
+        # Data-only export: grids, word lists and key placements, skipping the PDF renderer
+        if output_format != 'pdf':
+            ticket = admit(params)
+            response = stream_export(params, output_format)
+            # Puzzles are built while the response streams, so hold the capacity until it closes
+            response.call_on_close(ticket.release)
+            ticket = None
+            metrics.GENERATIONS.inc(outcome='ok')
+            return response
+
+        # Deterministic mode: serve (or fill) the content-addressed cache, then redirect to a
+        # cacheable GET URL so browsers and proxies can revalidate with If-None-Match
+        if params['seed'] is not None:
+            key = cache_key(params)
+            if pdf_cache.get(key) is None:
+                ticket = admit(params)
+                pdf_cache.put(key, lambda tmp_path: generate_word_search_pdf(output_path=tmp_path, **params))
+            else:
+                print(f"✅ Serving cached PDF {key}", file=sys.stderr)
+            return redirect(url_for('cached_pdf', key=key, filename=make_download_name(params['themes'], key[:10])), 303)
 
         # 2. Generate Unique Filename and Output Path
-        session_id = ''.join(random.choices(string.ascii_letters + string.digits, k=10))
-        # Sanitize themes for filename
-        safe_theme = "".join(c for c in themes.split(',')[0].strip() if c.isalnum()).lower()
-        output_filename = f"word_search_collection_{safe_theme or 'puzzles'}_{session_id}.pdf"
+        output_filename = make_download_name(params['themes'])
+        ticket = admit(params)
+
+        if PDF_OUTPUT_MODE == 'stream':
+            response = stream_pdf(params, output_filename)
+            metrics.GENERATIONS.inc(outcome='ok')
+            return response
+
         output_path = os.path.join(TEMP_DIR, output_filename)
         
         # 3. Execute the Python Puzzle Script
         # The core call to your generator script
-        final_pdf_path = generate_word_search_pdf(
-            width=size,
-            height=size,
-            themes=themes,
-            word_count=word_count,
-            page_size_str=page_size_str,
-            output_path=output_path
-        )
+        final_pdf_path = generate_word_search_pdf(output_path=output_path, **params)
         
         # FIX 2: Corrected the decorator usage to use the imported function, not an app attribute.
         @after_this_request
@@ -217,6 +489,7 @@ def generate():
 
         # 4. Serve the File to the User
         # Returning this response stops the spinner and initiates the download
+        metrics.GENERATIONS.inc(outcome='ok')
         return send_file(
             final_pdf_path, 
             mimetype='application/pdf', 
@@ -224,13 +497,19 @@ def generate():
             download_name=output_filename
         )
 
+    except Overloaded as e:
+        metrics.GENERATIONS.inc(outcome='rejected')
+        return overloaded_response(e, html=True)
+
     except ValueError as e:
+        metrics.GENERATIONS.inc(outcome='invalid')
         # Re-render the form with user's inputs and an error message
         default_params = request.form.to_dict()
         return render_template_string(HTML_TEMPLATE, default_params=default_params, error_message=str(e)), 400
 
     except Exception as e:
         # General Server/Generation Errors
+        metrics.GENERATIONS.inc(outcome='error')
         
         # Capture the full traceback and print it to standard error (which Render logs)
         error_trace = traceback.format_exc()
@@ -249,7 +528,321 @@ def generate():
         error_msg = f"Generation failed due to a server error. Please check your themes. Error: {type(e).__name__}: {e}"
         
         return render_template_string(HTML_TEMPLATE, default_params=request.form.to_dict(), error_message=error_msg), 500
+
+    finally:
+        if ticket is not None:
+            ticket.release()
+        metrics.end_trace(trace)
         
+def stream_pdf(params, download_name):
+    """Renders into a spooled buffer and streams it, so nothing is left behind in TEMP_DIR."""
+    buffer = pdf_buffer()
+    try:
+        generate_word_search_pdf(output_path=buffer, **params)
+    except BaseException:
+        buffer.close()
+        raise
+    size = buffer.tell()
+    buffer.seek(0)
+    # send_file wraps the buffer and streams it in chunks; the response closes it when done
+    response = send_file(buffer, mimetype='application/pdf', as_attachment=True, download_name=download_name)
+    response.content_length = size
+    return response
+
+# --- Background Job Routes ---
+
+def _job_urls(job_id):
+    return {
+        'status_url': url_for('job_status', job_id=job_id),
+        'download_url': url_for('job_download', job_id=job_id),
+    }
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Queues a generation job and returns its ID immediately (202)."""
+    if generate_word_search_pdf is None:
+        return jsonify({'error': globals().get('GENERATOR_IMPORT_ERROR', 'Unknown load failure.')}), 500
+
+    try:
+        form = request_fields()
+        params = parse_generation_params(form)
+        output_format = parse_output_format(form)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if output_format == 'pdf':
+        job_id = job_runner.submit(generate_word_search_pdf, params, make_download_name(params['themes']))
+    else:
+        job_id = job_runner.submit(export_word_search_data, {**params, 'fmt': output_format},
+                                   make_download_name(params['themes'], extension=output_format))
+    return jsonify({'job_id': job_id, 'status': STATUS_QUEUED, **_job_urls(job_id)}), 202
+
+@app.route('/export', methods=['POST'])
+def export_data():
+    """Streams a collection as JSON Lines or CSV (format=jsonl|csv) for preview/checking services."""
+    if generate_word_search_pdf is None:
+        return jsonify({'error': globals().get('GENERATOR_IMPORT_ERROR', 'Unknown load failure.')}), 500
+
+    try:
+        form = request_fields()
+        params = parse_generation_params(form)
+        output_format = (text_field(form, 'format') or 'jsonl').lower()
+        if output_format not in EXPORT_FORMATS:
+            raise ValueError(f"Export format must be one of: {', '.join(EXPORT_FORMATS)}.")
+        ticket = admit(params)
+        try:
+            response = stream_export(params, output_format)
+        except BaseException:
+            ticket.release()
+            raise
+        response.call_on_close(ticket.release)
+        return response
+    except Overloaded as e:
+        return overloaded_response(e)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(traceback.format_exc(), file=sys.stderr)
+        return jsonify({'error': f"{type(e).__name__}: {e}"}), 500
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Reports a job's status and progress counters."""
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job.'}), 404
+    return jsonify({
+        'job_id': job_id,
+        'status': job['status'],
+        'progress': job['progress'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'finished_at': job['finished_at'],
+        **_job_urls(job_id),
+    })
+
+@app.route('/jobs/<job_id>/download')
+def job_download(job_id):
+    """Serves a finished job's PDF. Files are kept until the retention window expires."""
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job.'}), 404
+    if job['status'] != STATUS_DONE:
+        return jsonify({'error': f"Job is {job['status']}.", 'status': job['status']}), 409
+    if not job['output_path'] or not os.path.exists(job['output_path']):
+        return jsonify({'error': 'The PDF for this job is no longer available.'}), 410
+    return send_file(
+        job['output_path'],
+        mimetype=mimetypes.guess_type(job['download_name'])[0] or 'application/octet-stream',
+        as_attachment=True,
+        download_name=job['download_name']
+    )
+
+@app.route('/batch', methods=['POST'])
+def create_batch():
+    """Queues a multi-book batch from a JSON manifest; the job's download is a ZIP of PDFs + summary.json."""
+    if generate_word_search_pdf is None:
+        return jsonify({'error': globals().get('GENERATOR_IMPORT_ERROR', 'Unknown load failure.')}), 500
+
+    manifest = request.get_json(silent=True)
+    if manifest is None:
+        return jsonify({'error': 'Expected a JSON manifest body.'}), 400
+    try:
+        books = load_manifest(manifest)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    session_id = ''.join(random.choices(string.ascii_letters + string.digits, k=10))
+    job_id = job_runner.submit(run_batch_job, {'books': books}, f"word_search_batch_{session_id}.zip")
+    return jsonify({'job_id': job_id, 'status': STATUS_QUEUED, 'books': len(books), **_job_urls(job_id)}), 202
+
+@app.route('/pdf/<key>/<filename>')
+def cached_pdf(key, filename):
+    """Serves a seeded PDF from the content-addressed cache with ETag/conditional-GET support."""
+    if not re.fullmatch(r'[0-9a-f]{64}', key):
+        return "Not found.", 404
+    path = pdf_cache.get(key)
+    if path is None:
+        return "This PDF is no longer cached. Please generate it again.", 404
+    return send_file(
+        path,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=filename,
+        etag=key,
+        conditional=True,
+        max_age=86400
+    )
+
+# --- Saved Collection Routes ---
+# A saved collection keeps the built puzzles, so re-rendering with another page size, title
+# theme or fonts (or swapping one puzzle) skips fetching and building. See collection.py.
+STYLE_FONT_SIZE_RANGE = (6, 36)
+
+def _load_saved_collection(collection_id):
+    """Returns the collection, or None for an unknown/malformed ID."""
+    if not re.fullmatch(r'[0-9a-f]{32}', collection_id):
+        return None
+    try:
+        return collections_store.load_collection(collections_store.collection_path(collection_id))
+    except FileNotFoundError:
+        return None
+
+def _collection_summary(collection_id, saved):
+    return {
+        'collection_id': collection_id,
+        **{k: v for k, v in saved.meta.items() if k not in ('format', 'version')},
+        'puzzles': [{'puzzle': p['puzzle'].index, 'words': p['words']} for p in saved.puzzles],
+        'pdf_url': url_for('collection_pdf', collection_id=collection_id),
+    }
+
+def parse_style(args):
+    """PageStyle from query/form fields (grid_font, grid_font_size, ...), or None when none are given."""
+    fields = {}
+    for name in PageStyle.__slots__:
+        value = str(args.get(name) or '').strip()
+        if not value:
+            continue
+        if name.endswith('_size'):
+            if not value.isdigit():
+                raise ValueError(f"{name} must be a whole number.")
+            value = int(value)
+            low, high = STYLE_FONT_SIZE_RANGE
+            if not low <= value <= high:
+                raise ValueError(f"{name} must be between {low} and {high}.")
+        fields[name] = value
+    return PageStyle(**fields) if fields else None
+
+@app.route('/collections', methods=['POST'])
+def create_collection():
+    """Fetches words, builds the puzzles and saves them as a collection that can be re-rendered later."""
+    if generate_word_search_pdf is None:
+        return jsonify({'error': globals().get('GENERATOR_IMPORT_ERROR', 'Unknown load failure.')}), 500
+
+    try:
+        params = parse_generation_params(request_fields())
+        ticket = admit(params)
+        try:
+            saved = collections_store.create_collection(params['themes'], params['width'], params['word_count'],
+                                                        engine=params['engine'], seed=params['seed'],
+                                                        page_size_str=params['page_size_str'],
+                                                        layout=params['layout'], difficulty=params['difficulty'])
+        finally:
+            ticket.release()
+    except Overloaded as e:
+        return overloaded_response(e)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(traceback.format_exc(), file=sys.stderr)
+        return jsonify({'error': f"{type(e).__name__}: {e}"}), 500
+
+    collection_id = uuid.uuid4().hex
+    collections_store.save_collection(saved, collections_store.collection_path(collection_id))
+    return jsonify(_collection_summary(collection_id, saved)), 201
+
+@app.route('/collections/<collection_id>')
+def collection_info(collection_id):
+    saved = _load_saved_collection(collection_id)
+    if saved is None:
+        return jsonify({'error': 'Unknown collection.'}), 404
+    return jsonify(_collection_summary(collection_id, saved))
+
+@app.route('/collections/<collection_id>/pdf')
+def collection_pdf(collection_id):
+    """Renders a saved collection; page_size, layout, theme and font fields override its saved settings."""
+    saved = _load_saved_collection(collection_id)
+    if saved is None:
+        return jsonify({'error': 'Unknown collection.'}), 404
+    ticket = admission.acquire(1, request.access_route[0] if request.access_route else '') # Rendering only
+    try:
+        # Opening the buffer can fail too (e.g. a full TMPDIR in LOW_MEMORY_MODE); the ticket still goes back
+        buffer = pdf_buffer()
+        try:
+            collections_store.render_collection(saved, buffer, page_size_str=request.args.get('page_size') or None,
+                                                theme=str(request.args.get('theme') or '').strip() or None,
+                                                layout=request.args.get('layout') or None,
+                                                style=parse_style(request.args))
+        except ValueError as e:
+            buffer.close()
+            return jsonify({'error': str(e)}), 400
+        except BaseException:
+            buffer.close()
+            raise
+    finally:
+        ticket.release()
+    size = buffer.tell()
+    buffer.seek(0)
+    download_name = make_download_name(saved.meta['themes'], session_id=collection_id[:10])
+    response = send_file(buffer, mimetype='application/pdf', as_attachment=True, download_name=download_name)
+    response.content_length = size
+    return response
+
+@app.route('/collections/<collection_id>/puzzles/<int:number>', methods=['POST'])
+def replace_collection_puzzle(collection_id, number):
+    """Rebuilds one puzzle from new words (words=A,B,... or a JSON list) or re-lays out its current words."""
+    if _load_saved_collection(collection_id) is None:
+        return jsonify({'error': 'Unknown collection.'}), 404
+    try:
+        form = request_fields()
+        words = form.get('words')
+        if isinstance(words, str):
+            words = words.split(',')
+        seed = (text_field(form, 'seed') or '').strip() or None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    ticket = admission.acquire(1, request.access_route[0] if request.access_route else '') # One puzzle
+    try:
+        # Reloaded under the lock: another request may have replaced a different puzzle meanwhile
+        path = collections_store.collection_path(collection_id)
+        with collections_store.collection_lock(path):
+            saved = collections_store.load_collection(path)
+            missing = collections_store.replace_puzzle(saved, number, words=words, seed=seed)
+            collections_store.save_collection(saved, path)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        ticket.release()
+    placed = saved.puzzles[number - 1]
+    return jsonify({'puzzle': number, 'words': placed['words'], 'not_placed': missing,
+                    'pdf_url': url_for('collection_pdf', collection_id=collection_id)})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition of the pipeline metrics for this worker."""
+    if metrics is None or not metrics.METRICS_ENABLED:
+        return Response("# metrics disabled\n", mimetype='text/plain')
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admission/stats')
+def admission_stats():
+    """In-flight cost units and admit/reject counts for this worker and the worker group."""
+    if generate_word_search_pdf is None:
+        return jsonify({'error': GENERATOR_IMPORT_ERROR}), 503
+    return jsonify(admission.stats())
+
+@app.route('/fonts')
+def font_list():
+    """Font names accepted by the grid_font/word_font/heading_font fields (standard PDF fonts plus custom TrueType files)."""
+    if generate_word_search_pdf is None:
+        return jsonify({'error': GENERATOR_IMPORT_ERROR}), 503
+    return jsonify({'fonts': available_fonts()})
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Reports theme word cache hit/miss counters for this worker."""
+    if theme_cache is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **theme_cache.stats()})
+
+@app.route('/providers/health')
+def providers_health():
+    """Circuit breaker state, latency and current timeouts of each word provider, for this worker."""
+    if generate_word_search_pdf is None:
+        return jsonify({'error': GENERATOR_IMPORT_ERROR}), 503
+    return jsonify(health_report(UPSTREAM_TIMEOUT))
+
 if __name__ == '__main__':
     # When running locally, you can change the port if 5000 is used
     app.run(debug=True, port=5000)
@@ -0,0 +1,245 @@
+"""
+Batch generation of many word search books from one manifest.
+
+    python batch.py manifest.json --out-dir books/ [--concurrency 3] [--summary summary.json]
+
+Manifest format (JSON):
+    {
+      "defaults": {"word_count": 200, "size": 15, "page_size": "letter", "engine": "native", "layout": "compact-keys",
+                   "difficulty": "medium"},
+      "books": [
+        {"name": "ocean-life", "themes": "ocean, fish, boats"},
+        {"name": "space", "themes": "space, planets", "word_count": 400, "seed": "2024"}
+      ]
+    }
+A bare list of book specs is also accepted.
+"""
+import os
+import sys
+import json
+import time
+import random
+import zipfile
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import generator
+from memory import MemoryWatch
+
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', 3)) # Books built/rendered at the same time
+MAX_BATCH_BOOKS = 200
+
+BOOK_DEFAULTS = {
+    'word_count': 100,
+    'size': 15,
+    'page_size': 'letter',
+    'engine': None,
+    'seed': None,
+    'layout': None,
+    'difficulty': None,
+}
+
+
+def normalize_book(spec, defaults, index):
+    """Validates one book spec (same limits as the web form) and fills in defaults."""
+    book = {**BOOK_DEFAULTS, **defaults, **spec}
+    themes = str(book.get('themes') or '').strip()
+    theme_list = generator.parse_themes(themes)
+    if not theme_list:
+        # Also catches separator-only values such as "," or " , "
+        raise ValueError(f"Book #{index}: each book needs at least one theme.")
+    size = int(book['size'])
+    word_count = int(book['word_count'])
+    if not (10 <= size <= 25):
+        raise ValueError(f"Book #{index}: puzzle size must be between 10 and 25.")
+    if not (20 <= word_count <= 2000):
+        raise ValueError(f"Book #{index}: word count must be between 20 and 2000.")
+    if book['page_size'] not in generator.PAGE_SIZE_MAP:
+        raise ValueError(f"Book #{index}: page size must be one of: {', '.join(generator.PAGE_SIZE_MAP)}.")
+    if book['layout'] is not None and book['layout'] not in generator.PAGE_LAYOUTS:
+        raise ValueError(f"Book #{index}: layout must be one of: {', '.join(generator.PAGE_LAYOUTS)}.")
+    if book['difficulty'] is not None and book['difficulty'] not in generator.DIFFICULTY_LEVELS:
+        raise ValueError(f"Book #{index}: difficulty must be one of: {', '.join(generator.DIFFICULTY_LEVELS)}.")
+
+    safe_theme = "".join(c for c in theme_list[0] if c.isalnum()).lower()
+    name = str(book.get('name') or f"{index:03d}_{safe_theme or 'puzzles'}")
+    return {
+        'name': "".join(c if c.isalnum() or c in '-_' else '_' for c in name),
+        'themes': themes,
+        'size': size,
+        'word_count': word_count,
+        'page_size': book['page_size'],
+        'engine': book['engine'],
+        'seed': None if book['seed'] in (None, '') else str(book['seed']),
+        'layout': book['layout'],
+        'difficulty': book['difficulty'],
+    }
+
+
+def load_manifest(manifest):
+    """Accepts a parsed manifest (dict or list) and returns the normalized list of books."""
+    if isinstance(manifest, list):
+        manifest = {'books': manifest}
+    if not isinstance(manifest, dict) or not isinstance(manifest.get('books'), list):
+        raise ValueError("Manifest must be a list of books or an object with a 'books' list.")
+    books = manifest['books']
+    if not books:
+        raise ValueError("Manifest contains no books.")
+    if len(books) > MAX_BATCH_BOOKS:
+        raise ValueError(f"A batch can contain at most {MAX_BATCH_BOOKS} books.")
+    defaults = manifest.get('defaults') or {}
+    normalized = [normalize_book(spec, defaults, i) for i, spec in enumerate(books, 1)]
+
+    # Duplicate names would overwrite each other's PDFs
+    seen = {}
+    for book in normalized:
+        count = seen.get(book['name'], 0)
+        seen[book['name']] = count + 1
+        if count:
+            book['name'] = f"{book['name']}_{count + 1}"
+    return normalized
+
+
+def run_batch(books, out_dir, concurrency=BATCH_CONCURRENCY, progress=None):
+    """
+    Generates every book into out_dir and returns a summary dict.
+
+    Stages are pipelined: every distinct theme across all books is fetched once, up front and
+    concurrently; then up to `concurrency` books are built (on the shared puzzle process pool)
+    and rendered at the same time, so one book renders while the next one builds.
+    """
+    report = progress or (lambda **fields: None)
+    os.makedirs(out_dir, exist_ok=True)
+    started = time.perf_counter()
+
+    # 1. Fetch: dedupe themes across all books
+    unique_themes = list(dict.fromkeys(
+        theme.lower() for book in books for theme in generator.parse_themes(book['themes'])))
+    fetch_start = time.perf_counter()
+    theme_words = generator.collect_theme_words(unique_themes)
+    fetch_seconds = time.perf_counter() - fetch_start
+    print(f"✅ Fetched {len(unique_themes)} distinct themes for {len(books)} books in {fetch_seconds:.2f}s")
+
+    results = [None] * len(books)
+    done = [0]
+    lock = threading.Lock()
+    report(books_total=len(books), books_done=0, themes_fetched=len(unique_themes))
+
+    def produce(i, book):
+        result = {'name': book['name'], 'themes': book['themes'], 'status': 'failed'}
+        try:
+            rng = random.Random(book['seed']) if book['seed'] is not None else None
+            word_sources = [words for t in generator.parse_themes(book['themes']) for words in theme_words[t.lower()]]
+            words = generator.select_words(word_sources, book['word_count'], rng)
+            if not words:
+                raise Exception("Word list generation failed. Try a different theme or reduce the word count.")
+
+            # 2. Build
+            # Books share one worker, so each book's peak covers whatever ran alongside it
+            watch = MemoryWatch()
+            build_start = time.perf_counter()
+            puzzles = generator.build_collection(words, book['size'], engine=book['engine'], seed=book['seed'],
+                                                 progress=watch.wrap(), difficulty=book['difficulty'])
+            build_seconds = time.perf_counter() - build_start
+
+            # 3. Render
+            first_theme = generator.parse_themes(book['themes'])[0].capitalize()
+            output_path = os.path.join(out_dir, f"{book['name']}.pdf")
+            render_start = time.perf_counter()
+            rendered = {}
+            generator.render_collection_pdf(puzzles, output_path, generator.PAGE_SIZE_MAP[book['page_size']],
+                                            f"{first_theme} ", invariant=book['seed'] is not None,
+                                            progress=watch.wrap(lambda **fields: rendered.update(fields)),
+                                            layout=book['layout'])
+            render_seconds = time.perf_counter() - render_start
+            peak_rss_mb = generator.record_peak_memory(watch)
+
+            result.update({
+                'status': 'done',
+                'output': output_path,
+                'words': len(words),
+                'puzzles': len(puzzles),
+                'pages': rendered['pages_total'],
+                'bytes': os.path.getsize(output_path),
+                'build_seconds': round(build_seconds, 3),
+                'render_seconds': round(render_seconds, 3),
+                'peak_rss_mb': peak_rss_mb,
+            })
+        except Exception as e:
+            print(f"⚠️ Book '{book['name']}' failed: {type(e).__name__}: {e}", file=sys.stderr)
+            result['error'] = f"{type(e).__name__}: {e}"
+        results[i] = result
+        with lock:
+            done[0] += 1
+            report(books_done=done[0])
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='batch-book') as pool:
+        list(pool.map(lambda args: produce(*args), enumerate(books)))
+
+    summary = {
+        'books': results,
+        'succeeded': sum(1 for r in results if r['status'] == 'done'),
+        'failed': sum(1 for r in results if r['status'] != 'done'),
+        'distinct_themes': len(unique_themes),
+        'fetch_seconds': round(fetch_seconds, 3),
+        'peak_rss_mb': max((r.get('peak_rss_mb', 0) for r in results), default=0),
+        'total_seconds': round(time.perf_counter() - started, 3),
+    }
+    print(f"✅ Batch finished: {summary['succeeded']} of {len(books)} books in {summary['total_seconds']}s")
+    return summary
+
+
+def run_batch_job(output_path, progress=None, books=None, concurrency=BATCH_CONCURRENCY):
+    """Job-runner entry point: runs a batch and writes all PDFs plus summary.json into one ZIP."""
+    with tempfile.TemporaryDirectory(prefix='batch-') as work_dir:
+        summary = run_batch(books, work_dir, concurrency=concurrency, progress=progress)
+        with zipfile.ZipFile(output_path, 'w', compression=zipfile.ZIP_STORED) as zf:
+            # PDFs are already compressed; storing them avoids a second pass over every byte
+            for book in summary['books']:
+                if book['status'] == 'done':
+                    zf.write(book['output'], arcname=os.path.basename(book['output']))
+                    book['output'] = os.path.basename(book['output'])
+            zf.writestr('summary.json', json.dumps(summary, indent=2))
+    return output_path
+
+
+def print_summary(summary):
+    print(f"{'book':<28} {'status':<7} {'puzzles':>7} {'build s':>8} {'render s':>9} {'bytes':>10} {'peak MB':>8}")
+    for book in summary['books']:
+        print(f"{book['name'][:28]:<28} {book['status']:<7} {book.get('puzzles', 0):>7} "
+              f"{book.get('build_seconds', 0):>8.2f} {book.get('render_seconds', 0):>9.2f} {book.get('bytes', 0):>10} {book.get('peak_rss_mb', 0):>8.1f}")
+    print(f"Fetched {summary['distinct_themes']} distinct themes in {summary['fetch_seconds']}s; "
+          f"total {summary['total_seconds']}s ({summary['succeeded']} ok, {summary['failed']} failed)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate many word search books from a JSON manifest.")
+    parser.add_argument('manifest', help="Manifest JSON file, or '-' for stdin")
+    parser.add_argument('--out-dir', default=os.path.join('temp', 'batch'))
+    parser.add_argument('--concurrency', type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument('--summary', help="Also write the summary JSON to this path")
+    args = parser.parse_args(argv)
+
+    if args.manifest == '-':
+        manifest = json.load(sys.stdin)
+    else:
+        with open(args.manifest, encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    try:
+        books = load_manifest(manifest)
+    except ValueError as e:
+        parser.error(str(e))
+
+    summary = run_batch(books, args.out_dir, concurrency=args.concurrency)
+    print_summary(summary)
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+    return 0 if summary['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
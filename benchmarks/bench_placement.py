@@ -0,0 +1,76 @@
+"""
+Puzzles-per-second benchmark: word_search_generator vs. the native placement engine.
+
+    python benchmarks/bench_placement.py [--sizes 10 15 20 25] [--puzzles 30] [--words 20]
+"""
+import os
+import sys
+import time
+import random
+import string
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from placement import place_words # noqa: E402
+
+
+def make_word_sets(count, words_per_puzzle, size, seed=0):
+    """Deterministic pseudo-word chunks with lengths 4..min(12, size)."""
+    rng = random.Random(seed)
+    max_len = min(12, size)
+    return [
+        ["".join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(4, max_len)))
+         for _ in range(words_per_puzzle)]
+        for _ in range(count)
+    ]
+
+
+def bench_library(word_sets, size):
+    from word_search_generator import WordSearch
+    built = failed = placed = 0
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for words in word_sets:
+            try:
+                placed += len(WordSearch(", ".join(words), size=size, level=3).key)
+                built += 1
+            except Exception:
+                failed += 1
+    return time.perf_counter() - start, built, failed, placed
+
+
+def bench_native(word_sets, size):
+    built = failed = placed = 0
+    rng = random.Random(1)
+    start = time.perf_counter()
+    for words in word_sets:
+        try:
+            placed += len(place_words(words, size, level=3, rng=rng).key)
+            built += 1
+        except Exception:
+            failed += 1
+    return time.perf_counter() - start, built, failed, placed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 15, 20, 25])
+    parser.add_argument('--puzzles', type=int, default=30)
+    parser.add_argument('--words', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    print(f"{'size':>4}  {'engine':<8} {'puzzles/s':>10} {'built':>6} {'failed':>6} {'placed':>7}")
+    for size in args.sizes:
+        word_sets = make_word_sets(args.puzzles, args.words, size)
+        for name, fn in (('library', bench_library), ('native', bench_native)):
+            elapsed, built, failed, placed = fn(word_sets, size)
+            rate = len(word_sets) / elapsed if elapsed else float('inf')
+            # placed: share of requested words that actually made it into a grid
+            placed_pct = 100.0 * placed / (len(word_sets) * args.words)
+            print(f"{size:>4}  {name:<8} {rate:>10.1f} {built:>6} {failed:>6} {placed_pct:>6.1f}%")
+
+
+if __name__ == '__main__':
+    main()
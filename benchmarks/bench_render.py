@@ -0,0 +1,60 @@
+"""
+PDF size and render-time report for page furniture forms and page compression.
+
+    python benchmarks/bench_render.py [--puzzles 100] [--size 15] [--page-size letter]
+"""
+import io
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import generator # noqa: E402
+from bench_placement import make_word_sets # noqa: E402
+from puzzle_builder import build_puzzles # noqa: E402
+
+
+def build_collection(count, size, seed=0):
+    puzzles = []
+    word_sets = [sorted(words) for words in make_word_sets(count, generator.MAX_WORDS_PER_PUZZLE, size, seed)]
+    for _, words, puzzle, error in build_puzzles(word_sets, size, engine='native', seed=seed):
+        if error is None:
+            puzzles.append({'puzzle': puzzle, 'words': words})
+    return puzzles
+
+
+def render(puzzles, page_size, forms, compression, repeat=3):
+    generator.USE_PAGE_FORMS = forms
+    generator.PDF_PAGE_COMPRESSION = int(compression)
+    best = None
+    for _ in range(repeat):
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        generator.render_collection_pdf(puzzles, buffer, page_size, "Bench ", invariant=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(buffer.getvalue())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--puzzles', type=int, default=100)
+    parser.add_argument('--size', type=int, default=15)
+    parser.add_argument('--page-size', default='letter', choices=sorted(generator.PAGE_SIZE_MAP))
+    args = parser.parse_args(argv)
+
+    random.seed(0)
+    puzzles = build_collection(args.puzzles, args.size)
+    page_size = generator.PAGE_SIZE_MAP[args.page_size]
+    print(f"{len(puzzles)} puzzles, {2 * len(puzzles)} pages, {args.size}x{args.size}, {args.page_size}")
+    print(f"{'forms':<6} {'compress':<9} {'render ms':>10} {'bytes':>10}")
+    for forms, compression in ((False, False), (True, False), (False, True), (True, True)):
+        elapsed, size = render(puzzles, page_size, forms, compression)
+        print(f"{str(forms):<6} {str(compression):<9} {elapsed * 1000:>10.1f} {size:>10}")
+
+
+if __name__ == '__main__':
+    main()
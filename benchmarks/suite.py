@@ -0,0 +1,299 @@
+"""
+Benchmark suite for the generation pipeline: word fetching, puzzle building and grid rendering.
+
+    python benchmarks/suite.py [--only fetch build render] [--repeat 5] [--engines native library]
+                               [--save benchmarks/baseline.json] [--compare benchmarks/baseline.json]
+                               [--threshold 0.15]
+    python benchmarks/suite.py --record   # refresh fixtures/upstream.json from the live providers
+
+Fetch cases replay provider responses from benchmarks/fixtures/upstream.json (never the network).
+If that file doesn't exist, deterministic synthetic responses in each provider's JSON shape are used.
+
+Each case reports throughput, p50/p90/p99 latency and the peak Python heap during one extra
+traced run (tracemalloc; puzzle building in pool workers is not included). --compare flags a case
+when its p50 latency or peak memory is more than --threshold worse than the baseline and exits 1.
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import string
+import argparse
+import platform
+import contextlib
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import generator # noqa: E402
+from reportlab.pdfgen import canvas # noqa: E402
+from placement import place_words # noqa: E402
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'upstream.json')
+FIXTURE_THEMES = ('ocean', 'space', 'animals', 'food', 'music', 'sports')
+FETCH_CASES = (('ocean', 100), ('ocean, space', 500), (', '.join(FIXTURE_THEMES), 1920))
+BUILD_SIZES = (10, 15, 20, 25)
+BUILD_WORD_COUNTS = (20, 100, 500, 2000)
+RENDER_SIZES = (10, 15, 20, 25)
+RENDER_PAGES = 20 # Pages drawn per render sample
+
+
+# --- Fixture Replay ---
+
+def fixture_key(url):
+    """Provider-relative key for a URL, so fixtures survive a change of base URL."""
+    for source, base in (('datamuse', generator.DATAMUSE_BASE_URL), ('conceptnet', generator.CONCEPTNET_BASE_URL)):
+        if url.startswith(base):
+            return source + ':' + url[len(base):]
+    return url
+
+
+def synthetic_fixtures(themes=FIXTURE_THEMES):
+    """Deterministic responses shaped like Datamuse/ConceptNet answers, including entries the filters drop."""
+    fixtures = {}
+    for theme in themes:
+        rng = random.Random(theme)
+
+        def word():
+            return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 14)))
+
+        for url in generator.datamuse_urls(theme):
+            entries = [{'word': word(), 'score': 1000 - i} for i in range(200)]
+            entries += [{'word': f"{word()} {word()}", 'score': 1}, {'word': 'x-ray', 'score': 1}]
+            fixtures[fixture_key(url)] = entries
+        for url in generator.conceptnet_urls(theme):
+            related = [{'@id': f"/c/en/{word()}", 'weight': 0.5} for _ in range(300)]
+            related += [{'@id': f"/c/en/{word()}_{word()}", 'weight': 0.1}, {'@id': f"/c/fr/{word()}", 'weight': 0.1}]
+            fixtures[fixture_key(url)] = {'related': related}
+    return fixtures
+
+
+def load_fixtures():
+    if os.path.exists(FIXTURES_PATH):
+        with open(FIXTURES_PATH, encoding='utf-8') as f:
+            return json.load(f), 'recorded'
+    return synthetic_fixtures(), 'synthetic'
+
+
+def record_fixtures(themes=FIXTURE_THEMES):
+    """Fetches every fixture URL from the live providers and writes fixtures/upstream.json."""
+    session = generator.get_http_session()
+    fixtures = {}
+    for theme in themes:
+        for url in generator.datamuse_urls(theme) + generator.conceptnet_urls(theme):
+            r = session.get(url, timeout=30)
+            r.raise_for_status()
+            fixtures[fixture_key(url)] = r.json()
+            print(f"recorded {fixture_key(url)}")
+    os.makedirs(os.path.dirname(FIXTURES_PATH), exist_ok=True)
+    with open(FIXTURES_PATH, 'w', encoding='utf-8') as f:
+        json.dump(fixtures, f, sort_keys=True)
+    print(f"✅ Wrote {len(fixtures)} responses to {FIXTURES_PATH}")
+
+
+class FixtureResponse:
+    def __init__(self, body):
+        self.status_code = 200 if body is not None else 404
+        self.content = body
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class FixtureSession:
+    """Stands in for the shared requests.Session, answering from the fixture table."""
+
+    def __init__(self, fixtures):
+        # Encoded once up front, so each case pays for parsing a body like a live response
+        self.bodies = {key: json.dumps(data).encode('utf-8') for key, data in fixtures.items()}
+
+    def get(self, url, timeout=None):
+        return FixtureResponse(self.bodies.get(fixture_key(url)))
+
+
+@contextlib.contextmanager
+def replayed_upstream(fixtures):
+    """Routes provider calls to the fixtures, with the theme cache and lexicon out of the way."""
+    saved = (generator.get_http_session, generator.theme_cache, generator.WORD_SOURCE)
+    session = FixtureSession(fixtures)
+    generator.get_http_session = lambda: session
+    generator.theme_cache = None
+    generator.WORD_SOURCE = 'online'
+    try:
+        yield
+    finally:
+        generator.get_http_session, generator.theme_cache, generator.WORD_SOURCE = saved
+
+
+# --- Measurement ---
+
+def percentile(samples, pct):
+    """Linear-interpolated percentile of a list of numbers."""
+    ordered = sorted(samples)
+    if len(ordered) == 1:
+        return ordered[0]
+    pos = (len(ordered) - 1) * pct / 100.0
+    low = int(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+def measure(fn, repeat, units):
+    """
+    Runs fn() `repeat` times (after one warm-up) and once more under tracemalloc.
+    units: work items per call (words, puzzles, pages), used for throughput.
+    """
+    # Pipeline progress and dropped-word warnings would drown the report
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        fn()
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    total = sum(samples)
+    return {
+        'units': units,
+        'throughput': units * len(samples) / total if total else float('inf'),
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p90_ms': percentile(samples, 90) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'peak_kib': peak / 1024,
+    }
+
+
+def make_words(count, size, seed=0):
+    """count distinct pseudo-words that fit a size x size grid."""
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(4, min(12, size)))))
+    return sorted(words)
+
+
+# --- Cases ---
+
+def fetch_cases(repeat):
+    fixtures, kind = load_fixtures()
+    print(f"fetch fixtures: {kind}", file=sys.stderr)
+    with replayed_upstream(fixtures):
+        for themes, target in FETCH_CASES:
+            name = f"fetch/{len(generator.parse_themes(themes))}themes/{target}"
+            yield name, measure(lambda: generator.fetch_expanded_theme_words(themes, target, random.Random(0)),
+                                repeat, target)
+
+
+def build_cases(repeat, engines):
+    for engine in engines:
+        for size in BUILD_SIZES:
+            for word_count in BUILD_WORD_COUNTS:
+                words = make_words(word_count, size)
+                puzzles = -(-word_count // generator.MAX_WORDS_PER_PUZZLE)
+                yield f"build/{engine}/{size}x{size}/{word_count}", measure(
+                    lambda: generator.build_collection(words, size, engine=engine, seed='bench'), repeat, puzzles)
+
+
+def render_cases(repeat):
+    page_w, page_h = generator.PAGE_SIZE_MAP['letter']
+    margin = generator.LEFT_MARGIN
+    for size in RENDER_SIZES:
+        rng = random.Random(size)
+        words = make_words(generator.MAX_WORDS_PER_PUZZLE, size, seed=size)
+        puzzle = place_words(words, size, rng=rng) # NativePuzzle has the puzzle/key/size shape draw_grid reads
+        word_text = ", ".join(puzzle.words)
+
+        for highlight in (False, True):
+            def render_pages():
+                pdf = canvas.Canvas(io.BytesIO(), pagesize=(page_w, page_h))
+                for _ in range(RENDER_PAGES):
+                    y = generator.draw_grid(pdf, puzzle, page_w, page_h, margin, highlight=highlight)
+                    generator.draw_wrapped_lines(pdf, word_text, margin, y - generator.WORDS_SECTION_OFFSET,
+                                                 generator.WORD_FONT, generator.WORD_FONT_SIZE,
+                                                 generator.WORD_FONT_SIZE + 2, page_w, page_h, margin, margin, margin)
+                    pdf.showPage()
+                pdf.save()
+            label = 'key' if highlight else 'puzzle'
+            yield f"render/{label}/{size}x{size}", measure(render_pages, repeat, RENDER_PAGES)
+
+
+# --- Baselines ---
+
+def compare(results, baseline, threshold):
+    """Returns [(case, metric, baseline, current, change)] for metrics worse than the threshold."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('cases', {}).get(name)
+        if previous is None:
+            continue
+        for metric in ('p50_ms', 'peak_kib'):
+            before, after = previous[metric], current[metric]
+            if before > 0 and (after - before) / before > threshold:
+                regressions.append((name, metric, before, after, (after - before) / before))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--only', nargs='+', choices=('fetch', 'build', 'render'), default=('fetch', 'build', 'render'))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--engines', nargs='+', choices=('native', 'library'), default=('native',))
+    parser.add_argument('--save', help="Write the results as a JSON baseline")
+    parser.add_argument('--compare', help="Baseline JSON to check the results against")
+    parser.add_argument('--threshold', type=float, default=0.15, help="Allowed relative slowdown/growth (0.15 = 15%%)")
+    parser.add_argument('--record', action='store_true', help="Record fixtures from the live providers and exit")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        record_fixtures()
+        return 0
+
+    groups = {
+        'fetch': lambda: fetch_cases(args.repeat),
+        'build': lambda: build_cases(args.repeat, args.engines),
+        'render': lambda: render_cases(args.repeat),
+    }
+    results = {}
+    print(f"{'case':<32} {'units/s':>10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'peak KiB':>10}")
+    for group in args.only:
+        for name, result in groups[group]():
+            results[name] = result
+            print(f"{name:<32} {result['throughput']:>10.1f} {result['p50_ms']:>9.2f} "
+                  f"{result['p90_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['peak_kib']:>10.1f}")
+
+    if args.save:
+        report = {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'repeat': args.repeat,
+            'cases': results,
+        }
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"✅ Saved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if not regressions:
+            print(f"✅ No regressions beyond {args.threshold:.0%} against {args.compare}")
+            return 0
+        for name, metric, before, after, change in regressions:
+            print(f"⚠️ REGRESSION {name} {metric}: {before:.2f} -> {after:.2f} (+{change:.0%})")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
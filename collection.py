@@ -0,0 +1,279 @@
+"""
+Saved word search collections: the built puzzles of one book, kept so the PDF can be
+re-rendered (another page size, title theme or fonts) and single puzzles replaced
+without fetching words or rebuilding the rest.
+
+    python collection.py build "ocean, fish" ocean.wsc [--size 15] [--word-count 200] [--seed 1] [--engine native]
+                                                       [--difficulty easy]
+    python collection.py render ocean.wsc ocean.pdf [--page-size A4] [--layout compact] [--theme Sea]
+                                                    [--grid-font-size 14] [--save]
+    python collection.py replace ocean.wsc 3 [--words WHALE,SHARK,...] [--seed 2]
+
+File format (JSON Lines): one header object ("format": "wordsearch-collection") followed by
+one line per puzzle in the same shape as the jsonl data export (see generator.puzzle_record).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import contextlib
+
+try:
+    import fcntl
+except ImportError: # Not available on Windows
+    fcntl = None
+
+import generator
+from memory import MemoryWatch
+from puzzle_builder import make_puzzle_record, build_puzzles, DEFAULT_PUZZLE_ENGINE
+
+COLLECTIONS_DIR = os.environ.get('COLLECTIONS_DIR', os.path.join(os.getcwd(), 'collections'))
+COLLECTION_FORMAT = 'wordsearch-collection'
+COLLECTION_VERSION = 1
+
+
+class Collection:
+    """Header fields plus the built puzzles, as [{'puzzle': PuzzleRecord, 'words': [...]}]."""
+    __slots__ = ('meta', 'puzzles')
+
+    def __init__(self, meta, puzzles):
+        self.meta = meta
+        self.puzzles = puzzles
+
+    @property
+    def title_prefix(self):
+        theme = self.meta.get('theme')
+        return f"{theme} " if theme else ""
+
+
+def create_collection(themes, size, word_count, engine=None, seed=None, page_size_str='letter', progress=None, layout=None,
+                      difficulty=None):
+    """Fetches words and builds every puzzle once (the same pipeline as generate_word_search_pdf)."""
+    if page_size_str not in generator.PAGE_SIZE_MAP:
+        raise ValueError(f"Page size must be one of: {', '.join(generator.PAGE_SIZE_MAP)}.")
+    if layout is not None and layout not in generator.PAGE_LAYOUTS:
+        raise ValueError(f"Page layout must be one of: {', '.join(generator.PAGE_LAYOUTS)}.")
+    difficulty = difficulty or generator.DEFAULT_DIFFICULTY
+    generator.difficulty_level(difficulty)
+    watch = MemoryWatch()
+    report = watch.wrap(progress)
+    all_words = generator.fetch_puzzle_words(themes, word_count, seed=seed, progress=report)
+    puzzles = generator.build_collection(all_words, size, engine=engine, seed=seed, progress=report,
+                                         difficulty=difficulty)
+    generator.record_peak_memory(watch, progress)
+    now = time.time()
+    meta = {
+        'format': COLLECTION_FORMAT,
+        'version': COLLECTION_VERSION,
+        'themes': themes,
+        'theme': generator.parse_themes(themes)[0].capitalize() if themes else "",
+        'size': size,
+        'word_count': word_count,
+        'engine': engine or DEFAULT_PUZZLE_ENGINE,
+        'difficulty': difficulty,
+        'seed': None if seed is None else str(seed),
+        'page_size': page_size_str,
+        'layout': layout,
+        'style': None, # PageStyle fields; None keeps the generator defaults
+        'created_at': now,
+        'updated_at': now,
+    }
+    return Collection(meta, puzzles)
+
+
+def save_collection(collection, path):
+    """Writes the collection atomically (a temp file renamed over the old one)."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(collection.meta, separators=(',', ':')) + "\n")
+        for p in collection.puzzles:
+            f.write(json.dumps(generator.puzzle_record(p), separators=(',', ':')) + "\n")
+    os.replace(tmp_path, path)
+    return path
+
+
+@contextlib.contextmanager
+def collection_lock(path):
+    """
+    Holds an exclusive lock on one collection for a load -> change -> save sequence, so concurrent
+    edits (from any worker process or thread) don't overwrite each other. No-op without fcntl.
+    """
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(f"{path}.lock", 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _puzzle_from_record(record):
+    key_tuples = {placement['word']: (tuple(placement['start']), tuple(placement['direction']))
+                  for placement in record['placements']}
+    puzzle = make_puzzle_record(record['puzzle'], record['size'], record['grid'], key_tuples)
+    return {'puzzle': puzzle, 'words': record['words']}
+
+
+def load_collection(path):
+    with open(path, encoding='utf-8') as f:
+        meta = json.loads(f.readline() or 'null')
+        if not isinstance(meta, dict) or meta.get('format') != COLLECTION_FORMAT:
+            raise ValueError(f"{path} is not a saved word search collection.")
+        if meta.get('version') != COLLECTION_VERSION:
+            raise ValueError(f"Unsupported collection version {meta.get('version')} in {path}.")
+        puzzles = [_puzzle_from_record(json.loads(line)) for line in f if line.strip()]
+    return Collection(meta, puzzles)
+
+
+def collection_path(collection_id, directory=COLLECTIONS_DIR):
+    return os.path.join(directory, f"{collection_id}.wsc")
+
+
+def render_collection(collection, output_path, page_size_str=None, theme=None, style=None, progress=None, layout=None):
+    """
+    Renders the stored puzzles to a PDF. page_size_str, layout, theme (the title prefix) and
+    style (a PageStyle) override the collection's saved settings for this render only.
+    """
+    page_size_str = page_size_str or collection.meta.get('page_size') or 'letter'
+    if page_size_str not in generator.PAGE_SIZE_MAP:
+        raise ValueError(f"Page size must be one of: {', '.join(generator.PAGE_SIZE_MAP)}.")
+    page_size = generator.PAGE_SIZE_MAP[page_size_str]
+    if style is None:
+        style = generator.PageStyle.from_dict(collection.meta.get('style'))
+    style.check_fits(collection.meta['size'], page_size[0])
+    title_prefix = f"{theme} " if theme else collection.title_prefix
+
+    if isinstance(output_path, (str, os.PathLike)):
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    watch = MemoryWatch()
+    generator.render_collection_pdf(collection.puzzles, output_path, page_size, title_prefix,
+                                    invariant=collection.meta.get('seed') is not None,
+                                    progress=watch.wrap(progress), style=style,
+                                    layout=layout or collection.meta.get('layout'))
+    generator.record_peak_memory(watch, progress)
+    return output_path
+
+
+def replace_puzzle(collection, number, words=None, seed=None, engine=None):
+    """
+    Rebuilds puzzle #number (1-based) in place, from new words or (by default) its current words
+    with a fresh layout, at the collection's difficulty. Every other puzzle is left untouched.
+    Returns the words that could not be placed.
+    """
+    if not 1 <= number <= len(collection.puzzles):
+        raise ValueError(f"Puzzle number must be between 1 and {len(collection.puzzles)}.")
+    size = collection.meta['size']
+    if words is None:
+        words = collection.puzzles[number - 1]['words']
+    if not isinstance(words, (list, tuple)) or not all(isinstance(word, str) for word in words):
+        raise ValueError("Words must be a list of strings.")
+    words = sorted({word.strip().upper() for word in words if word.strip()})
+    invalid = [word for word in words if not word.isalpha() or len(word) > size]
+    if invalid:
+        raise ValueError(f"Words must be letters only and at most {size} long: {', '.join(invalid)}")
+    if not 0 < len(words) <= generator.MAX_WORDS_PER_PUZZLE:
+        raise ValueError(f"A puzzle needs between 1 and {generator.MAX_WORDS_PER_PUZZLE} words.")
+
+    engine = engine or collection.meta.get('engine')
+    level = generator.difficulty_level(collection.meta.get('difficulty'))
+    (index, placed, puzzle, error), = build_puzzles([words], size, level=level, engine=engine, seed=seed,
+                                                    start_index=number)
+    if error is not None:
+        raise ValueError(f"Could not build puzzle #{number}: {error}")
+    collection.puzzles[number - 1] = {'puzzle': puzzle, 'words': placed}
+    collection.meta['updated_at'] = time.time()
+    placed = set(placed)
+    return [word for word in words if word not in placed]
+
+
+def style_from_args(args):
+    fields = {name: getattr(args, name, None) for name in generator.PageStyle.__slots__}
+    return generator.PageStyle(**fields) if any(fields.values()) else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build, re-render and edit saved word search collections.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="Fetch words, build the puzzles and save the collection")
+    build.add_argument('themes')
+    build.add_argument('path')
+    build.add_argument('--size', type=int, default=15)
+    build.add_argument('--word-count', type=int, default=100)
+    build.add_argument('--engine', choices=('native', 'library'))
+    build.add_argument('--seed')
+    build.add_argument('--page-size', default='letter', choices=sorted(generator.PAGE_SIZE_MAP))
+    build.add_argument('--layout', choices=generator.PAGE_LAYOUTS)
+    build.add_argument('--difficulty', choices=tuple(generator.DIFFICULTY_LEVELS))
+    render = sub.add_parser('render', help="Render a saved collection to a PDF")
+    render.add_argument('path')
+    render.add_argument('output')
+    render.add_argument('--page-size', choices=sorted(generator.PAGE_SIZE_MAP))
+    render.add_argument('--layout', choices=generator.PAGE_LAYOUTS)
+    render.add_argument('--theme', help="Title prefix, e.g. 'Sea' for 'Sea Word Search Puzzle #1'")
+    for name in generator.PageStyle.__slots__:
+        render.add_argument('--' + name.replace('_', '-'), dest=name,
+                            type=int if name.endswith('_size') else str)
+    render.add_argument('--save', action='store_true', help="Keep the page size, theme and fonts as the new defaults")
+    replace = sub.add_parser('replace', help="Rebuild one puzzle and save the collection")
+    replace.add_argument('path')
+    replace.add_argument('number', type=int)
+    replace.add_argument('--words', help="Comma-separated words (default: the puzzle's current words)")
+    replace.add_argument('--seed')
+    replace.add_argument('--engine', choices=('native', 'library'))
+    args = parser.parse_args(argv)
+    try:
+        return run(args)
+    except (ValueError, OSError) as e:
+        print(f"⚠️ {e}", file=sys.stderr)
+        return 1
+
+
+def run(args):
+    if args.command == 'build':
+        collection = create_collection(args.themes, args.size, args.word_count, engine=args.engine,
+                                       seed=args.seed, page_size_str=args.page_size, layout=args.layout,
+                                       difficulty=args.difficulty)
+        save_collection(collection, args.path)
+        print(f"✅ Saved {len(collection.puzzles)} puzzles to {args.path}")
+        return 0
+
+    if args.command == 'replace':
+        words = args.words.split(',') if args.words else None
+        with collection_lock(args.path):
+            collection = load_collection(args.path)
+            missing = replace_puzzle(collection, args.number, words=words, seed=args.seed, engine=args.engine)
+            save_collection(collection, args.path)
+        if missing:
+            print(f"⚠️ Could not place: {', '.join(missing)}", file=sys.stderr)
+        print(f"✅ Replaced puzzle #{args.number} in {args.path}")
+        return 0
+
+    # render --save rewrites the file too, so it takes the same lock as replace
+    with collection_lock(args.path) if args.save else contextlib.nullcontext():
+        collection = load_collection(args.path)
+        style = style_from_args(args)
+        render_collection(collection, args.output, page_size_str=args.page_size, theme=args.theme, style=style,
+                          layout=args.layout)
+        print(f"✅ Rendered {len(collection.puzzles)} puzzles to {args.output}")
+        if args.save:
+            if args.page_size:
+                collection.meta['page_size'] = args.page_size
+            if args.layout:
+                collection.meta['layout'] = args.layout
+            if args.theme:
+                collection.meta['theme'] = args.theme
+            if style is not None:
+                collection.meta['style'] = style.to_dict()
+            collection.meta['updated_at'] = time.time()
+            save_collection(collection, args.path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
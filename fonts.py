@@ -0,0 +1,79 @@
+import os
+import sys
+import string
+import threading
+from functools import lru_cache
+
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont, TTFError
+
+# --- Embedded TrueType Fonts ---
+# The base-14 PDF fonts (Courier, Helvetica, ...) are built into every reader. Any other font
+# name is looked up among the .ttf files in FONT_DIR (by file name, e.g. "AtkinsonHyperlegible-Bold")
+# and FONT_FILES, parsed and registered once per process, and embedded by ReportLab as subsets
+# holding only the glyphs a document actually uses, so a large-print face adds kilobytes, not the
+# whole font file, to each PDF.
+FONT_DIR = os.environ.get('FONT_DIR', os.path.join(os.getcwd(), 'fonts'))
+FONT_FILES = os.environ.get('FONT_FILES', '') # Extra fonts as comma-separated Name=/path/to/font.ttf entries
+WIDTH_CACHE_SIZE = 8192 # Distinct (text, font) widths kept per process
+GRID_LETTERS = string.ascii_uppercase
+
+_register_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def font_files():
+    """Returns {font name: .ttf path} for every custom font found (scanned once per process)."""
+    files = {}
+    if os.path.isdir(FONT_DIR):
+        for entry in sorted(os.listdir(FONT_DIR)):
+            stem, ext = os.path.splitext(entry)
+            if ext.lower() == '.ttf':
+                files[stem] = os.path.join(FONT_DIR, entry)
+    for item in FONT_FILES.split(','):
+        name, _, path = item.partition('=')
+        if name.strip() and path.strip():
+            files[name.strip()] = path.strip()
+    return files
+
+
+def ensure_font(name):
+    """Makes a font usable by name: base-14 or already registered, else registered from its .ttf file."""
+    try:
+        pdfmetrics.getFont(name)
+        return name
+    except KeyError:
+        pass
+    path = font_files().get(name)
+    if path is None:
+        raise ValueError(f"Unknown font '{name}'.")
+    with _register_lock:
+        if name not in pdfmetrics.getRegisteredFontNames():
+            try:
+                pdfmetrics.registerFont(TTFont(name, path))
+            except (TTFError, OSError) as e:
+                raise ValueError(f"Could not load font '{name}' from {path}: {e}")
+            print(f"✅ Registered font {name} ({os.path.basename(path)})", file=sys.stderr)
+    return name
+
+
+def available_fonts():
+    """Names usable in a PageStyle: the standard PDF fonts plus every custom font file."""
+    return sorted(set(pdfmetrics.standardFonts) | set(font_files()))
+
+
+@lru_cache(maxsize=WIDTH_CACHE_SIZE)
+def unit_width(text, font):
+    """Width of text at 1pt. Widths scale linearly with the font size, so one entry serves every size."""
+    return pdfmetrics.stringWidth(text, font, 1)
+
+
+def string_width(text, font, size):
+    """Cached stringWidth: TrueType widths are otherwise summed glyph by glyph in Python on every call."""
+    return unit_width(text, font) * size
+
+
+@lru_cache(maxsize=None)
+def is_monospaced(font):
+    """True if every grid letter has the same width, so a grid row can be drawn as one string."""
+    return len({unit_width(letter, font) for letter in GRID_LETTERS}) == 1
@@ -1,16 +1,28 @@
 import csv
-from word_search_generator import WordSearch
 import io
-import contextlib
 import sys
+import json
+import re
 import random
 import requests
 import os
+import threading
+import time
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from reportlab.lib.pagesizes import letter, A4, legal
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import inch
 from reportlab.lib.colors import lightgrey
 from reportlab.lib import colors 
+from reportlab.pdfbase import pdfmetrics
+from theme_cache import theme_cache
+from lexicon import get_lexicon
+from provider_health import PROBE, get_provider_health
+from fonts import ensure_font, string_width, is_monospaced, GRID_LETTERS
+from memory import MemoryWatch
+from puzzle_builder import build_puzzles, difficulty_level, DEFAULT_PUZZLE_ENGINE, DIFFICULTY_LEVELS, DEFAULT_DIFFICULTY
+import metrics
 
 # --- KDP Large Print Configuration ---
 PAGE_SIZE_MAP = {
@@ -19,328 +31,1102 @@ PAGE_SIZE_MAP = {
     'legal': legal,
 }
 
-# Configuration for PDF drawing
-GRID_FONT = "Courier"
+# Configuration for PDF drawing (font names may also be TrueType fonts, see fonts.py)
+GRID_FONT = os.environ.get('GRID_FONT', "Courier")
 GRID_FONT_SIZE = 16
-WORD_FONT = "Helvetica"
+WORD_FONT = os.environ.get('WORD_FONT', "Helvetica")
 WORD_FONT_SIZE = 11
-HEADING_FONT = "Helvetica-Bold"
+HEADING_FONT = os.environ.get('HEADING_FONT', "Helvetica-Bold")
 HEADING_FONT_SIZE = 16
 PAGE_NUMBER_FONT_SIZE = 9
 BORDER_PADDING = 5
 PUZZLE_TOP_OFFSET = 1.25 * inch
 WORDS_SECTION_OFFSET = 1.0 * inch
 MAX_WORDS_PER_PUZZLE = 20
+# Chunk packing (see pack_word_list): letters per chunk are capped at a share of the grid's cells,
+# and words longer than LONG_WORD_RATIO * size are limited to a few per chunk.
+# The native engine tries several fresh grids per chunk, so it packs tighter.
+PACK_FILL_RATIOS = {'library': 0.5, 'native': 0.75}
+LONG_WORD_RATIO = 0.8
+PACK_MAX_ROUNDS = 3 # Build rounds; words that didn't fit are repacked and retried in the next round
 LEFT_MARGIN = 0.75 * inch
 RIGHT_MARGIN = 0.75 * inch
+# PAGE_FORMS=1 draws repeated page furniture (grid border, section headings) once as a PDF form
+# XObject referenced from every page. With compressed pages it saves nothing measurable
+# (benchmarks/bench_render.py: within +-100 bytes and within timing noise), so it is off by default.
+# Content streams are Flate-compressed.
+USE_PAGE_FORMS = os.environ.get('PAGE_FORMS', '0') == '1'
+PDF_PAGE_COMPRESSION = int(os.environ.get('PDF_PAGE_COMPRESSION', 1))
+# Page layouts (see plan_tiles): 'single' gives every puzzle and every answer key its own page;
+# 'compact-keys' tiles the answer keys several to a page, shrinking their grids as far as
+# KEY_MIN_GRID_FONT_SIZE; 'compact' also tiles puzzles when two or more fit at full size.
+PAGE_LAYOUTS = ('single', 'compact-keys', 'compact')
+DEFAULT_PAGE_LAYOUT = os.environ.get('PAGE_LAYOUT', 'single')
+KEY_MIN_GRID_FONT_SIZE = 8
+TILE_GAP = 0.3 * inch
+TILE_TITLE_FONT_SIZE = 12
+TILE_TITLE_HEIGHT = 20 # Tile top to the top of its grid frame
+FOOTER_HEIGHT = 0.5 * inch + 20 # Kept clear for the page number
 
 # API Keys
 WORDNIK_API_KEY = "" # Leave blank until available
 
-def fetch_expanded_theme_words(themes, target_count=1920):
-    """Fetch expanded unique themed words using multiple comma-separated themes."""
-    
-    def fetch_from_datamuse(theme):
-        # Placeholder: Actual Datamuse fetching logic
-        print(f"[Datamuse] Fetching words for {theme}")
-        results = set()
-        endpoints = [
-            f"https://api.datamuse.com/words?ml={theme}&max=225",
-            f"https://api.datamuse.com/words?topics={theme}&max=225",
-        ]
-        for url in endpoints:
+# Upstream word providers (overridable so a local stub server can stand in)
+DATAMUSE_BASE_URL = os.environ.get('DATAMUSE_BASE_URL', 'https://api.datamuse.com')
+CONCEPTNET_BASE_URL = os.environ.get('CONCEPTNET_BASE_URL', 'https://api.conceptnet.io')
+UPSTREAM_TIMEOUT = 3 # Per-call timeout ceiling in seconds (see provider_health.py for the adaptive timeout)
+FETCH_DEADLINE = float(os.environ.get('FETCH_DEADLINE', 5)) # Overall budget for one fetch_expanded_theme_words call
+FETCH_MAX_WORKERS = int(os.environ.get('FETCH_MAX_WORKERS', 16))
+
+# Where theme words come from:
+#   'online'  - Datamuse + ConceptNet only
+#   'lexicon' - the offline index only (see lexicon.py), never touches the network
+#   'auto'    - the offline index for themes it knows, online providers for the rest
+WORD_SOURCE = os.environ.get('WORD_SOURCE', 'auto')
+
+# Shared keep-alive session and thread pool, created lazily per worker process
+# (gunicorn forks workers, and neither sockets nor threads survive a fork cleanly)
+_http_state = {'pid': None, 'session': None, 'executor': None}
+_http_lock = threading.Lock()
+
+def get_http_session():
+    """Returns this process's pooled requests.Session."""
+    _ensure_http_state()
+    return _http_state['session']
+
+def get_fetch_executor():
+    """Returns this process's thread pool for upstream calls."""
+    _ensure_http_state()
+    return _http_state['executor']
+
+def _ensure_http_state():
+    if _http_state['pid'] == os.getpid():
+        return
+    with _http_lock:
+        if _http_state['pid'] == os.getpid():
+            return
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=FETCH_MAX_WORKERS)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _http_state['session'] = session
+        _http_state['executor'] = ThreadPoolExecutor(max_workers=FETCH_MAX_WORKERS, thread_name_prefix='theme-fetch')
+        _http_state['pid'] = os.getpid()
+
+def datamuse_urls(theme):
+    return [
+        f"{DATAMUSE_BASE_URL}/words?ml={theme}&max=225",
+        f"{DATAMUSE_BASE_URL}/words?topics={theme}&max=225",
+    ]
+
+def conceptnet_urls(theme):
+    return [f"{CONCEPTNET_BASE_URL}/related/c/en/{theme}?filter=/c/en&limit=1000"]
+
+# --- Word Normalization ---
+# Provider bodies are scanned for words with compiled regexes instead of being decoded into
+# JSON objects and filtered item by item; the patterns also do the letters-only/length filter.
+# (Upstream words are ASCII only from here on; \u-escaped letters are skipped.)
+DATAMUSE_WORD_RE = re.compile(r'"word"\s*:\s*"([A-Za-z]{4,12})"')
+CONCEPTNET_TERM_RE = re.compile(r'"@id"\s*:\s*"/c/en/([A-Za-z_]{4,24})"')
+
+# Words never used in a puzzle: the built-in list, WORD_BLOCKLIST_PATH (one word per line,
+# '#' comments) and WORD_BLOCKLIST (comma-separated). Plurals of blocked words are blocked too.
+WORD_BLOCKLIST_PATH = os.environ.get('WORD_BLOCKLIST_PATH', os.path.join(os.getcwd(), 'data', 'blocklist.txt'))
+WORD_BLOCKLIST = os.environ.get('WORD_BLOCKLIST', '')
+DEFAULT_BLOCKLIST = (
+    'ARSE', 'ASSHOLE', 'BASTARD', 'BITCH', 'BOLLOCKS', 'BULLSHIT', 'COCK', 'CUNT', 'DAMN', 'DICK',
+    'DILDO', 'FUCK', 'FUCKER', 'FUCKING', 'HORNY', 'JERKOFF', 'MOTHERFUCKER', 'NAZI', 'ORGASM',
+    'PISS', 'PORN', 'PUSSY', 'SHIT', 'SHITTY', 'SLUT', 'TWAT', 'WANKER', 'WHORE',
+)
+
+def parse_datamuse_words(text):
+    """Words from a raw Datamuse body (a JSON array of {"word": ...} objects)."""
+    return set(map(str.upper, DATAMUSE_WORD_RE.findall(text)))
+
+def parse_conceptnet_words(text):
+    """Words from a raw ConceptNet /related body; multi-word terms are joined (SEA_WATER -> SEAWATER)."""
+    words = (term.replace('_', '').upper() for term in CONCEPTNET_TERM_RE.findall(text))
+    return {word for word in words if 3 < len(word) <= 12}
+
+def plural_key(word):
+    """Rough singular form, so plurals count as duplicates (BOATS -> BOAT, BERRIES -> BERRY, BOXES -> BOX)."""
+    if word.endswith('IES') and len(word) > 4:
+        return word[:-3] + 'Y'
+    if word.endswith(('SSES', 'XES', 'ZES', 'CHES', 'SHES')):
+        return word[:-2]
+    if word.endswith('S') and not word.endswith(('SS', 'US', 'IS')):
+        return word[:-1]
+    return word
+
+@lru_cache(maxsize=None)
+def get_word_blocklist():
+    """Returns the blocked words as a frozenset of plural keys (loaded once per process)."""
+    words = list(DEFAULT_BLOCKLIST)
+    words.extend(WORD_BLOCKLIST.split(','))
+    try:
+        with open(WORD_BLOCKLIST_PATH, encoding='utf-8') as f:
+            words.extend(line.split('#', 1)[0] for line in f)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"⚠️ Could not read word blocklist {WORD_BLOCKLIST_PATH}: {e}", file=sys.stderr)
+    return frozenset(plural_key(word.strip().upper()) for word in words if word.strip())
+
+# source name -> (display label, URL builder, response parser)
+WORD_PROVIDERS = {
+    'datamuse': ('Datamuse', datamuse_urls, parse_datamuse_words),
+    'conceptnet': ('ConceptNet', conceptnet_urls, parse_conceptnet_words),
+}
+
+def _fetch_body(url, timeout=UPSTREAM_TIMEOUT, provider=''):
+    """
+    GETs a URL on the shared session and records the outcome in the provider's health tracker.
+    Returns the response body as text (for the provider's regex parser), or None on a non-200 status.
+    """
+    health = get_provider_health(provider) if provider else None
+    start = time.perf_counter()
+    try:
+        r = get_http_session().get(url, timeout=timeout)
+        if r.status_code == 200:
+            # Both providers send UTF-8 JSON; decoding directly skips requests' charset detection
+            text = r.content.decode('utf-8', 'replace')
+            if health is not None:
+                health.record_success(time.perf_counter() - start)
+            return text
+        metrics.UPSTREAM_ERRORS.inc(provider=provider)
+        if health is not None:
+            # Server errors and rate limiting count against the breaker; other statuses are still answers
+            if r.status_code >= 500 or r.status_code == 429:
+                health.record_failure(f"HTTP {r.status_code}")
+            else:
+                health.record_success(time.perf_counter() - start)
+        return None
+    except Exception as e:
+        metrics.UPSTREAM_ERRORS.inc(provider=provider)
+        if health is not None:
+            health.record_failure(e)
+        raise
+    finally:
+        metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - start, provider=provider)
+
+def _cancel_call(future, call):
+    # A call cancelled before it started never reports to the health tracker; if the breaker's
+    # trial call is cancelled outright, the half-open breaker would otherwise wait on it until
+    # BREAKER_PROBE_TIMEOUT. Any other cancelled call must leave the trial slot alone.
+    if future.cancel() and call.probe is not None:
+        if all(f.cancelled() for other in call.probe for f in other.futures):
+            get_provider_health(call.source).cancel_probe()
+
+class _UpstreamCall:
+    """One provider URL being fetched, possibly by two hedged requests."""
+    __slots__ = ('source', 'theme', 'url', 'timeout', 'hedge_at', 'futures', 'done', 'probe')
+
+    def __init__(self, source, theme, url, timeout, hedge_at, probe=None):
+        self.source = source
+        self.theme = theme
+        self.url = url
+        self.timeout = timeout
+        self.hedge_at = hedge_at # monotonic time to send a duplicate request, or None
+        self.futures = []
+        self.done = False
+        self.probe = probe # Calls making up the breaker's trial call (shared list), or None
+
+def fetch_provider_words(theme_list, deadline=FETCH_DEADLINE):
+    """
+    Fetches every provider URL for every theme concurrently.
+    Returns {(source, theme): words}, a set per fetched key or the cached list.
+
+    Providers whose circuit breaker is open are skipped outright. Each call's timeout adapts
+    to the provider's recent latency, a call still running after the provider's usual (p90)
+    latency gets one hedged duplicate, and calls still running at the deadline, or whose
+    provider's breaker opens meanwhile, are abandoned.
+    """
+    results = {}
+    fetched = [] # (source, theme) keys fetched online in this call
+    failed = set()
+    calls = []
+    executor = get_fetch_executor()
+    started = time.monotonic()
+
+    for theme in theme_list:
+        for source, (label, build_urls, parse) in WORD_PROVIDERS.items():
+            # Repeat themes are served from the shared memory/SQLite cache (see theme_cache.py)
+            cached = theme_cache.get(source, theme) if theme_cache is not None else None
+            if cached is not None:
+                print(f"[Cache] {label} hit for {theme}")
+                results[(source, theme)] = cached
+                continue
+            health = get_provider_health(source)
+            permit = health.allow_request()
+            if not permit:
+                print(f"⚠️ {label} circuit open; skipping {theme}", file=sys.stderr)
+                results[(source, theme)] = []
+                continue
+            print(f"[{label}] Fetching words for {theme}")
+            results[(source, theme)] = set()
+            fetched.append((source, theme))
+            timeout = min(health.timeout(UPSTREAM_TIMEOUT), deadline)
+            hedge_delay = health.hedge_delay()
+            probe = [] if permit == PROBE else None
+            for url in build_urls(theme):
+                call = _UpstreamCall(source, theme, url, timeout,
+                                     None if hedge_delay is None else started + hedge_delay, probe)
+                if probe is not None:
+                    probe.append(call)
+                call.futures.append(executor.submit(_fetch_body, url, timeout, source))
+                calls.append(call)
+
+    pending = {call.futures[0]: call for call in calls}
+    while pending:
+        now = time.monotonic()
+        remaining = deadline - (now - started)
+        if remaining <= 0:
+            break
+        hedge_times = [c.hedge_at for c in calls if not c.done and c.hedge_at is not None and len(c.futures) == 1]
+        wait_for = remaining if not hedge_times else max(0.0, min(remaining, min(hedge_times) - now))
+        done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            call = pending.pop(future, None)
+            if call is None or call.done:
+                continue
+            label = WORD_PROVIDERS[call.source][0]
             try:
-                # Use a small timeout to avoid hanging the web server
-                r = requests.get(url, timeout=3) 
-                if r.status_code == 200:
-                    data = r.json()
-                    for w in data:
-                        word = w.get("word", "").upper()
-                        # Basic filtering
-                        if word.isalpha() and 3 < len(word) <= 12: 
-                            results.add(word)
+                text = future.result()
             except Exception as e:
-                print(f"⚠️ Datamuse error ({theme}): {e}", file=sys.stderr)
-        return list(results)
-
-    def fetch_from_conceptnet(theme):
-        # Placeholder: Actual ConceptNet fetching logic
-        print(f"[ConceptNet] Fetching words for {theme}")
-        results = set()
-        url = f"https://api.conceptnet.io/related/c/en/{theme}?filter=/c/en&limit=1000"
-        try:
-            r = requests.get(url, timeout=3)
-            if r.status_code == 200:
-                data = r.json()
-                if 'related' in data:
-                    for item in data['related']:
-                        term = item.get('@id', '')
-                        if term.startswith('/c/en/'):
-                            word = term.split('/c/en/')[-1].replace('_', '').upper()
-                            if word.isalpha() and 3 < len(word) <= 12:
-                                results.add(word)
-        except Exception as e:
-            print(f"⚠️ ConceptNet error ({theme}): {e}", file=sys.stderr)
-        return list(results)
-
-    all_results = set()
-    theme_list = [t.strip() for t in themes.split(',') if t.strip()]
+                if any(other in pending for other in call.futures):
+                    continue # The hedged twin may still succeed
+                call.done = True
+                failed.add((call.source, call.theme))
+                print(f"⚠️ {label} error ({call.theme}): {e}", file=sys.stderr)
+                continue
+            call.done = True
+            for other in call.futures:
+                # A losing twin finishes in the background and still feeds the latency stats
+                pending.pop(other, None)
+            if text is not None:
+                results[(call.source, call.theme)].update(WORD_PROVIDERS[call.source][2](text))
+
+        now = time.monotonic()
+        for call in calls:
+            if not call.done and call.hedge_at is not None and len(call.futures) == 1 and now >= call.hedge_at:
+                hedge = executor.submit(_fetch_body, call.url, call.timeout, call.source)
+                call.futures.append(hedge)
+                pending[hedge] = call
+                metrics.UPSTREAM_HEDGES.inc(provider=call.source)
+
+        # Don't keep waiting on a provider that has just been declared down; use what the others returned
+        for future, call in list(pending.items()):
+            if get_provider_health(call.source).is_open():
+                del pending[future]
+                _cancel_call(future, call)
+                if not call.done:
+                    call.done = True
+                    failed.add((call.source, call.theme))
+                    print(f"⚠️ {WORD_PROVIDERS[call.source][0]} circuit opened; abandoning {call.theme}", file=sys.stderr)
+
+    for future, call in pending.items():
+        _cancel_call(future, call)
+        if not call.done:
+            call.done = True
+            failed.add((call.source, call.theme))
+            metrics.UPSTREAM_ERRORS.inc(provider=call.source)
+            print(f"⚠️ {WORD_PROVIDERS[call.source][0]} error ({call.theme}): deadline of {deadline}s exceeded", file=sys.stderr)
+
+    for key in fetched:
+        metrics.UPSTREAM_WORDS.inc(len(results[key]), provider=key[0])
+        # Only complete, non-empty answers are cached; failures are retried next time
+        if theme_cache is not None and key not in failed and results[key]:
+            theme_cache.set(key[0], key[1], list(results[key]))
 
+    return results
+
+def fetch_lexicon_words(theme_list):
+    """
+    Looks up themes in the offline lexicon index.
+    Returns ({theme: [words]}, [themes not in the index]).
+    """
+    lexicon = get_lexicon() if WORD_SOURCE != 'online' else None
+    if lexicon is None:
+        return {}, list(theme_list)
+
+    found, missing = {}, []
     for theme in theme_list:
-        d_words = fetch_from_datamuse(theme)
-        c_words = fetch_from_conceptnet(theme)
-        combined_theme_words = list(set(d_words + c_words))
-        all_results.update(combined_theme_words)
+        words = lexicon.related_words(theme)
+        if words is None:
+            missing.append(theme)
+        else:
+            print(f"[Lexicon] {len(words)} words for {theme}")
+            found[theme] = words
+    return found, missing
 
-    combined = list(all_results)
-    random.shuffle(combined)
+def parse_themes(themes):
+    """Splits a comma-separated theme string into a clean list."""
+    return [t.strip() for t in themes.split(',') if t.strip()]
 
-    print(f"✅ Retrieved {len(combined)} unique words across all themes: {', '.join(theme_list)}")
-    return combined[:target_count]
+def collect_theme_words(theme_list):
+    """
+    Fetches the words for each theme: offline lexicon first, then the online providers
+    (all concurrently) for any theme the lexicon doesn't know.
+    Returns {theme: [word collections, one per source]}; merge_words combines them.
+    """
+    theme_words = {theme: [] for theme in theme_list}
+
+    with metrics.stage('fetch'):
+        local_words, online_themes = fetch_lexicon_words(theme_list)
+        for theme, words in local_words.items():
+            theme_words[theme].append(words)
 
-def split_word_list(words):
-    """Splits a long list of words into chunks for individual puzzles."""
-    return [words[i:i + MAX_WORDS_PER_PUZZLE] for i in range(0, len(words), MAX_WORDS_PER_PUZZLE)]
+        if WORD_SOURCE == 'lexicon':
+            if online_themes:
+                print(f"⚠️ Themes not in the offline lexicon: {', '.join(online_themes)}", file=sys.stderr)
+        elif online_themes:
+            for (source, theme), words in fetch_provider_words(online_themes).items():
+                theme_words[theme].append(words)
+
+    return theme_words
+
+def merge_words(word_sources):
+    """
+    Combines word collections from every theme and source: duplicates and blocked words are
+    dropped with bulk set operations, then a plural is dropped when its singular is also in
+    the pool (BOATS goes when BOAT is there). Returns the word pool as a new list.
+    """
+    pool = set()
+    for words in word_sources:
+        pool.update(words)
+    blocked = get_word_blocklist()
+    pool.difference_update(blocked)
+    # Only words ending in S can be plurals, so the per-word work is limited to those
+    for word in [word for word in pool if word[-1] == 'S']:
+        key = plural_key(word)
+        if key != word and (key in pool or key in blocked):
+            pool.discard(word)
+    return list(pool)
+
+def sample_words(pool, target_count, rng=None):
+    """Shuffles a word pool in place and returns its first target_count words."""
+    if rng is None:
+        random.shuffle(pool)
+    else:
+        # Set order varies between processes, so sort before a reproducible shuffle
+        pool.sort()
+        rng.shuffle(pool)
+    del pool[target_count:]
+    return pool
+
+def select_words(word_sources, target_count, rng=None):
+    """Merges word collections (see merge_words) and returns up to target_count of them, shuffled."""
+    return sample_words(merge_words(word_sources), target_count, rng)
+
+def fetch_expanded_theme_words(themes, target_count=1920, rng=None):
+    """
+    Fetch expanded unique themed words using multiple comma-separated themes.
+    Pass a seeded random.Random as rng for a reproducible selection.
+    """
+    theme_list = parse_themes(themes)
+    theme_words = collect_theme_words(theme_list)
+    pool = merge_words(words for sources in theme_words.values() for words in sources)
+
+    print(f"✅ Retrieved {len(pool)} unique words across all themes: {', '.join(theme_list)}")
+    return sample_words(pool, target_count, rng)
+
+# Map the offline index at import time so the first request doesn't pay for it
+if WORD_SOURCE != 'online':
+    get_lexicon()
+
+def pack_word_list(words, size, fill_ratio=0.5):
+    """
+    Packs words into chunks that will fit a size x size grid: at most MAX_WORDS_PER_PUZZLE words,
+    at most fill_ratio * size^2 letters, and only size // 3 (minimum 2) words close to the grid width.
+    Each word goes into the first open chunk with room for it, so input order is mostly kept.
+    Returns (chunks, words longer than the grid).
+    """
+    letter_budget = max(size, int(fill_ratio * size * size))
+    long_limit = max(2, size // 3)
+    chunks = [] # [words, letters, long words]
+    too_long = []
+    for word in words:
+        length = len(word)
+        if length > size:
+            too_long.append(word)
+            continue
+        is_long = length > LONG_WORD_RATIO * size
+        for chunk in chunks:
+            if (len(chunk[0]) < MAX_WORDS_PER_PUZZLE and chunk[1] + length <= letter_budget
+                    and (not is_long or chunk[2] < long_limit)):
+                break
+        else:
+            chunk = [[], 0, 0]
+            chunks.append(chunk)
+        chunk[0].append(word)
+        chunk[1] += length
+        chunk[2] += is_long
+    return [chunk[0] for chunk in chunks], too_long
+
+def wrap_text(text, font, size, max_width):
+    """Splits text into lines no wider than max_width (a single over-long word gets its own line)."""
+    lines = []
+    current_line = ""
+    line_width = 0.0
+    space_width = string_width(" ", font, size)
+    for word in text.split():
+        # Widths add up (no kerning), so each word is measured once instead of re-measuring the whole line
+        word_width = string_width(word, font, size)
+        test_width = line_width + space_width + word_width if current_line else word_width
+        if test_width > max_width:
+            lines.append(current_line)
+            current_line = word
+            line_width = word_width
+        else:
+            current_line = f"{current_line} {word}" if current_line else word
+            line_width = test_width
+    if current_line:
+        lines.append(current_line)
+    return lines
 
 def draw_wrapped_lines(pdf, text, x, y, font, size, line_h, page_w, page_h, margin_left, margin_right, margin_bottom):
     """Draws text and wraps it within the page boundaries."""
     pdf.setFont(font, size)
-    words = text.split()
-    max_width = page_w - margin_left - margin_right
-    current_line = ""
     
     # Handle the case where Y is already too low (unlikely but safe)
     if y < margin_bottom:
         return y
-        
-    for word in words:
-        test_line = f"{current_line} {word}".strip()
-        # ReportLab stringWidth returns the width of the string in the current font
-        if pdf.stringWidth(test_line, font, size) > max_width:
-            pdf.drawString(margin_left, y, current_line)
-            y -= line_h
-            if y < margin_bottom:
-                # Do not showPage here, let the caller handle new pages
-                pdf.setFont(font, size)
-                return y # Signal to the caller that the page space is exhausted
-            current_line = word
-        else:
-            current_line = test_line
-    if current_line:
-        pdf.drawString(margin_left, y, current_line)
+
+    lines = wrap_text(text, font, size, page_w - margin_left - margin_right)
+    for i, line in enumerate(lines):
+        pdf.drawString(margin_left, y, line)
         y -= line_h
+        if y < margin_bottom and i < len(lines) - 1:
+            # Do not showPage here, let the caller handle new pages
+            pdf.setFont(font, size)
+            return y # Signal to the caller that the page space is exhausted
     return y
 
-def draw_grid(pdf, puzzle, page_w, page_h, margin, highlight=False):
-    """Draws the word search grid and optional solution highlight."""
-    pdf.setFont(GRID_FONT, GRID_FONT_SIZE)
-    
-    # --- Grid Sizing and Positioning ---
-    
-    # Measure the width of the full first line (required to center)
-    first_line = " ".join(puzzle.puzzle[0])
-    line_width = pdf.stringWidth(first_line, GRID_FONT, GRID_FONT_SIZE)
-    
-    # Line height used for drawing text
-    line_height = GRID_FONT_SIZE + 2 
-    grid_height = puzzle.size * line_height
+class PageStyle:
+    """Fonts and sizes for one rendered book; anything not given uses the module defaults above."""
+    __slots__ = ('grid_font', 'grid_font_size', 'word_font', 'word_font_size', 'heading_font', 'heading_font_size')
 
-    # X and Y coordinates for the grid's top-left corner
-    x0 = (page_w - line_width) / 2
-    y0 = page_h - PUZZLE_TOP_OFFSET - grid_height
+    def __init__(self, grid_font=None, grid_font_size=None, word_font=None, word_font_size=None,
+                 heading_font=None, heading_font_size=None):
+        self.grid_font = grid_font or GRID_FONT
+        self.grid_font_size = grid_font_size or GRID_FONT_SIZE
+        self.word_font = word_font or WORD_FONT
+        self.word_font_size = word_font_size or WORD_FONT_SIZE
+        self.heading_font = heading_font or HEADING_FONT
+        self.heading_font_size = heading_font_size or HEADING_FONT_SIZE
+        for font in (self.grid_font, self.word_font, self.heading_font):
+            ensure_font(font)
 
-    # --- Draw Border ---
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{name: (data or {}).get(name) for name in cls.__slots__})
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def check_fits(self, size, page_w):
+        """Raises ValueError if a size x size grid in this grid font is wider than the page's text area."""
+        geo = grid_geometry(self.grid_font, self.grid_font_size, size, page_w, 0)
+        if geo.line_width + 2 * BORDER_PADDING > page_w - LEFT_MARGIN - RIGHT_MARGIN:
+            raise ValueError(f"A {size}x{size} grid at {self.grid_font_size}pt does not fit this page size.")
+
+DEFAULT_STYLE = PageStyle()
+
+def draw_form(pdf, name, draw_fn):
+    """Draws reusable page furniture, defining it as a form XObject on its first use in this PDF."""
+    if not USE_PAGE_FORMS:
+        draw_fn(pdf)
+        return
+    defined = pdf.__dict__.setdefault('_page_forms', set())
+    if name not in defined:
+        # saveState/restoreState keep the form's font and colour changes from leaking into the page
+        pdf.saveState()
+        pdf.beginForm(name)
+        draw_fn(pdf)
+        pdf.endForm()
+        pdf.restoreState()
+        defined.add(name)
+    pdf.doForm(name)
+
+def draw_page_frame(pdf, kind, size, page_w, page_h, heading, heading_y, style=None):
+    """
+    Draws the static parts of a puzzle or answer-key page (grid frame plus section heading)
+    as a single form, so each page references it with one operator.
+    """
+    style = style or DEFAULT_STYLE
+    def frame(p):
+        draw_grid_border(p, grid_geometry(style.grid_font, style.grid_font_size, size, page_w, page_h))
+        p.setFont(style.heading_font, 12)
+        p.drawString(LEFT_MARGIN, heading_y, heading)
+    draw_form(pdf, f"{kind}Frame{size}", frame)
+
+class GridGeometry:
+    """Precomputed layout of an N x N grid for one font, font size and page size."""
+    __slots__ = ('x0', 'y0', 'line_width', 'line_height', 'grid_height', 'cell_width', 'letter_width',
+                 'monospaced', 'col_x', 'row_y')
+
+    def __init__(self, font, font_size, size, page_w, page_h, top_offset=PUZZLE_TOP_OFFSET):
+        # Every cell has the same pitch: the widest letter plus one space. In a monospaced font
+        # that is exactly where " ".join(row) puts each letter; other fonts are centred per cell
+        letter_width = max(pdfmetrics.stringWidth(letter, font, font_size) for letter in GRID_LETTERS)
+        space_width = pdfmetrics.stringWidth(" ", font, font_size)
+        self.letter_width = letter_width
+        self.monospaced = is_monospaced(font)
+        self.cell_width = letter_width + space_width
+        # Width of a full " ".join(row) line, used to center the grid
+        self.line_width = size * letter_width + (size - 1) * space_width
+        # Line height used for drawing text
+        self.line_height = font_size + 2
+        self.grid_height = size * self.line_height
+
+        # X and Y coordinates for the grid's top-left corner
+        self.x0 = (page_w - self.line_width) / 2
+        self.y0 = page_h - top_offset - self.grid_height
+
+        # Left edge of each column and text baseline of each row
+        self.col_x = tuple(self.x0 + c * self.cell_width for c in range(size))
+        top_baseline = self.y0 + self.grid_height - (font_size / 2)
+        self.row_y = tuple(top_baseline - r * self.line_height for r in range(size))
+
+@lru_cache(maxsize=64)
+def grid_geometry(font, font_size, size, page_w, page_h, top_offset=PUZZLE_TOP_OFFSET):
+    """
+    Returns the shared GridGeometry for a font/grid/page combination (computed once per process).
+    The grid is centred across page_w with its top top_offset below page_h.
+    """
+    return GridGeometry(font, font_size, size, page_w, page_h, top_offset)
+
+def word_path(info):
+    """Returns (start_row, start_col, d_row, d_col) for a key entry, or None if it can't be read."""
+    # Handle potential differences in WordSearch library key structure
+    try:
+        # Try accessing start as a tuple (used in generator.py context)
+        sr, sc = info['start']
+    except (KeyError, TypeError):
+        # Fallback to accessing start as an object (used in Word_Puzzle.py context)
+        sr, sc = info['start'].row, info['start'].column
+
+    try:
+        # Direction is an Enum with a .value tuple (r_change, c_change),
+        # or already a plain tuple for puzzles built in a worker process
+        direction = info['direction']
+        d_row, d_col = getattr(direction, 'value', direction)
+    except (TypeError, ValueError):
+        # Should not happen if WordSearch is used correctly, but good to handle
+        return None
+    return sr, sc, d_row, d_col
+
+def draw_grid_border(pdf, geo):
+    """Draws the frame around a grid."""
     pdf.setStrokeColorRGB(0, 0, 0)
     pdf.setLineWidth(1)
-    pdf.rect(x0 - BORDER_PADDING, y0 - BORDER_PADDING, 
-             line_width + 2 * BORDER_PADDING, grid_height + 2 * BORDER_PADDING)
+    pdf.rect(geo.x0 - BORDER_PADDING, geo.y0 - BORDER_PADDING, 
+             geo.line_width + 2 * BORDER_PADDING, geo.grid_height + 2 * BORDER_PADDING)
+
+def draw_grid(pdf, puzzle, page_w, page_h, margin, highlight=False, border=True, style=None,
+              font_size=None, top_offset=PUZZLE_TOP_OFFSET):
+    """
+    Draws the word search grid and optional solution highlight.
+    Pass border=False when the frame is already part of a page form (see draw_page_frame).
+    font_size overrides the style's grid font size (used for tiled answer keys).
+    """
+    style = style or DEFAULT_STYLE
+    font_size = font_size or style.grid_font_size
+    pdf.setFont(style.grid_font, font_size)
+    geo = grid_geometry(style.grid_font, font_size, puzzle.size, page_w, page_h, top_offset)
+
+    # --- Draw Border ---
+    if border:
+        draw_grid_border(pdf, geo)
 
-    # --- Calculate Highlight Positions (FIXED PATH TRACING) ---
-    highlight_pos = set()
+    # --- Draw Highlights ---
+    # Each highlight box covers a letter plus its trailing space and sits half a font size
+    # below the baseline. Horizontal and vertical words become a single box per word;
+    # diagonal words still need one box per letter. All boxes share one filled path.
     if highlight:
+        path = pdf.beginPath()
         for word, info in puzzle.key.items():
-            # Handle potential differences in WordSearch library key structure
-            try:
-                # Try accessing start as a tuple (used in generator.py context)
-                sr, sc = info['start']
-            except (KeyError, TypeError):
-                # Fallback to accessing start as an object (used in Word_Puzzle.py context)
-                sr, sc = info['start'].row, info['start'].column
-                
-            try:
-                # Direction is an Enum with a .value tuple (r_change, c_change)
-                d_row, d_col = info['direction'].value
-            except AttributeError:
-                # Should not happen if WordSearch is used correctly, but good to handle
+            placement = word_path(info)
+            if placement is None:
                 continue
+            sr, sc, d_row, d_col = placement
+            n = len(word)
+            er, ec = sr + (n - 1) * d_row, sc + (n - 1) * d_col
+            if d_row == 0:
+                c_min = min(sc, ec)
+                path.rect(geo.col_x[c_min], geo.row_y[sr] - font_size / 2,
+                          n * geo.cell_width, geo.line_height)
+            elif d_col == 0:
+                r_max = max(sr, er)
+                path.rect(geo.col_x[sc], geo.row_y[r_max] - font_size / 2,
+                          geo.cell_width, n * geo.line_height)
+            else:
+                for i in range(n):
+                    path.rect(geo.col_x[sc + i * d_col], geo.row_y[sr + i * d_row] - font_size / 2,
+                              geo.cell_width, geo.line_height)
+        pdf.setFillColor(lightgrey)
+        pdf.drawPath(path, fill=1, stroke=0)
+        pdf.setFillColor(colors.black) 
 
-            # Trace the entire path of the word
-            for i in range(len(word)):
-                highlight_pos.add((sr + i * d_row, sc + i * d_col))
-    # --- End Highlight Positions ---
-
-    # --- Draw Grid Content and Highlights (FIXED DRAWING LOGIC) ---
-    # y is the baseline for the current line of text
-    # y calculation from Word_Puzzle.py
-    y = y0 + grid_height - (GRID_FONT_SIZE / 2) 
-    
-    for r in range(puzzle.size):
-        line = " ".join(puzzle.puzzle[r])
-        
-        if highlight:
-            for c in range(puzzle.size):
-                if (r, c) in highlight_pos:
-                    cell_text = puzzle.puzzle[r][c]
-                    
-                    # 1. Calculate X Position (using the accurate text-before-measurement from Word_Puzzle.py)
-                    text_before = " ".join(puzzle.puzzle[r][:c])
-                    
-                    # x_cell is the baseline start of the highlighted character/space block
-                    # The (" " if c > 0 else "") adds the preceding space width for all but the first character.
-                    x_cell = x0 + pdf.stringWidth(text_before + (" " if c > 0 else ""), GRID_FONT, GRID_FONT_SIZE)
-                    
-                    # 2. Calculate Rect Y Position (from Word_Puzzle.py, relative to baseline y)
-                    rect_y = y - GRID_FONT_SIZE / 2 
-                    
-                    # 3. Calculate Rect Dimensions
-                    # The width is the character's width plus the space width
-                    cell_width = pdf.stringWidth(cell_text, GRID_FONT, GRID_FONT_SIZE) + pdf.stringWidth(" ", GRID_FONT, GRID_FONT_SIZE)
-                    rect_height = GRID_FONT_SIZE + 2 # Use the established line height
-                    
-                    # Draw the rectangle
-                    pdf.setFillColor(lightgrey)
-                    pdf.rect(x_cell, rect_y, cell_width, rect_height, fill=1, stroke=0)
-                    pdf.setFillColor(colors.black) 
-        
-        # Draw the line text (this must happen after the highlight rects are drawn)
-        pdf.drawString(x0, y, line)
-        
-        # Advance Y position
-        y -= line_height
+    # --- Draw Grid Content ---
+    # Drawn after the highlight boxes so the letters sit on top
+    rows = puzzle.puzzle # Read once: compact records rebuild their rows on each access
+    if geo.monospaced:
+        for r in range(puzzle.size):
+            pdf.drawString(geo.x0, geo.row_y[r], " ".join(rows[r]))
+    else:
+        # Proportional fonts: each letter centred in its cell, placed with short relative moves
+        # (rounded to 0.1pt) inside one text object to keep the page stream small
+        text = pdf.beginText()
+        for r in range(puzzle.size):
+            text.setTextOrigin(geo.x0, geo.row_y[r])
+            x = 0.0
+            for c, letter in enumerate(rows[r]):
+                pad = (geo.letter_width - string_width(letter, style.grid_font, font_size)) / 2
+                target = round(geo.col_x[c] - geo.x0 + pad, 1)
+                text.moveCursor(target - x, 0)
+                text.textOut(letter)
+                x = target
+        pdf.drawText(text)
         
-    return y0
+    return geo.y0
 
-def add_page_number(pdf, page_w, margin, page_num):
+def add_page_number(pdf, page_w, margin, page_num, font=WORD_FONT):
     """Adds a page number to the bottom right."""
-    pdf.setFont(WORD_FONT, PAGE_NUMBER_FONT_SIZE)
+    pdf.setFont(font, PAGE_NUMBER_FONT_SIZE)
     pdf.drawRightString(page_w - margin, 0.5 * inch, str(page_num))
 
-def generate_word_search_pdf(width: int, height: int, themes: str, word_count: int, page_size_str: str, output_path: str):
+# --- Page Layout Engine ---
+
+class TileLayout:
+    """Equal tiles in rows and columns below the page heading, each holding one puzzle or answer key."""
+    __slots__ = ('columns', 'rows', 'font_size', 'tile_w', 'tile_h', 'left', 'top')
+
+    def __init__(self, columns, rows, font_size, tile_w, tile_h, left, top):
+        self.columns = columns
+        self.rows = rows
+        self.font_size = font_size # Grid font size inside the tiles
+        self.tile_w = tile_w
+        self.tile_h = tile_h
+        self.left = left
+        self.top = top
+
+    @property
+    def per_page(self):
+        return self.columns * self.rows
+
+    def origin(self, slot):
+        """Bottom-left corner of tile number slot, counting across then down from the top left."""
+        row, col = divmod(slot, self.columns)
+        return (self.left + col * (self.tile_w + TILE_GAP),
+                self.top - (row + 1) * self.tile_h - row * TILE_GAP)
+
+def tile_word_lines(p, tile_w, style):
+    return wrap_text(", ".join(p['words']), style.word_font, style.word_font_size, tile_w)
+
+def plan_tiles(puzzles, page_size, style, with_words, min_font_size):
+    """
+    Chooses how to tile a section: for each grid font size from the style's down to min_font_size,
+    how many tiles fit across and down, keeping the largest size that gives the fewest pages.
+    with_words reserves room under each grid for its word list (puzzle tiles).
+    Returns a TileLayout, or None when fewer than two tiles fit on a page.
+    """
+    if not puzzles:
+        return None
+    page_w, page_h = page_size
+    size = max(p['puzzle'].size for p in puzzles)
+    line_h = style.word_font_size + 3
+    left = LEFT_MARGIN
+    top = page_h - LEFT_MARGIN - style.heading_font_size # Below the page heading
+    usable_w = page_w - LEFT_MARGIN - RIGHT_MARGIN
+    usable_h = top - FOOTER_HEIGHT
+
+    best_pages, best = None, None
+    for font_size in range(style.grid_font_size, min_font_size - 1, -1):
+        geo = grid_geometry(style.grid_font, font_size, size, page_w, page_h)
+        columns = int((usable_w + TILE_GAP) // (geo.line_width + 2 * BORDER_PADDING + TILE_GAP))
+        if columns < 1:
+            continue
+        tile_w = (usable_w - (columns - 1) * TILE_GAP) / columns
+        tile_h = TILE_TITLE_HEIGHT + geo.grid_height + 2 * BORDER_PADDING
+        if with_words:
+            # Word-list heading and lines, plus a line of space above and below
+            lines = max(len(tile_word_lines(p, tile_w, style)) for p in puzzles)
+            tile_h += line_h * (lines + 2)
+        rows = int((usable_h + TILE_GAP) // (tile_h + TILE_GAP))
+        if rows < 1:
+            continue
+        pages = -(-len(puzzles) // (columns * rows))
+        if best_pages is None or pages < best_pages:
+            best_pages = pages
+            best = TileLayout(columns, rows, font_size, tile_w, tile_h, left, top)
+    if best is None or best.per_page < 2:
+        return None
+    return best
+
+def draw_tile(pdf, p, tiles, kind, x, y, style):
+    """Draws one puzzle (kind 'Puzzle', with its word list) or answer key (kind 'Key') in the tile at (x, y)."""
+    puzzle = p['puzzle']
+    top_offset = TILE_TITLE_HEIGHT + BORDER_PADDING
+    line_h = style.word_font_size + 3
+    pdf.saveState()
+    pdf.translate(x, y)
+    pdf.setFont(style.heading_font, TILE_TITLE_FONT_SIZE)
+    pdf.drawCentredString(tiles.tile_w / 2, tiles.tile_h - TILE_TITLE_FONT_SIZE, f"Puzzle #{puzzle.index}")
+
+    geo = grid_geometry(style.grid_font, tiles.font_size, puzzle.size, tiles.tile_w, tiles.tile_h, top_offset)
+    heading_y = geo.y0 - BORDER_PADDING - line_h
+    def frame(f):
+        draw_grid_border(f, geo)
+        if kind == 'Puzzle':
+            f.setFont(style.heading_font, style.word_font_size)
+            f.drawString(0, heading_y, "Words to Find:")
+    draw_form(pdf, f"{kind}Tile{puzzle.size}_{tiles.font_size}", frame)
+    draw_grid(pdf, puzzle, tiles.tile_w, tiles.tile_h, 0, highlight=kind == 'Key', border=False, style=style,
+              font_size=tiles.font_size, top_offset=top_offset)
+    if kind == 'Puzzle':
+        for line in tile_word_lines(p, tiles.tile_w, style):
+            heading_y -= line_h
+            pdf.setFont(style.word_font, style.word_font_size)
+            pdf.drawString(0, heading_y, line)
+    pdf.restoreState()
+
+def draw_tiled_page(pdf, chunk, tiles, kind, heading, page_w, page_h, style):
+    pdf.setFont(style.heading_font, style.heading_font_size)
+    pdf.drawCentredString(page_w / 2, page_h - LEFT_MARGIN, heading)
+    for slot, p in enumerate(chunk):
+        x, y = tiles.origin(slot)
+        draw_tile(pdf, p, tiles, kind, x, y, style)
+
+def draw_puzzle_page(pdf, p, page_w, page_h, title_prefix, style):
+    """One full-page puzzle: title, grid and word list."""
+    puzzle = p['puzzle']
+    margin = LEFT_MARGIN
+    line_h = style.word_font_size + 3 # Line height for word lists (14 at the default 11pt)
+
+    # Title
+    y_top = page_h - margin
+    pdf.setFont(style.heading_font, style.heading_font_size)
+    pdf.drawCentredString(page_w / 2, y_top, f"{title_prefix}Word Search Puzzle #{puzzle.index}")
+
+    # Grid
+    # draw_grid returns the Y coordinate of the bottom of the grid area
+    grid_bottom_y = draw_grid(pdf, puzzle, page_w, page_h, margin, border=False, style=style)
+
+    # Grid Frame and Word List Header
+    y_current = grid_bottom_y - WORDS_SECTION_OFFSET
+    draw_page_frame(pdf, "Puzzle", puzzle.size, page_w, page_h, "Words to Find (Alphabetical):", y_current, style)
+    y_current -= line_h # Move to the start of the word list
+
+    # Word List
+    # margin_bottom: ensure we leave space for the page number
+    draw_wrapped_lines(pdf, ", ".join(p['words']), LEFT_MARGIN, y_current,
+                       style.word_font, style.word_font_size, line_h,
+                       page_w, page_h, LEFT_MARGIN, RIGHT_MARGIN, FOOTER_HEIGHT)
+
+def draw_key_page(pdf, p, page_w, page_h, title_prefix, style):
+    """One full-page answer key: title, highlighted grid and word list."""
+    puzzle = p['puzzle']
+    margin = LEFT_MARGIN
+    line_h = style.word_font_size + 3
+
+    # Title
+    y_top = page_h - margin
+    pdf.setFont(style.heading_font, style.heading_font_size)
+    pdf.drawCentredString(page_w / 2, y_top, f"{title_prefix}Puzzle #{puzzle.index} – Answer Key")
+
+    # Grid (Highlighted)
+    draw_grid(pdf, puzzle, page_w, page_h, margin, highlight=True, border=False, style=style)
+
+    # Grid Frame and Word List (for reference)
+    y_bottom = margin + 60
+    draw_page_frame(pdf, "Key", puzzle.size, page_w, page_h, "Answer Key Word List:", y_bottom, style)
+    y_bottom -= line_h
+    draw_wrapped_lines(pdf, ", ".join(p['words']), LEFT_MARGIN, y_bottom,
+                       style.word_font, style.word_font_size, line_h,
+                       page_w, page_h, LEFT_MARGIN, RIGHT_MARGIN, margin)
+
+def plan_sections(puzzles, page_size, style, layout):
+    """[(kind, TileLayout or None)] for the puzzle and answer-key sections of a book."""
+    if layout not in PAGE_LAYOUTS:
+        raise ValueError(f"Page layout must be one of: {', '.join(PAGE_LAYOUTS)}.")
+    puzzle_tiles = None
+    key_tiles = None
+    if layout == 'compact':
+        # Puzzles are never shrunk; they only share a page when they fit at full size
+        puzzle_tiles = plan_tiles(puzzles, page_size, style, True, style.grid_font_size)
+    if layout != 'single':
+        key_tiles = plan_tiles(puzzles, page_size, style, False, min(KEY_MIN_GRID_FONT_SIZE, style.grid_font_size))
+    return [('Puzzle', puzzle_tiles), ('Key', key_tiles)]
+
+def count_pages(puzzles, sections):
+    return sum(-(-len(puzzles) // (tiles.per_page if tiles else 1)) for _, tiles in sections)
+
+def generate_word_search_pdf(width: int, height: int, themes: str, word_count: int, page_size_str: str, output_path: str, engine: str = None, progress=None, seed=None, layout: str = None, difficulty: str = None):
     """
     Main function to generate the Word Search PDF based on user parameters.
+    progress, if given, is called with keyword counters as the job advances
+    (words_fetched, puzzles_built, puzzles_total, pages_rendered, pages_total).
+    seed, if given, makes the word selection, puzzle layouts and PDF bytes reproducible.
+    layout is one of PAGE_LAYOUTS; 'compact-keys' and 'compact' fit several keys/puzzles per page.
+    difficulty is one of DIFFICULTY_LEVELS ('easy', 'medium', 'hard'; default DEFAULT_DIFFICULTY).
     """
     
     # 1. Setup
     global THEME 
     THEME = themes.split(',')[0].strip().capitalize() if themes else "Themed"
+    # Captured locally: background jobs run concurrently and would otherwise race on the global
+    title_prefix = f"{THEME} " if THEME else ""
+    watch = MemoryWatch()
+    report = watch.wrap(progress)
     page_size = PAGE_SIZE_MAP.get(page_size_str, letter)
     
-    # Ensure the output directory exists
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    # Ensure the output directory exists (output_path may also be a writable file-like buffer)
+    if isinstance(output_path, (str, os.PathLike)):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
     
     # 2. Fetch Words
     # We fetch a large pool of words and then distribute them
-    all_words = fetch_expanded_theme_words(themes, target_count=word_count)
+    all_words = fetch_puzzle_words(themes, word_count, seed=seed, progress=report)
+
+    # 3. Create Puzzles
+    puzzles = build_collection(all_words, max(width, height), engine=engine, seed=seed, progress=report,
+                               difficulty=difficulty)
+
+    # 4. Generate PDF
+    render_collection_pdf(puzzles, output_path, page_size, title_prefix,
+                          invariant=seed is not None, progress=report, layout=layout)
+    record_peak_memory(watch, progress)
+    return output_path
+
+def record_peak_memory(watch, progress=None):
+    """Records a finished job's peak RSS (MB): in its progress fields, the metrics and the log."""
+    peak = watch.finish()
+    metrics.JOB_PEAK_RSS.observe(peak)
+    metrics.count('peak_rss_mb', peak)
+    if progress is not None:
+        progress(peak_rss_mb=peak)
+    print(f"✅ Peak memory {peak:.1f}MB")
+    return peak
 
+def fetch_puzzle_words(themes, word_count, seed=None, progress=None):
+    """Fetches the word pool for one collection; raises (for Flask to display) if no words came back."""
+    rng = random.Random(seed) if seed is not None else None
+    all_words = fetch_expanded_theme_words(themes, target_count=word_count, rng=rng)
     if not all_words:
-        # Raise an exception that Flask will catch and display to the user
         raise Exception("Word list generation failed. Try a different theme or reduce the word count.")
+    if progress is not None:
+        progress(words_fetched=len(all_words))
+    metrics.count('words', len(all_words))
+    return all_words
 
-    # 3. Create Puzzles
-    puzzle_sets = [sorted(chunk) for chunk in split_word_list(all_words)]
+def build_collection(all_words, puzzle_size, engine=None, seed=None, progress=None, difficulty=None):
+    """
+    Packs the word pool into grid-sized chunks and builds one puzzle per chunk.
+    Returns a list of {'puzzle': ..., 'words': [...]}; raises if nothing could be built.
+    """
+    return list(iter_collection(all_words, puzzle_size, engine=engine, seed=seed, progress=progress,
+                                difficulty=difficulty))
+
+def iter_collection(all_words, puzzle_size, engine=None, seed=None, progress=None, difficulty=None):
+    """
+    Yields {'puzzle': ..., 'words': [...]} for each puzzle as soon as it is built, numbered 1, 2, ...
+    Words a chunk couldn't place go back into the pool and are repacked (more loosely) into
+    new chunks, for up to PACK_MAX_ROUNDS rounds. Raises at the end if nothing could be built.
+    Every grid is checked so each listed word reads exactly once (see solvability.py).
+    """
+    report = progress or (lambda **fields: None)
+    level = difficulty_level(difficulty)
+    fill_ratio = PACK_FILL_RATIOS.get(engine or DEFAULT_PUZZLE_ENGINE, 0.5)
+    puzzle_sets, too_long = pack_word_list(all_words, puzzle_size, fill_ratio)
+    if too_long:
+        print(f"⚠️ {len(too_long)} words are longer than the {puzzle_size}x{puzzle_size} grid and were left out.")
     print(f"Generating {len(puzzle_sets)} puzzles...")
 
-    puzzles = []
-    for i, words in enumerate(puzzle_sets, 1):
-        words_str = ", ".join(words)
-        # Use the larger of width/height for the square puzzle size
-        puzzle_size = max(width, height)
-        
-        # Suppress stdout/stderr during puzzle generation as it can be noisy
-        with contextlib.redirect_stdout(sys.stderr):
-            # The library can raise a GenerationError if it can't fit all words
-            try:
-                puzzle = WordSearch(words_str, size=puzzle_size, level=3) # Difficulty level is 3 (medium)
-                puzzle.index = i
-                puzzles.append({'puzzle': puzzle, 'words': words})
-            except Exception as e:
-                print(f"⚠️ Could not generate puzzle #{i} with words: {words}. Skipping. Error: {e}")
-                # Log this error but continue with the next puzzle if possible
+    # Chunks are built across a process pool (see puzzle_builder.py); results come back in order
+    built = 0
+    attempted = 0
+    retried = 0
+    report(puzzles_built=0, puzzles_total=len(puzzle_sets))
+    with metrics.stage('build'):
+        for round_number in range(1, PACK_MAX_ROUNDS + 1):
+            leftovers = []
+            results = build_puzzles([sorted(chunk) for chunk in puzzle_sets], puzzle_size, level=level,
+                                    engine=engine, seed=seed, start_index=attempted + 1)
+            for (i, words, puzzle, error), chunk in zip(results, puzzle_sets):
+                if error is not None:
+                    print(f"⚠️ Could not generate puzzle #{i} with words: {words}. Returning them to the pool. Error: {error}")
+                    leftovers.extend(chunk)
+                    continue
+                placed = set(words)
+                leftovers.extend(word for word in chunk if word not in placed)
+                # Number the finished puzzles consecutively (failed chunks and retry rounds leave gaps)
+                built += 1
+                puzzle.index = built
+                report(puzzles_built=built)
+                yield {'puzzle': puzzle, 'words': words}
+            attempted += len(puzzle_sets)
 
-    if not puzzles:
+            if not leftovers:
+                break
+            if round_number == PACK_MAX_ROUNDS:
+                print(f"⚠️ {len(leftovers)} words still didn't fit after {PACK_MAX_ROUNDS} rounds: {', '.join(leftovers)}")
+                break
+            # Fewer letters per grid leaves more room for the words that failed to fit
+            fill_ratio *= 0.75
+            retried += len(leftovers)
+            puzzle_sets, _ = pack_word_list(leftovers, puzzle_size, fill_ratio)
+            print(f"Retrying {len(leftovers)} words in {len(puzzle_sets)} more puzzles...")
+            report(puzzles_total=built + len(puzzle_sets))
+
+    metrics.count('puzzles', built)
+    metrics.count('attempts', attempted)
+    metrics.count('retried', retried)
+
+    if not built:
          raise Exception("Could not successfully generate any puzzles with the provided words and size.")
 
+def render_collection_pdf(puzzles, output_path, page_size, title_prefix="", invariant=False, progress=None, style=None, layout=None):
+    """
+    Renders puzzle pages followed by answer-key pages.
+    puzzles is a list of {'puzzle': <puzzle/key/size/index object>, 'words': [...]}.
+    style is a PageStyle (fonts and sizes); None uses the module defaults.
+    layout is one of PAGE_LAYOUTS (default DEFAULT_PAGE_LAYOUT).
+    """
+    report = progress or (lambda **fields: None)
+    style = style or DEFAULT_STYLE
+    sections = plan_sections(puzzles, page_size, style, layout or DEFAULT_PAGE_LAYOUT)
+    with metrics.stage('render'):
+        # invariant mode drops the timestamp and random document ID so seeded output is byte-identical
+        c = canvas.Canvas(output_path, pagesize=page_size, invariant=int(invariant),
+                          pageCompression=PDF_PAGE_COMPRESSION)
+        page_w, page_h = page_size
+        margin = LEFT_MARGIN 
+        page_number = 1
+        report(pages_rendered=0, pages_total=count_pages(puzzles, sections))
 
-    # 4. Generate PDF
-    c = canvas.Canvas(output_path, pagesize=page_size)
-    page_w, page_h = page_size
-    margin = LEFT_MARGIN 
-    page_number = 1
-    line_h = 14 # Standard line height for word lists
+        # Puzzle pages, then answer-key pages
+        for kind, tiles in sections:
+            per_page = tiles.per_page if tiles else 1
+            for start in range(0, len(puzzles), per_page):
+                page_start = time.perf_counter()
+                chunk = puzzles[start:start + per_page]
+                if tiles is None and kind == 'Puzzle':
+                    draw_puzzle_page(c, chunk[0], page_w, page_h, title_prefix, style)
+                elif tiles is None:
+                    draw_key_page(c, chunk[0], page_w, page_h, title_prefix, style)
+                else:
+                    first, last = chunk[0]['puzzle'].index, chunk[-1]['puzzle'].index
+                    numbers = f"#{first}" if first == last else f"#{first}–{last}"
+                    heading = f"{title_prefix}{'Word Search Puzzles' if kind == 'Puzzle' else 'Answer Keys'} {numbers}"
+                    draw_tiled_page(c, chunk, tiles, kind, heading, page_w, page_h, style)
 
-    # --- PUZZLE PAGES ---
-    for p in puzzles:
-        puzzle = p['puzzle']
-        words = p['words']
-
-        # Title
-        y_top = page_h - margin
-        c.setFont(HEADING_FONT, HEADING_FONT_SIZE)
-        title_prefix = f"{THEME} " if THEME else ""
-        c.drawCentredString(page_w / 2, y_top, f"{title_prefix}Word Search Puzzle #{puzzle.index}")
-
-        # Grid
-        # draw_grid returns the Y coordinate of the bottom of the grid area
-        grid_bottom_y = draw_grid(c, puzzle, page_w, page_h, margin)
-
-        # Word List Header
-        y_current = grid_bottom_y - WORDS_SECTION_OFFSET
-        c.setFont(HEADING_FONT, 12)
-        c.drawString(LEFT_MARGIN, y_current, "Words to Find (Alphabetical):")
-        y_current -= line_h # Move to the start of the word list
-
-        # Word List
-        # margin_bottom: ensure we leave space for the page number
-        margin_bottom = 0.5 * inch + 20 
-        y_current = draw_wrapped_lines(c, ", ".join(words), LEFT_MARGIN, y_current, 
-                                       WORD_FONT, WORD_FONT_SIZE, line_h, 
-                                       page_w, page_h, LEFT_MARGIN, RIGHT_MARGIN, margin_bottom)
-        
-        # Footer and Page Turn
-        add_page_number(c, page_w, margin, page_number)
-        page_number += 1
-        c.showPage()
+                # Footer and Page Turn
+                add_page_number(c, page_w, margin, page_number, style.word_font)
+                page_number += 1
+                c.showPage()
+                metrics.PAGE_RENDER_SECONDS.observe(time.perf_counter() - page_start, kind=kind.lower())
+                report(pages_rendered=page_number - 1)
+
+        c.save()
+
+        output_bytes = os.path.getsize(output_path) if isinstance(output_path, (str, os.PathLike)) else output_path.tell()
+        metrics.OUTPUT_BYTES.observe(output_bytes)
+        metrics.count('pages', page_number - 1)
+        metrics.count('bytes', output_bytes)
+    print(f"✅ All puzzles saved to {output_path if isinstance(output_path, (str, os.PathLike)) else 'buffer'}")
+    return output_path
 
-    # --- ANSWER KEY PAGES ---
+# --- Data Export (no PDF rendering) ---
+EXPORT_FORMATS = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+# One CSV row per grid row (record=grid, text=letters) and per placed word (record=word)
+CSV_EXPORT_FIELDS = ['puzzle', 'record', 'word', 'row', 'col', 'd_row', 'd_col', 'length', 'text']
+
+def puzzle_record(p, title_prefix=""):
+    """Plain-data form of one built puzzle: grid rows, word list and answer-key placements."""
+    puzzle = p['puzzle']
+    key = puzzle.key
+    placements = []
+    for word in sorted(key):
+        path = word_path(key[word])
+        if path is None:
+            continue
+        sr, sc, d_row, d_col = path
+        n = len(word)
+        placements.append({
+            'word': word,
+            'start': [sr, sc],
+            'direction': [d_row, d_col],
+            'end': [sr + (n - 1) * d_row, sc + (n - 1) * d_col],
+        })
+    return {
+        'puzzle': puzzle.index,
+        'title': f"{title_prefix}Word Search Puzzle #{puzzle.index}",
+        'size': puzzle.size,
+        'grid': ["".join(row) for row in puzzle.puzzle],
+        'words': list(p['words']),
+        'placements': placements,
+    }
+
+def iter_export(puzzles, fmt, title_prefix=""):
+    """Yields the export as text chunks, one puzzle at a time: JSON Lines or CSV (with a header row)."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Export format must be one of: {', '.join(EXPORT_FORMATS)}.")
+    if fmt == 'jsonl':
+        for p in puzzles:
+            yield json.dumps(puzzle_record(p, title_prefix), separators=(',', ':')) + "\n"
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(CSV_EXPORT_FIELDS)
     for p in puzzles:
-        puzzle = p['puzzle']
-        words = p['words']
-
-        # Title
-        y_top = page_h - margin
-        c.setFont(HEADING_FONT, HEADING_FONT_SIZE)
-        title_prefix = f"{THEME} " if THEME else ""
-        c.drawCentredString(page_w / 2, y_top, f"{title_prefix}Puzzle #{puzzle.index} – Answer Key")
-
-        # Grid (Highlighted)
-        draw_grid(c, puzzle, page_w, page_h, margin, highlight=True)
-
-        # Word List (for reference)
-        y_bottom = margin + 60
-        c.setFont(HEADING_FONT, 12)
-        c.drawString(LEFT_MARGIN, y_bottom, "Answer Key Word List:")
-        y_bottom -= line_h
-        draw_wrapped_lines(c, ", ".join(words), LEFT_MARGIN, y_bottom, 
-                           WORD_FONT, WORD_FONT_SIZE, line_h, 
-                           page_w, page_h, LEFT_MARGIN, RIGHT_MARGIN, margin)
-
-        # Footer and Page Turn
-        add_page_number(c, page_w, margin, page_number)
-        page_number += 1
-        c.showPage()
-
-    c.save()
-    print(f"✅ All puzzles saved to {output_path}")
+        record = puzzle_record(p, title_prefix)
+        for r, letters in enumerate(record['grid']):
+            writer.writerow([record['puzzle'], 'grid', '', r, '', '', '', len(letters), letters])
+        for placement in record['placements']:
+            writer.writerow([record['puzzle'], 'word', placement['word'], *placement['start'],
+                             *placement['direction'], len(placement['word']), ''])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+def iter_word_search_data(width: int, height: int, themes: str, word_count: int, fmt: str = 'jsonl', engine: str = None, progress=None, seed=None, page_size_str: str = None, layout: str = None, difficulty: str = None):
+    """
+    Same pipeline as generate_word_search_pdf up to puzzle building, then yields the puzzles
+    as JSON Lines or CSV text while they are built. The PDF renderer is never touched.
+    Words are fetched before the first chunk is yielded, so fetch errors raise immediately.
+    page_size_str and layout are accepted (and ignored) so the PDF parameter dict can be passed as is.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Export format must be one of: {', '.join(EXPORT_FORMATS)}.")
+    watch = MemoryWatch()
+    report = watch.wrap(progress)
+    first_theme = themes.split(',')[0].strip().capitalize() if themes else ""
+    all_words = fetch_puzzle_words(themes, word_count, seed=seed, progress=report)
+
+    puzzles = iter_collection(all_words, max(width, height), engine=engine, seed=seed, progress=report,
+                              difficulty=difficulty)
+    return _watched_export(iter_export(puzzles, fmt, f"{first_theme} " if first_theme else ""), watch, progress)
+
+def _watched_export(chunks, watch, progress):
+    yield from chunks
+    record_peak_memory(watch, progress)
+
+def export_word_search_data(width: int, height: int, themes: str, word_count: int, output_path, fmt: str = 'jsonl', engine: str = None, progress=None, seed=None, page_size_str: str = None, layout: str = None, difficulty: str = None):
+    """Writes the data export to a path or text file object (background jobs call it like generate_word_search_pdf)."""
+    chunks = iter_word_search_data(width, height, themes, word_count, fmt, engine=engine, progress=progress, seed=seed,
+                                   difficulty=difficulty)
+    if isinstance(output_path, (str, os.PathLike)):
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8', newline='') as f:
+            f.writelines(chunks)
+    else:
+        output_path.writelines(chunks)
     return output_path
 
 if __name__ == "__main__":
@@ -0,0 +1,32 @@
+# Gunicorn settings (picked up automatically by `gunicorn app:app` from the Procfile).
+# Bind address and worker count keep gunicorn's defaults ($PORT, $WEB_CONCURRENCY).
+import os
+import sys
+
+# Import app/generator/ReportLab once in the master; forked workers share the loaded modules
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+# Threaded workers, so one worker can hold several generations at once and admission control
+# (admission.py) has something to limit: each worker admits up to GUNICORN_THREADS cost units
+# by default, and the lease table caps the whole group below workers x threads. With sync
+# workers every worker only ever holds one request and those limits never trip.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+
+def when_ready(server):
+    # Runs in the master after a preloaded app is imported and before any worker is forked
+    import startup
+    if preload_app and startup.WARMUP_ENABLED:
+        startup.report("Master", startup.warm_shared())
+
+
+def post_worker_init(worker):
+    # Runs in each worker before it accepts requests, so the first request doesn't pay for start-up
+    import startup
+    from jobs import job_runner
+    # A worker starting up may be replacing one that was killed mid-job
+    job_runner.recover_stale()
+    if startup.WARMUP_ENABLED:
+        startup.report(f"Worker {worker.pid}", startup.warm_worker())
+    print(f"✅ Worker {worker.pid} ready", file=sys.stderr)
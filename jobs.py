@@ -0,0 +1,217 @@
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from admission import pid_alive
+
+# --- Background Job Configuration ---
+# Job state lives in SQLite so any gunicorn worker can answer a status poll,
+# while the work itself runs on a thread pool inside the worker that accepted it.
+JOBS_DIR = os.environ.get('JOBS_DIR', os.path.join(os.getcwd(), 'jobs'))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_RETENTION_SECONDS = int(os.environ.get('JOB_RETENTION_SECONDS', 3600)) # How long finished PDFs stay downloadable
+JOB_PROGRESS_INTERVAL = 0.5 # Minimum seconds between progress writes for one job
+# Each job records the worker process that runs it; unfinished jobs whose worker has died
+# (timeout, OOM, restart) are marked failed so status polls stop waiting on them. Rows written
+# before owner_pid existed fall back to this many seconds without an update.
+JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', 600))
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+class JobStore:
+    """SQLite-backed job table shared by all worker processes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " status TEXT NOT NULL,"
+                " params TEXT NOT NULL,"
+                " progress TEXT NOT NULL DEFAULT '{}',"
+                " error TEXT,"
+                " output_path TEXT,"
+                " download_name TEXT,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " finished_at REAL,"
+                " owner_pid INTEGER)"
+            )
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if 'owner_pid' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner_pid INTEGER")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def create(self, params, download_name):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO jobs (id, status, params, download_name, created_at, updated_at, owner_pid)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, STATUS_QUEUED, json.dumps(params), download_name, now, now, os.getpid())
+        )
+        conn.commit()
+        return job_id
+
+    def update(self, job_id, **fields):
+        if 'progress' in fields:
+            fields['progress'] = json.dumps(fields['progress'])
+        fields['updated_at'] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        conn = self._connect()
+        conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+        conn.commit()
+
+    def get(self, job_id):
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['progress'] = json.loads(job['progress'])
+        return job
+
+    def fail_stale(self, max_age=JOB_STALE_SECONDS):
+        """
+        Marks queued/running jobs as failed when the worker that owns them is gone (or, for rows
+        without an owner, when they haven't been updated in max_age seconds). Returns the count.
+        """
+        now = time.time()
+        conn = self._connect()
+        rows = conn.execute("SELECT id, owner_pid, updated_at FROM jobs WHERE status IN (?, ?)",
+                            (STATUS_QUEUED, STATUS_RUNNING)).fetchall()
+        stale = [(row['id'],) for row in rows
+                 if (row['owner_pid'] is None and row['updated_at'] < now - max_age)
+                 or (row['owner_pid'] is not None and row['owner_pid'] != os.getpid() and not pid_alive(row['owner_pid']))]
+        conn.executemany(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ?, finished_at = ? WHERE id = ? AND status IN (?, ?)",
+            [(STATUS_FAILED, "The worker running this job stopped before it finished. Please try again.",
+              now, now, job_id, STATUS_QUEUED, STATUS_RUNNING) for (job_id,) in stale]
+        )
+        conn.commit()
+        return len(stale)
+
+    def purge_expired(self, retention=JOB_RETENTION_SECONDS):
+        """Deletes finished jobs (and their PDFs) older than the retention window. Returns the count."""
+        cutoff = time.time() - retention
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT id, output_path FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,)
+        ).fetchall()
+        for row in rows:
+            if row['output_path'] and os.path.exists(row['output_path']):
+                try:
+                    os.remove(row['output_path'])
+                except OSError as e:
+                    print(f"⚠️ Error removing expired job file {row['output_path']}: {e}", file=sys.stderr)
+        conn.executemany("DELETE FROM jobs WHERE id = ?", [(row['id'],) for row in rows])
+        conn.commit()
+        return len(rows)
+
+
+class JobRunner:
+    """Runs generation jobs on a per-process thread pool and records their progress."""
+
+    def __init__(self, store, workers=JOB_WORKERS, output_dir=JOBS_DIR):
+        self.store = store
+        self.workers = workers
+        self.output_dir = output_dir
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def _get_executor(self):
+        # Created lazily so each forked gunicorn worker gets its own threads
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='pdf-job')
+                self._pid = os.getpid()
+            return self._executor
+
+    def submit(self, generate_fn, params, download_name):
+        """Queues generate_fn(output_path=..., progress=..., **params). Returns the job id."""
+        self.purge_expired()
+        job_id = self.store.create(params, download_name)
+        # Keep the download's extension (.pdf, or .zip for batches) on the stored file
+        output_path = os.path.join(self.output_dir, job_id + os.path.splitext(download_name)[1])
+        self._get_executor().submit(self._run, job_id, generate_fn, params, output_path)
+        return job_id
+
+    def _run(self, job_id, generate_fn, params, output_path):
+        progress = {}
+        last_write = [0.0]
+
+        def report(**fields):
+            progress.update(fields)
+            now = time.monotonic()
+            if now - last_write[0] >= JOB_PROGRESS_INTERVAL:
+                last_write[0] = now
+                self.store.update(job_id, progress=progress)
+
+        self.store.update(job_id, status=STATUS_RUNNING)
+        try:
+            final_path = generate_fn(output_path=output_path, progress=report, **params)
+            self.store.update(job_id, status=STATUS_DONE, progress=progress,
+                              output_path=final_path, finished_at=time.time())
+            print(f"✅ Job {job_id} finished: {final_path}", file=sys.stderr)
+        except Exception as e:
+            print(f"--- JOB {job_id} TRACEBACK START ---", file=sys.stderr)
+            print(traceback.format_exc(), file=sys.stderr)
+            print(f"--- JOB {job_id} TRACEBACK END ---", file=sys.stderr)
+            if os.path.exists(output_path):
+                try:
+                    os.remove(output_path)
+                except OSError:
+                    pass
+            self.store.update(job_id, status=STATUS_FAILED, progress=progress,
+                              error=f"{type(e).__name__}: {e}", finished_at=time.time())
+
+    def purge_expired(self):
+        """Applies the retention policy (and fails stale jobs) at most once a minute per process."""
+        now = time.time()
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        try:
+            purged = self.store.purge_expired()
+            if purged:
+                print(f"✅ Purged {purged} expired job(s)", file=sys.stderr)
+        except sqlite3.Error as e:
+            print(f"⚠️ Job purge failed: {e}", file=sys.stderr)
+        self.recover_stale()
+
+    def recover_stale(self):
+        """Fails jobs orphaned by a killed worker; run at worker start-up and with each purge."""
+        try:
+            failed = self.store.fail_stale()
+            if failed:
+                print(f"⚠️ Marked {failed} stale job(s) as failed", file=sys.stderr)
+        except sqlite3.Error as e:
+            print(f"⚠️ Stale job check failed: {e}", file=sys.stderr)
+
+
+job_store = JobStore(os.path.join(JOBS_DIR, 'jobs.sqlite3'))
+job_runner = JobRunner(job_store)
@@ -0,0 +1,267 @@
+"""
+Offline theme lexicon: a compact, memory-mapped index mapping a theme to related words.
+
+Build an index from a word/relation dump, then point LEXICON_PATH at it:
+
+    python lexicon.py build relations.tsv lexicon.idx --symmetric
+    python lexicon.py lookup lexicon.idx ocean
+
+Accepted dump lines (tab separated, '#' comments ignored):
+    theme <TAB> word
+    theme <TAB> relation <TAB> word [<TAB> ...]
+    ConceptNet assertion CSV rows (/a/[...] <TAB> /r/Rel <TAB> /c/en/x <TAB> /c/en/y <TAB> {json})
+"""
+import os
+import sys
+import mmap
+import array
+import struct
+import argparse
+import threading
+from bisect import bisect_left
+
+LEXICON_PATH = os.environ.get('LEXICON_PATH', os.path.join(os.getcwd(), 'data', 'lexicon.idx'))
+MIN_WORD_LEN = 4
+MAX_WORD_LEN = 12
+MAX_WORDS_PER_THEME = 2000
+
+# Index layout (little-endian, every section 4-byte aligned):
+#   header   MAGIC, version, n_themes, n_words, then the byte offset of each section below
+#   theme_key_offsets  u32[n_themes + 1] into theme_keys
+#   posting_offsets    u32[n_themes + 1] into postings
+#   word_offsets       u32[n_words + 1]  into word_blob
+#   postings           u32[...] word ids
+#   theme_keys         sorted, concatenated UTF-8 theme keys
+#   word_blob          concatenated ASCII words
+MAGIC = b'WSLX'
+VERSION = 1
+HEADER = struct.Struct('<4sIII6I')
+
+
+def normalize_theme(theme):
+    """Lowercases a theme and folds underscores/extra whitespace to single spaces."""
+    return ' '.join(theme.replace('_', ' ').lower().split())
+
+
+def clean_word(raw):
+    """Applies the generator's word filters (alphabetic, length 4 to 12). Returns None if rejected."""
+    word = raw.replace('_', '').replace(' ', '').upper()
+    if word.isalpha() and word.isascii() and MIN_WORD_LEN <= len(word) <= MAX_WORD_LEN:
+        return word
+    return None
+
+
+def _conceptnet_term(uri):
+    """Returns the English term of a /c/en/... URI, or None."""
+    if not uri.startswith('/c/en/'):
+        return None
+    return uri[len('/c/en/'):].split('/')[0]
+
+
+def iter_dump_pairs(lines):
+    """Yields (theme, word) string pairs from the supported dump line formats."""
+    for line in lines:
+        line = line.rstrip('\n')
+        if not line or line.startswith('#'):
+            continue
+        cols = line.split('\t')
+        if cols[0].startswith('/a/') and len(cols) >= 4:
+            head, tail = _conceptnet_term(cols[2]), _conceptnet_term(cols[3])
+            if head and tail:
+                yield head, tail
+        elif len(cols) == 2:
+            yield cols[0], cols[1]
+        elif len(cols) >= 3:
+            yield cols[0], cols[2]
+
+
+def build_index(pairs, output_path, symmetric=False, max_per_theme=MAX_WORDS_PER_THEME):
+    """Builds an index file from (theme, word) pairs. Returns (n_themes, n_words)."""
+    word_ids = {}
+    themes = {}
+
+    def add(theme, raw):
+        key = normalize_theme(theme)
+        word = clean_word(raw)
+        if not key or word is None:
+            return
+        postings = themes.setdefault(key, {})
+        if len(postings) >= max_per_theme:
+            return
+        if word not in word_ids:
+            word_ids[word] = len(word_ids)
+        postings.setdefault(word_ids[word], None)  # dict keeps first-seen order, drops duplicates
+
+    for theme, word in pairs:
+        add(theme, word)
+        if symmetric:
+            add(word, theme)
+
+    # Words are written once; themes are sorted so lookups can binary search
+    words = sorted(word_ids, key=word_ids.get)
+    theme_keys = sorted(themes)
+
+    theme_key_offsets = array.array('I', [0])
+    posting_offsets = array.array('I', [0])
+    postings = array.array('I')
+    key_blob = bytearray()
+    for key in theme_keys:
+        key_blob += key.encode('utf-8')
+        theme_key_offsets.append(len(key_blob))
+        postings.extend(themes[key])
+        posting_offsets.append(len(postings))
+
+    word_offsets = array.array('I', [0])
+    word_blob = bytearray()
+    for word in words:
+        word_blob += word.encode('ascii')
+        word_offsets.append(len(word_blob))
+
+    sections = [theme_key_offsets.tobytes(), posting_offsets.tobytes(), word_offsets.tobytes(),
+                postings.tobytes(), bytes(key_blob), bytes(word_blob)]
+    if sys.byteorder != 'little':
+        for i in range(4):
+            a = array.array('I', sections[i])
+            a.byteswap()
+            sections[i] = a.tobytes()
+
+    offsets = []
+    position = HEADER.size
+    for data in sections:
+        offsets.append(position)
+        position += len(data) + (-len(data) % 4)
+
+    tmp_path = output_path + '.tmp'
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(theme_keys), len(words), *offsets))
+        for data in sections:
+            f.write(data)
+            f.write(b'\0' * (-len(data) % 4))
+    # Atomic swap so running workers never map a half-written file
+    os.replace(tmp_path, output_path)
+    return len(theme_keys), len(words)
+
+
+class Lexicon:
+    """Read-only view over a memory-mapped lexicon index."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.n_themes, self.n_words, *offsets = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} lexicon index")
+        if sys.byteorder != 'little':
+            raise ValueError("Lexicon indexes can only be mapped on little-endian hosts")
+
+        view = memoryview(self._mm)
+        t_off, p_off, w_off, postings_off, keys_off, words_off = offsets
+        self._theme_key_offsets = view[t_off:t_off + 4 * (self.n_themes + 1)].cast('I')
+        self._posting_offsets = view[p_off:p_off + 4 * (self.n_themes + 1)].cast('I')
+        self._word_offsets = view[w_off:w_off + 4 * (self.n_words + 1)].cast('I')
+        n_postings = self._posting_offsets[self.n_themes]
+        self._postings = view[postings_off:postings_off + 4 * n_postings].cast('I')
+        self._theme_keys = view[keys_off:keys_off + self._theme_key_offsets[self.n_themes]]
+        self._word_blob = view[words_off:words_off + self._word_offsets[self.n_words]]
+        # Lightweight sequence over the sorted keys so bisect can search the mapping directly
+        self._keys = _ThemeKeys(self)
+
+    def _theme_key(self, i):
+        return bytes(self._theme_keys[self._theme_key_offsets[i]:self._theme_key_offsets[i + 1]])
+
+    def _word(self, word_id):
+        start, end = self._word_offsets[word_id], self._word_offsets[word_id + 1]
+        return str(self._word_blob[start:end], 'ascii')
+
+    def __contains__(self, theme):
+        return self._find(theme) is not None
+
+    def _find(self, theme):
+        key = normalize_theme(theme).encode('utf-8')
+        i = bisect_left(self._keys, key)
+        if i < self.n_themes and self._theme_key(i) == key:
+            return i
+        return None
+
+    def related_words(self, theme):
+        """Returns the related words for a theme (already filtered), or None if the theme is unknown."""
+        i = self._find(theme)
+        if i is None:
+            return None
+        start, end = self._posting_offsets[i], self._posting_offsets[i + 1]
+        return [self._word(word_id) for word_id in self._postings[start:end]]
+
+
+class _ThemeKeys:
+    def __init__(self, lexicon):
+        self._lexicon = lexicon
+
+    def __len__(self):
+        return self._lexicon.n_themes
+
+    def __getitem__(self, i):
+        return self._lexicon._theme_key(i)
+
+
+_lexicon_state = {'loaded': False, 'lexicon': None}
+_lexicon_lock = threading.Lock()
+
+
+def get_lexicon(path=None):
+    """Returns the process-wide Lexicon, or None if no index is installed. Loaded once, on first use."""
+    if _lexicon_state['loaded']:
+        return _lexicon_state['lexicon']
+    with _lexicon_lock:
+        if not _lexicon_state['loaded']:
+            path = path or LEXICON_PATH
+            lexicon = None
+            if os.path.exists(path):
+                try:
+                    lexicon = Lexicon(path)
+                    print(f"✅ Loaded lexicon index {path}: {lexicon.n_themes} themes, {lexicon.n_words} words")
+                except (OSError, ValueError) as e:
+                    print(f"⚠️ Could not load lexicon index {path}: {e}", file=sys.stderr)
+            _lexicon_state['lexicon'] = lexicon
+            _lexicon_state['loaded'] = True
+    return _lexicon_state['lexicon']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the offline theme lexicon index.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help="Build an index from a word/relation dump")
+    build.add_argument('dump', help="Dump file path, or '-' for stdin")
+    build.add_argument('output', help="Index file to write")
+    build.add_argument('--symmetric', action='store_true', help="Also index each word as a theme of its partner")
+    build.add_argument('--max-per-theme', type=int, default=MAX_WORDS_PER_THEME)
+
+    lookup = sub.add_parser('lookup', help="Print the words indexed for a theme")
+    lookup.add_argument('index')
+    lookup.add_argument('theme')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        if args.dump == '-':
+            n_themes, n_words = build_index(iter_dump_pairs(sys.stdin), args.output,
+                                            args.symmetric, args.max_per_theme)
+        else:
+            with open(args.dump, encoding='utf-8') as f:
+                n_themes, n_words = build_index(iter_dump_pairs(f), args.output,
+                                                args.symmetric, args.max_per_theme)
+        print(f"✅ Wrote {args.output}: {n_themes} themes, {n_words} words")
+        return 0
+
+    words = Lexicon(args.index).related_words(args.theme)
+    if words is None:
+        print(f"Theme '{args.theme}' is not in the index.", file=sys.stderr)
+        return 1
+    print(", ".join(words))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
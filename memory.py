@@ -0,0 +1,94 @@
+import gc
+import os
+import sys
+
+try:
+    import resource
+except ImportError: # Not available on Windows
+    resource = None
+
+import metrics
+
+# --- Memory Budget ---
+# Small dynos get OOM-killed when a few 2000-word books are generated at once.
+#   LOW_MEMORY_MODE=1 keeps built puzzles as packed CompactPuzzle records (see puzzle_builder.py)
+#   and spools PDFs straight to disk instead of memory.
+#   MEMORY_CEILING_MB fails the job that pushes this worker's resident memory past it (so one
+#   oversized request fails, not the whole worker) and turns new requests away near it.
+# RSS is per process, so with several jobs in one worker the figures cover all of them.
+LOW_MEMORY_MODE = os.environ.get('LOW_MEMORY_MODE', '0') == '1'
+MEMORY_CEILING_MB = float(os.environ.get('MEMORY_CEILING_MB', 0)) # 0 = no ceiling
+ADMISSION_MEMORY_RATIO = 0.9 # New requests are refused above this share of the ceiling
+_PAGE_BYTES = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+class MemoryCeilingExceeded(MemoryError):
+    """Raised inside a job once the worker's RSS passes MEMORY_CEILING_MB."""
+
+
+def current_rss_mb():
+    """Resident memory of this process in MB, or None if it can't be read."""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * _PAGE_BYTES / 1048576
+    except (OSError, ValueError, IndexError):
+        # No /proc (macOS): the high-water mark is the closest available figure
+        return high_water_mb()
+
+
+def high_water_mb():
+    """Highest RSS this process has ever reached, in MB (None if unknown)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 1048576 if sys.platform == 'darwin' else peak / 1024
+
+
+def memory_available(ceiling_mb=MEMORY_CEILING_MB):
+    """False when this worker is already close to its memory ceiling."""
+    if not ceiling_mb:
+        return True
+    rss = current_rss_mb()
+    return rss is None or rss < ceiling_mb * ADMISSION_MEMORY_RATIO
+
+
+class MemoryWatch:
+    """Samples RSS at each progress report of one job, keeping the peak and enforcing the ceiling."""
+    __slots__ = ('ceiling_mb', 'peak_mb', 'start_high_water')
+
+    def __init__(self, ceiling_mb=MEMORY_CEILING_MB):
+        self.ceiling_mb = ceiling_mb
+        self.peak_mb = current_rss_mb() or 0.0
+        self.start_high_water = high_water_mb()
+
+    def check(self):
+        rss = current_rss_mb()
+        if rss is None:
+            return
+        self.peak_mb = max(self.peak_mb, rss)
+        if self.ceiling_mb and rss > self.ceiling_mb:
+            # Unreachable cycles may be holding the excess; only fail if collecting doesn't help
+            gc.collect()
+            rss = current_rss_mb()
+            if rss is not None and rss > self.ceiling_mb:
+                metrics.MEMORY_ABORTS.inc()
+                raise MemoryCeilingExceeded(f"Memory limit of {self.ceiling_mb:.0f}MB exceeded ({rss:.0f}MB in use). "
+                                            f"Try a smaller word count.")
+
+    def wrap(self, progress=None):
+        """Returns a progress callback that checks memory before passing the fields on."""
+        def report(**fields):
+            self.check()
+            if progress is not None:
+                progress(**fields)
+        return report
+
+    def finish(self):
+        """Peak RSS in MB over the job, including spikes between samples (e.g. while the PDF is written out)."""
+        self.check()
+        high_water = high_water_mb()
+        if high_water is not None and self.start_high_water is not None and high_water > self.start_high_water:
+            # The process high-water mark rose during this job, so the job reached it
+            self.peak_mb = max(self.peak_mb, high_water)
+        return round(self.peak_mb, 1)
@@ -0,0 +1,229 @@
+import os
+import time
+import bisect
+import threading
+import contextlib
+import contextvars
+
+# --- Pipeline Metrics ---
+# Minimal Prometheus-style counters/histograms for the generation pipeline, exposed at /metrics.
+# Values are per worker process (each gunicorn worker is scraped/aggregated separately).
+# With METRICS_ENABLED=0 every call below returns immediately.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+# Adds a Server-Timing header (fetch/build/render durations) to /generate responses
+METRICS_RESPONSE_HEADER = os.environ.get('METRICS_RESPONSE_HEADER', '0') == '1'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = (64e3, 256e3, 1e6, 4e6, 16e6, 64e6)
+RSS_BUCKETS = (64, 128, 256, 384, 512, 768, 1024, 2048) # Megabytes
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, key)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def set(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {} # label key -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            state[index] += 1
+            state[-1] += value
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), state[:-1]):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    labels = _format_labels(self.labelnames, key, 'le="' + le + '"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {state[-1]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+def render_prometheus():
+    """Returns all metrics in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
+
+
+# --- Pipeline Metric Definitions ---
+UPSTREAM_SECONDS = Histogram('wordsearch_upstream_request_seconds', "Latency of word provider HTTP calls.", ['provider'])
+UPSTREAM_ERRORS = Counter('wordsearch_upstream_errors_total', "Failed or timed-out word provider calls.", ['provider'])
+UPSTREAM_HEDGES = Counter('wordsearch_upstream_hedged_requests_total', "Duplicate provider calls sent because the first was slow.", ['provider'])
+BREAKER_STATE = Gauge('wordsearch_provider_breaker_state', "Provider circuit breaker state (0 closed, 1 half-open, 2 open).", ['provider'])
+BREAKER_REJECTIONS = Counter('wordsearch_provider_breaker_rejections_total', "Provider calls skipped because the breaker was open.", ['provider'])
+UPSTREAM_WORDS = Counter('wordsearch_upstream_words_total', "Filtered words returned by word providers.", ['provider'])
+PUZZLES_ATTEMPTED = Counter('wordsearch_puzzles_attempted_total', "Puzzle chunks submitted for building.", ['engine'])
+PUZZLES_SKIPPED = Counter('wordsearch_puzzles_skipped_total', "Puzzle chunks that failed to build and were skipped.", ['engine'])
+PUZZLE_BUILD_SECONDS = Histogram('wordsearch_puzzle_build_seconds', "Time to build one puzzle.", ['engine'])
+PAGE_RENDER_SECONDS = Histogram('wordsearch_page_render_seconds', "Time to render one PDF page.", ['kind'])
+OUTPUT_BYTES = Histogram('wordsearch_output_bytes', "Size of generated PDFs.", buckets=BYTES_BUCKETS)
+JOB_PEAK_RSS = Histogram('wordsearch_job_peak_rss_megabytes', "Peak worker resident memory during each generation job.", buckets=RSS_BUCKETS)
+MEMORY_ABORTS = Counter('wordsearch_memory_ceiling_aborts_total', "Generation jobs stopped for exceeding MEMORY_CEILING_MB.")
+STAGE_SECONDS = Histogram('wordsearch_stage_seconds', "Wall time of each generation stage.", ['stage'])
+ADMISSION_REJECTIONS = Counter('wordsearch_admission_rejections_total', "Requests turned away by admission control, by the limit hit.", ['reason'])
+ADMISSION_IN_FLIGHT = Gauge('wordsearch_admission_in_flight_units', "Cost units of generation requests in flight in this worker.")
+GENERATIONS = Counter('wordsearch_generations_total', "Completed /generate requests by outcome.", ['outcome'])
+
+
+# --- Per-Request Trace ---
+# Totals for the request currently being handled, used for the optional Server-Timing header.
+_current_trace = contextvars.ContextVar('wordsearch_trace', default=None)
+
+
+class Trace:
+    __slots__ = ('stages', 'counts', 'token')
+
+    def __init__(self):
+        self.stages = {}
+        self.counts = {}
+        self.token = None # Restores the previous trace in end_trace
+
+    def server_timing(self):
+        """Formats stage durations as a Server-Timing header value."""
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        parts.extend(f'{name};desc="{value}"' for name, value in self.counts.items())
+        return ", ".join(parts)
+
+
+def start_trace():
+    """Begins collecting stage totals for the current request; returns the Trace (or None when disabled). Pair with end_trace."""
+    if not METRICS_ENABLED:
+        return None
+    trace = Trace()
+    trace.token = _current_trace.set(trace)
+    return trace
+
+
+def end_trace(trace):
+    """Detaches a trace from the current context, so later work on this (pooled) thread isn't added to it."""
+    if trace is None or trace.token is None:
+        return
+    try:
+        _current_trace.reset(trace.token)
+    except ValueError:
+        # Ended from another context than it was started in; just clear this one
+        _current_trace.set(None)
+    trace.token = None
+
+
+def count(name, value):
+    """Records a per-request count (words, puzzles, pages, bytes, peak_rss_mb) on the active trace."""
+    if not METRICS_ENABLED:
+        return
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.counts[name] = value
+
+
+_NULL_STAGE = contextlib.nullcontext()
+
+
+class _Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        STAGE_SECONDS.observe(elapsed, stage=self.name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.stages[self.name] = trace.stages.get(self.name, 0.0) + elapsed
+        return False
+
+
+def stage(name):
+    """Context manager timing one pipeline stage (fetch, build, render)."""
+    if not METRICS_ENABLED:
+        return _NULL_STAGE
+    return _Stage(name)
@@ -0,0 +1,121 @@
+import os
+import sys
+import json
+import hashlib
+import threading
+
+from generator import USE_PAGE_FORMS, PDF_PAGE_COMPRESSION
+
+# --- Deterministic PDF Result Cache ---
+# Seeded generations are reproducible, so the finished PDF can be stored under a hash
+# of the normalized parameters and served again without fetching, building or rendering.
+PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR', os.path.join(os.getcwd(), 'cache', 'pdf'))
+PDF_CACHE_MAX_BYTES = int(os.environ.get('PDF_CACHE_MAX_BYTES', 500 * 1024 * 1024))
+# Bump whenever layout or generation changes would alter the bytes for the same parameters
+PDF_CACHE_VERSION = 7
+
+
+def normalize_params(params):
+    """Canonical form of the generation parameters that affect the PDF's content."""
+    themes = [t.strip().lower() for t in params['themes'].split(',') if t.strip()]
+    normalized = {
+        'v': PDF_CACHE_VERSION,
+        'themes': themes,
+        'word_count': int(params['word_count']),
+        'size': max(int(params['width']), int(params['height'])),
+        'page_size': params['page_size_str'],
+        'engine': params.get('engine') or 'library',
+        'seed': str(params['seed']),
+    }
+    # Only non-default layouts join the key, so existing single-layout entries stay valid
+    layout = params.get('layout') or 'single'
+    if layout != 'single':
+        normalized['layout'] = layout
+    # Likewise only non-default difficulties
+    difficulty = params.get('difficulty') or 'hard'
+    if difficulty != 'hard':
+        normalized['difficulty'] = difficulty
+    # And the render settings, which change the bytes but not the puzzles
+    if USE_PAGE_FORMS:
+        normalized['page_forms'] = True
+    if PDF_PAGE_COMPRESSION != 1:
+        normalized['page_compression'] = PDF_PAGE_COMPRESSION
+    return normalized
+
+
+def cache_key(params):
+    """sha256 of the normalized parameters; also used as the ETag."""
+    canonical = json.dumps(normalize_params(params), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class PDFCache:
+    """Directory of <key>.pdf files with size-capped, least-recently-used eviction."""
+
+    def __init__(self, directory=PDF_CACHE_DIR, max_bytes=PDF_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path_for(self, key):
+        # Two-level fan-out keeps directories small
+        return os.path.join(self.directory, key[:2], f"{key}.pdf")
+
+    def get(self, key):
+        """Returns the cached file path and marks it recently used, or None on a miss."""
+        path = self.path_for(key)
+        try:
+            os.utime(path) # mtime doubles as the LRU timestamp
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, generate_fn):
+        """Runs generate_fn(tmp_path), atomically moves the result into the cache and evicts as needed."""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            generate_fn(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict()
+        return path
+
+    def evict(self):
+        """Deletes least recently used files until the cache fits in max_bytes."""
+        with self._lock:
+            entries = []
+            total = 0
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if not name.endswith('.pdf'):
+                        continue
+                    full = os.path.join(root, name)
+                    try:
+                        st = os.stat(full)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, full))
+                    total += st.st_size
+            if total <= self.max_bytes:
+                return 0
+            removed = 0
+            for _, size, full in sorted(entries):
+                try:
+                    os.remove(full)
+                    removed += 1
+                    total -= size
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"⚠️ Error evicting cached PDF {full}: {e}", file=sys.stderr)
+                if total <= self.max_bytes:
+                    break
+            print(f"✅ Evicted {removed} cached PDF(s)", file=sys.stderr)
+            return removed
+
+
+pdf_cache = PDFCache()
@@ -0,0 +1,143 @@
+import random
+import string
+from functools import lru_cache
+
+# --- Native Grid-Placement Engine ---
+# A small, dependency-free alternative to word_search_generator.WordSearch.
+# The grid is a flat bytearray (cell = row * size + col) and an int bitmask tracks
+# which cells already hold a placed letter, so most candidate positions are accepted
+# or rejected with a single AND instead of a per-letter scan.
+
+# (d_row, d_col) for each compass direction
+DIRECTIONS = {
+    'N': (-1, 0), 'NE': (-1, 1), 'E': (0, 1), 'SE': (1, 1),
+    'S': (1, 0), 'SW': (1, -1), 'W': (0, -1), 'NW': (-1, -1),
+}
+
+# Mirrors the WordSearch difficulty levels: 1 = across/down, 2 = adds diagonals, 3 = adds backwards
+LEVEL_DIRECTIONS = {
+    1: ('E', 'S'),
+    2: ('E', 'S', 'SE', 'NE'),
+    3: tuple(DIRECTIONS),
+}
+
+MAX_PLACEMENT_ATTEMPTS = 150 # Candidate positions tried per word (split evenly across its directions) before it is set aside
+MAX_GRID_ATTEMPTS = 4 # Fresh grids tried before settling for a smaller word set
+FILL_LETTERS = string.ascii_uppercase.encode('ascii')
+EMPTY = 0
+
+
+class PlacementError(Exception):
+    """Raised when not even one word of a chunk can be placed."""
+
+
+class NativePuzzle:
+    """Placed puzzle exposing the puzzle/key/size shape draw_grid consumes."""
+    __slots__ = ('puzzle', 'key', 'size', 'words', 'unplaced')
+
+    def __init__(self, puzzle, key, size, words, unplaced):
+        self.puzzle = puzzle
+        self.key = key
+        self.size = size
+        self.words = words # words actually placed, alphabetical
+        self.unplaced = unplaced # words dropped to make the chunk fit
+
+
+@lru_cache(maxsize=None)
+def _candidates(size, direction, length):
+    """All in-bounds placements of a word: tuple of (start_cell, step, mask, (row, col))."""
+    d_row, d_col = DIRECTIONS[direction]
+    step = d_row * size + d_col
+    out = []
+    for row in range(size):
+        end_row = row + d_row * (length - 1)
+        if not 0 <= end_row < size:
+            continue
+        for col in range(size):
+            end_col = col + d_col * (length - 1)
+            if not 0 <= end_col < size:
+                continue
+            start = row * size + col
+            mask = 0
+            for i in range(length):
+                mask |= 1 << (start + i * step)
+            out.append((start, step, mask, (row, col)))
+    return tuple(out)
+
+
+def _try_place(cells, occupied, word, size, directions, rng):
+    """Places one word. Returns (new_occupied, start, direction) or None if no spot was found."""
+    length = len(word)
+    for direction in rng.sample(directions, len(directions)):
+        candidates = _candidates(size, direction, length)
+        if not candidates:
+            continue
+        # Sample a bounded number of positions per direction instead of scanning them all
+        budget = max(1, MAX_PLACEMENT_ATTEMPTS // len(directions))
+        for start, step, mask, position in rng.sample(candidates, min(budget, len(candidates))):
+            overlap = mask & occupied
+            if overlap == mask:
+                # Fully inside an already placed word: it would not be findable on its own
+                continue
+            if overlap:
+                # Only the shared cells need checking: they must already hold the same letter
+                ok = True
+                for i in range(length):
+                    cell = start + i * step
+                    if (overlap >> cell) & 1 and cells[cell] != word[i]:
+                        ok = False
+                        break
+                if not ok:
+                    continue
+            for i in range(length):
+                cells[start + i * step] = word[i]
+            return occupied | mask, position, DIRECTIONS[direction]
+    return None
+
+
+def _attempt(words, size, directions, rng):
+    cells = bytearray(size * size)
+    occupied = 0
+    key = {}
+    unplaced = []
+    # Longest words first: they have the fewest legal positions
+    for word in sorted(words, key=len, reverse=True):
+        placed = _try_place(cells, occupied, word.encode('ascii'), size, directions, rng)
+        if placed is None:
+            unplaced.append(word)
+            continue
+        occupied, start, direction = placed
+        key[word] = {'start': start, 'direction': direction}
+    return cells, key, unplaced
+
+
+def place_words(words, size, level=3, rng=None):
+    """
+    Builds a size x size puzzle from words.
+    Tries a few fresh grids for the full set; if every attempt leaves words out, the best
+    attempt is kept with the smaller word set instead of failing the whole chunk.
+    """
+    rng = rng or random.Random()
+    directions = LEVEL_DIRECTIONS.get(level, LEVEL_DIRECTIONS[3])
+    words = [w.upper() for w in words if w]
+    too_long = [w for w in words if len(w) > size]
+    words = [w for w in words if len(w) <= size]
+
+    best = None
+    for _ in range(MAX_GRID_ATTEMPTS):
+        cells, key, unplaced = _attempt(words, size, directions, rng)
+        if best is None or len(key) > len(best[1]):
+            best = (cells, key, unplaced)
+        if not unplaced:
+            break
+
+    cells, key, unplaced = best
+    if not key:
+        raise PlacementError(f"None of the {len(words) + len(too_long)} words fit a {size}x{size} grid.")
+
+    for i in range(len(cells)):
+        if cells[i] == EMPTY:
+            cells[i] = rng.choice(FILL_LETTERS)
+    text = cells.decode('ascii')
+    rows = [list(text[r * size:(r + 1) * size]) for r in range(size)]
+    return NativePuzzle(rows, key, size, sorted(key), unplaced + too_long)
@@ -0,0 +1,177 @@
+import os
+import sys
+import time
+import threading
+from collections import deque
+
+import metrics
+
+# --- Word Provider Health ---
+# One tracker per upstream provider and worker process. It keeps recent latencies for
+# adaptive timeouts and hedging, and a circuit breaker that stops calling a provider
+# that keeps failing, so generation carries on with the other sources immediately.
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', 5)) # Consecutive failures before opening
+BREAKER_COOLDOWN = float(os.environ.get('BREAKER_COOLDOWN', 30)) # Seconds open before a trial call is let through
+BREAKER_MAX_COOLDOWN = 300 # Cooldown doubles after each failed trial call, up to this
+# A trial call that never reports back (cancelled before it ran, or its thread lost) stops
+# blocking the next one after this many seconds
+BREAKER_PROBE_TIMEOUT = float(os.environ.get('BREAKER_PROBE_TIMEOUT', 30))
+HEDGE_ENABLED = os.environ.get('HEDGE_ENABLED', '1') != '0'
+LATENCY_WINDOW = 50 # Recent successful calls used for the latency percentiles
+MIN_LATENCY_SAMPLES = 10 # Below this, fall back to the fixed timeout and don't hedge
+TIMEOUT_MULTIPLIER = 3.0 # Adaptive timeout = this x the recent p95 latency
+MIN_TIMEOUT = 0.5 # Seconds; adaptive timeouts never go below this
+MIN_HEDGE_DELAY = 0.05 # Seconds
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+PROBE = 'probe' # allow_request()'s answer for the half-open breaker's single trial call
+# Numeric values for the breaker-state gauge
+STATE_CODES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+
+def _percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class ProviderHealth:
+    """Latency window plus circuit breaker for one provider."""
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.probe_started = None
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        metrics.BREAKER_STATE.set(STATE_CODES[self.state], provider=name)
+
+    def _set_state(self, state):
+        # Caller holds the lock
+        if state != self.state:
+            print(f"{'✅' if state == STATE_CLOSED else '⚠️'} {self.name} circuit {self.state} -> {state}", file=sys.stderr)
+            self.state = state
+            metrics.BREAKER_STATE.set(STATE_CODES[state], provider=self.name)
+
+    def allow_request(self):
+        """False while the breaker is open; after the cooldown, lets a single trial call through (returning PROBE)."""
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return True
+            if self.state == STATE_OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self._set_state(STATE_HALF_OPEN)
+            if self.probe_in_flight and time.monotonic() - self.probe_started >= BREAKER_PROBE_TIMEOUT:
+                self.probe_in_flight = False
+            if self.state == STATE_HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                self.probe_started = time.monotonic()
+                return PROBE
+            self.rejected += 1
+            metrics.BREAKER_REJECTIONS.inc(provider=self.name)
+            return False
+
+    def cancel_probe(self):
+        """Frees the trial slot when the trial call was cancelled before it ran, so the next request can probe."""
+        with self._lock:
+            if self.state == STATE_HALF_OPEN:
+                self.probe_in_flight = False
+
+    def is_open(self):
+        with self._lock:
+            return self.state == STATE_OPEN
+
+    def record_success(self, latency):
+        with self._lock:
+            self.successes += 1
+            self.latencies.append(latency)
+            self.consecutive_failures = 0
+            self.probe_in_flight = False
+            self.cooldown = self.base_cooldown
+            self._set_state(STATE_CLOSED)
+
+    def record_failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = str(error)[:200]
+            if self.state == STATE_HALF_OPEN:
+                # The trial call failed: stay away for longer
+                self.probe_in_flight = False
+                self.cooldown = min(self.cooldown * 2, BREAKER_MAX_COOLDOWN)
+                self.opened_at = time.monotonic()
+                self._set_state(STATE_OPEN)
+            elif self.state == STATE_CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(STATE_OPEN)
+
+    def timeout(self, ceiling):
+        """Per-call timeout: a multiple of the recent p95 latency, capped at ceiling."""
+        with self._lock:
+            if len(self.latencies) < MIN_LATENCY_SAMPLES:
+                return ceiling
+            p95 = _percentile(sorted(self.latencies), 0.95)
+        return min(ceiling, max(MIN_TIMEOUT, p95 * TIMEOUT_MULTIPLIER))
+
+    def hedge_delay(self):
+        """Seconds to wait before sending a duplicate of a slow call (the recent p90), or None to not hedge."""
+        if not HEDGE_ENABLED:
+            return None
+        with self._lock:
+            if len(self.latencies) < MIN_LATENCY_SAMPLES or self.state != STATE_CLOSED:
+                return None
+            p90 = _percentile(sorted(self.latencies), 0.90)
+        return max(MIN_HEDGE_DELAY, p90)
+
+    def snapshot(self, ceiling):
+        """State for the /providers/health endpoint."""
+        timeout = self.timeout(ceiling)
+        hedge_delay = self.hedge_delay()
+        with self._lock:
+            ordered = sorted(self.latencies)
+            retry_in = None
+            if self.state == STATE_OPEN:
+                retry_in = round(max(0.0, self.cooldown - (time.monotonic() - self.opened_at)), 1)
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'successes': self.successes,
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'last_error': self.last_error,
+                'retry_in_seconds': retry_in,
+                'p50_ms': round(_percentile(ordered, 0.5) * 1000, 1) if ordered else None,
+                'p95_ms': round(_percentile(ordered, 0.95) * 1000, 1) if ordered else None,
+                'timeout_seconds': round(timeout, 3),
+                'hedge_delay_seconds': None if hedge_delay is None else round(hedge_delay, 3),
+            }
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def get_provider_health(name):
+    """Returns this process's tracker for a provider, creating it on first use."""
+    tracker = _trackers.get(name)
+    if tracker is None:
+        with _trackers_lock:
+            tracker = _trackers.get(name)
+            if tracker is None:
+                tracker = _trackers[name] = ProviderHealth(name)
+    return tracker
+
+
+def health_report(ceiling):
+    with _trackers_lock:
+        trackers = dict(_trackers)
+    return {name: tracker.snapshot(ceiling) for name, tracker in sorted(trackers.items())}
@@ -0,0 +1,306 @@
+import os
+import sys
+import random
+import time
+import contextlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+from memory import LOW_MEMORY_MODE
+
+# --- Parallel Puzzle Construction ---
+# Puzzle building is pure CPU work, so large collections are spread over a process pool.
+# Workers only ever send plain data back (grid rows + key tuples), never library objects.
+# Every gunicorn worker ($WEB_CONCURRENCY of them) owns a pool, so by default the CPUs this
+# process may use are split between them. The affinity mask doesn't reflect container CPU quotas,
+# hence the cap; set PUZZLE_BUILD_WORKERS explicitly on larger machines.
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+MAX_DEFAULT_BUILD_WORKERS = 4
+
+
+def usable_cpus():
+    """CPUs this process may run on (its affinity mask, not the host's core count)."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+PUZZLE_BUILD_WORKERS = int(os.environ.get('PUZZLE_BUILD_WORKERS',
+                                          max(1, min(MAX_DEFAULT_BUILD_WORKERS, usable_cpus() // WEB_CONCURRENCY))))
+PARALLEL_BUILD_MIN_PUZZLES = 4 # Below this, pool round-trips cost more than they save
+
+# WordSearch iterates sets of words, so its layouts depend on the string hash seed as well as on
+# random's seed. Only the fork server is launched with BUILD_HASH_SEED (the pool workers forked
+# from it inherit it; this process's environment is left alone), and seeded library builds always
+# run in the pool, where each worker builds one puzzle at a time and no request thread can touch
+# its global random state, so they match across processes and concurrent requests.
+# (Without forkserver, e.g. on Windows, start the app with PYTHONHASHSEED=0 for the same guarantee.)
+BUILD_HASH_SEED = '0'
+# In-process library builds swap sys.stdout and the global random state, so gthread request and
+# job threads take turns
+_library_lock = threading.Lock()
+
+# Modules the build workers need, imported up front in the fork server
+BUILD_WORKER_PRELOAD = ['puzzle_builder', 'placement', 'solvability', 'word_search_generator']
+
+# Placement engines selectable per request
+#   'library' - word_search_generator.WordSearch
+#   'native'  - placement.py (bitmask placement, several fresh grids before giving up on a word)
+PUZZLE_ENGINES = ('library', 'native')
+DEFAULT_PUZZLE_ENGINE = os.environ.get('PUZZLE_ENGINE', 'library')
+
+# Difficulty profiles selectable per request or book, as placement levels for either engine
+#   'easy'   - across and down only
+#   'medium' - adds the down-right and up-right diagonals
+#   'hard'   - all eight directions, backwards included
+DIFFICULTY_LEVELS = {'easy': 1, 'medium': 2, 'hard': 3}
+DEFAULT_DIFFICULTY = os.environ.get('PUZZLE_DIFFICULTY', 'hard')
+# Check every built grid for words that read more than once and repair it (see solvability.py)
+VERIFY_PUZZLES = os.environ.get('VERIFY_PUZZLES', '1') != '0'
+
+
+def difficulty_level(difficulty):
+    """Placement level for a difficulty profile name (None = DEFAULT_DIFFICULTY)."""
+    level = DIFFICULTY_LEVELS.get(difficulty or DEFAULT_DIFFICULTY)
+    if level is None:
+        raise ValueError(f"Difficulty must be one of: {', '.join(DIFFICULTY_LEVELS)}.")
+    return level
+
+
+class PuzzleRecord:
+    """Plain-data puzzle with the same puzzle/key/size/index shape that draw_grid consumes."""
+    __slots__ = ('puzzle', 'key', 'size', 'index')
+
+    def __init__(self, puzzle, key, size, index):
+        self.puzzle = puzzle # list of rows, each a list of single-letter strings
+        self.key = key # word -> {'start': (row, col), 'direction': (d_row, d_col)}
+        self.size = size
+        self.index = index
+
+    @classmethod
+    def from_plain(cls, index, size, rows, key_tuples):
+        key = {word: {'start': start, 'direction': direction} for word, (start, direction) in key_tuples.items()}
+        return cls([list(row) for row in rows], key, size, index)
+
+
+class CompactPuzzle:
+    """
+    Low-memory PuzzleRecord: the grid packed into one bytes object and the key as flat tuples.
+    About a quarter of a PuzzleRecord's size; puzzle and key are rebuilt on access, so readers
+    should fetch each once per use.
+    """
+    __slots__ = ('grid', 'placements', 'size', 'index')
+
+    def __init__(self, grid, placements, size, index):
+        self.grid = grid # every row joined, as UTF-8 bytes (one byte per grid letter)
+        self.placements = placements # ((word, row, col, d_row, d_col), ...)
+        self.size = size
+        self.index = index
+
+    @classmethod
+    def from_plain(cls, index, size, rows, key_tuples):
+        placements = tuple((word, row, col, d_row, d_col)
+                           for word, ((row, col), (d_row, d_col)) in key_tuples.items())
+        return cls("".join(rows).encode('utf-8'), placements, size, index)
+
+    @property
+    def puzzle(self):
+        text = self.grid.decode('utf-8')
+        size = self.size
+        return [text[r * size:(r + 1) * size] for r in range(size)]
+
+    @property
+    def key(self):
+        return {word: {'start': (row, col), 'direction': (d_row, d_col)}
+                for word, row, col, d_row, d_col in self.placements}
+
+
+def make_puzzle_record(index, size, rows, key_tuples):
+    """A PuzzleRecord, or a CompactPuzzle in LOW_MEMORY_MODE."""
+    record_type = CompactPuzzle if LOW_MEMORY_MODE else PuzzleRecord
+    return record_type.from_plain(index, size, rows, key_tuples)
+
+
+def _plain_key(key):
+    """Converts a WordSearch key into {word: ((row, col), (d_row, d_col))}."""
+    plain = {}
+    for word, info in key.items():
+        start = info['start']
+        direction = info['direction']
+        plain[word] = ((start[0], start[1]), tuple(getattr(direction, 'value', direction)))
+    return plain
+
+
+@contextlib.contextmanager
+def _seeded_global_random(seed):
+    """Temporarily seeds the global random module (used inside WordSearch), then restores it."""
+    if seed is None:
+        yield
+        return
+    state = random.getstate()
+    random.seed(seed)
+    try:
+        yield
+    finally:
+        random.setstate(state)
+
+
+def build_puzzle(task):
+    """
+    Builds one puzzle and times it. Runs in a worker process, so everything in and out is picklable.
+    task: (index, words, size, level, engine, seed)
+    Returns ((index, placed_words, rows, key_tuples, None) or (index, words, None, None, error_message),
+             build_seconds).
+    """
+    start = time.perf_counter()
+    result = _build_puzzle(*task)
+    return result, time.perf_counter() - start
+
+
+def _build_puzzle(index, words, size, level, engine, seed):
+    # Each puzzle gets its own seed so results don't depend on which worker built it
+    puzzle_seed = None if seed is None else f"{seed}:{index}"
+
+    if engine == 'native':
+        from placement import place_words
+        try:
+            rng = random.Random(puzzle_seed) if puzzle_seed is not None else None
+            puzzle = place_words(words, size, level=level, rng=rng)
+        except Exception as e:
+            return index, words, None, None, str(e)
+        if puzzle.unplaced:
+            print(f"⚠️ Puzzle #{index}: set aside {', '.join(puzzle.unplaced)} to fit the grid.", file=sys.stderr)
+        rows = ["".join(row) for row in puzzle.puzzle]
+        placed, key = puzzle.words, _plain_key(puzzle.key)
+        del puzzle # Only plain data outlives the build
+        return _verified(index, placed, rows, key, puzzle_seed)
+
+    from word_search_generator import WordSearch
+
+    # Suppress stdout/stderr during puzzle generation as it can be noisy
+    with _library_lock, contextlib.redirect_stdout(sys.stderr), _seeded_global_random(puzzle_seed):
+        # The library can raise a GenerationError if it can't fit all words
+        try:
+            puzzle = WordSearch(", ".join(words), size=size, level=level)
+            rows = ["".join(row) for row in puzzle.puzzle]
+            key = _plain_key(puzzle.key)
+        except Exception as e:
+            return index, words, None, None, str(e)
+    del puzzle # Only plain data outlives the build
+    # WordSearch silently leaves out words it can't fit; report only the ones in the grid
+    placed = [word for word in words if word.upper() in key]
+    if not placed:
+        return index, words, None, None, "None of the words fit the grid."
+    return _verified(index, placed, rows, key, puzzle_seed)
+
+
+def _verified(index, placed, rows, key, puzzle_seed):
+    """Makes sure every placed word reads exactly once in the grid (see solvability.py)."""
+    if not VERIFY_PUZZLES:
+        return index, placed, rows, key, None
+    from solvability import make_unambiguous
+    rng = random.Random(f"{puzzle_seed}:verify") if puzzle_seed is not None else None
+    rows, key, _, dropped = make_unambiguous(rows, key, rng)
+    if dropped:
+        print(f"⚠️ Puzzle #{index}: set aside {', '.join(dropped)}, which would read more than once.", file=sys.stderr)
+        kept = [word for word in placed if word.upper() in key]
+        if not kept:
+            return index, placed, None, None, "No word reads exactly once in the grid."
+        placed = kept
+    return index, placed, rows, key, None
+
+
+_pool_state = {'pid': None, 'pool': None}
+_pool_lock = threading.Lock()
+
+
+def _start_fork_server():
+    """Launches the fork server with PYTHONHASHSEED forced to BUILD_HASH_SEED, then restores os.environ."""
+    from multiprocessing import forkserver
+    previous = os.environ.get('PYTHONHASHSEED')
+    os.environ['PYTHONHASHSEED'] = BUILD_HASH_SEED
+    try:
+        forkserver.ensure_running()
+    finally:
+        if previous is None:
+            del os.environ['PYTHONHASHSEED']
+        else:
+            os.environ['PYTHONHASHSEED'] = previous
+
+
+def get_build_pool():
+    """Returns this process's puzzle-building pool, created on first use."""
+    with _pool_lock:
+        if _pool_state['pid'] != os.getpid() or _pool_state['pool'] is None:
+            # forkserver keeps children from inheriting the web worker's threads and sockets
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            context = multiprocessing.get_context(method)
+            if method == 'forkserver':
+                # The fork server imports these once; every worker forked from it starts with them loaded
+                context.set_forkserver_preload(BUILD_WORKER_PRELOAD)
+                _start_fork_server()
+            _pool_state['pool'] = ProcessPoolExecutor(max_workers=PUZZLE_BUILD_WORKERS, mp_context=context)
+            _pool_state['pid'] = os.getpid()
+        return _pool_state['pool']
+
+
+def warm_build_pool():
+    """Starts every pool worker now (normally they start on the first large build). Returns the worker count."""
+    pool = get_build_pool()
+    tasks = [(i, ['WARM'], 10, 1, 'native', 'warmup') for i in range(PUZZLE_BUILD_WORKERS)]
+    # One tiny task per worker; the pool spawns a process for each task it can't hand to an idle one
+    list(pool.map(build_puzzle, tasks))
+    return PUZZLE_BUILD_WORKERS
+
+
+def _reset_build_pool():
+    with _pool_lock:
+        pool = _pool_state['pool']
+        _pool_state['pool'] = None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _drain(items):
+    """Yields a list's items while emptying it, so each plain result can be freed once converted."""
+    items.reverse()
+    while items:
+        yield items.pop()
+
+
+def build_puzzles(puzzle_sets, size, level=3, engine=None, seed=None, start_index=1):
+    """
+    Builds one puzzle per word chunk, in parallel when worthwhile.
+    Yields (index, words, PuzzleRecord or None, error) in chunk order; indexes count up from start_index.
+    In LOW_MEMORY_MODE the records are CompactPuzzles.
+    words is the subset that was actually placed (both engines leave out words that don't fit).
+    A seed makes every layout reproducible.
+    """
+    engine = engine or DEFAULT_PUZZLE_ENGINE
+    if engine not in PUZZLE_ENGINES:
+        raise ValueError(f"Unknown puzzle engine '{engine}'. Choose one of: {', '.join(PUZZLE_ENGINES)}.")
+    tasks = [(i, words, size, level, engine, seed) for i, words in enumerate(puzzle_sets, start_index)]
+    metrics.PUZZLES_ATTEMPTED.inc(len(tasks), engine=engine)
+
+    needs_pool = seed is not None and engine == 'library'
+    if needs_pool or (PUZZLE_BUILD_WORKERS > 1 and len(tasks) >= PARALLEL_BUILD_MIN_PUZZLES):
+        chunksize = max(1, len(tasks) // (PUZZLE_BUILD_WORKERS * 4))
+        try:
+            results = _drain(list(get_build_pool().map(build_puzzle, tasks, chunksize=chunksize)))
+        except (BrokenProcessPool, OSError) as e:
+            print(f"⚠️ Puzzle build pool failed ({e}); building in-process instead.", file=sys.stderr)
+            _reset_build_pool()
+            results = map(build_puzzle, tasks)
+    else:
+        results = map(build_puzzle, tasks)
+
+    for (index, words, rows, key_tuples, error), build_seconds in results:
+        metrics.PUZZLE_BUILD_SECONDS.observe(build_seconds, engine=engine)
+        if error is not None:
+            metrics.PUZZLES_SKIPPED.inc(engine=engine)
+            yield index, words, None, error
+        else:
+            yield index, words, make_puzzle_record(index, size, rows, key_tuples), None
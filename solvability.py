@@ -0,0 +1,134 @@
+import random
+import string
+from operator import itemgetter
+from functools import lru_cache
+
+# --- Solvability Check ---
+# An answer key is only unambiguous if every listed word can be read in exactly one place.
+# Random fill letters (and crossings) sometimes spell a word a second time, in any of the
+# eight directions. Each grid is indexed once as a single string holding every row, column
+# and diagonal, so a word is looked up with a couple of str.find calls (forwards and reversed)
+# instead of a per-cell, per-direction scan.
+MAX_REPAIR_ROUNDS = 8 # Passes of fill-letter rewrites before giving up on a word
+SEPARATOR = '|' # Between lines in the index string; never a grid letter
+MIN_LINE_LENGTH = 2
+FILL_LETTERS = string.ascii_uppercase
+
+
+@lru_cache(maxsize=None)
+def _line_cells(size):
+    """
+    Cell numbers (row * size + col) of every row, column and diagonal of a size x size grid,
+    one line after another, with size * size marking the separator after each line.
+    Returns (cells tuple, itemgetter that builds the index string from grid text + SEPARATOR).
+    """
+    lines = [[r * size + c for c in range(size)] for r in range(size)]
+    lines += [[r * size + c for r in range(size)] for c in range(size)]
+    for d in range(-(size - 1), size):
+        # Down-right diagonals (col - row = d) and up-right ones (row + col = size - 1 + d)
+        lines.append([r * size + r + d for r in range(size) if 0 <= r + d < size])
+        lines.append([r * size + (size - 1 + d - r) for r in range(size - 1, -1, -1) if 0 <= size - 1 + d - r < size])
+    cells = []
+    for line in lines:
+        if len(line) >= MIN_LINE_LENGTH:
+            cells.extend(line)
+            cells.append(size * size)
+    return tuple(cells), itemgetter(*cells)
+
+
+class GridIndex:
+    """Every line of one grid as a single string, with the cell behind each character."""
+    __slots__ = ('text', 'cells')
+
+    def __init__(self, letters, size):
+        self.cells, getter = _line_cells(size)
+        self.text = "".join(getter(letters + SEPARATOR))
+
+    def find(self, word):
+        """Yields the cells of every place word can be read, in line order."""
+        length = len(word)
+        reversed_word = word[::-1]
+        for target in (word,) if word == reversed_word else (word, reversed_word):
+            i = self.text.find(target)
+            while i != -1:
+                yield self.cells[i:i + length]
+                i = self.text.find(target, i + 1)
+
+
+def placement_cells(size, start, direction, length):
+    (row, col), (d_row, d_col) = start, direction
+    return tuple((row + i * d_row) * size + col + i * d_col for i in range(length))
+
+
+def find_ambiguous(rows, key_tuples):
+    """
+    Returns {word: extra placements} for every keyed word that can be read somewhere other
+    than its key entry (an empty list means the key entry itself doesn't spell the word).
+    """
+    size = len(rows)
+    index = GridIndex("".join(rows), size)
+    ambiguous = {}
+    for word, ((row, col), (d_row, d_col)) in key_tuples.items():
+        # A match has the word's length, so its two end cells identify it
+        first = row * size + col
+        last = first + (len(word) - 1) * (d_row * size + d_col)
+        found = False
+        extra = []
+        for cells in index.find(word):
+            ends = (cells[0], cells[-1])
+            if ends == (first, last) or ends == (last, first):
+                found = True
+            else:
+                extra.append(cells)
+        if extra or not found:
+            ambiguous[word] = extra if found else []
+    return ambiguous
+
+
+def make_unambiguous(rows, key_tuples, rng=None):
+    """
+    Verifies that every keyed word reads exactly once and repairs the grid where it doesn't:
+    a fill letter (one no keyed word uses) in each extra occurrence is replaced. A word whose
+    extra occurrence has no fill letters to change (CAT inside CATFISH) is dropped from the key.
+    Returns (rows, key_tuples, letters changed, dropped words).
+    """
+    ambiguous = find_ambiguous(rows, key_tuples)
+    if not ambiguous:
+        return rows, key_tuples, 0, []
+
+    rng = rng or random.Random()
+    size = len(rows)
+    letters = list("".join(rows))
+    key_tuples = dict(key_tuples)
+    dropped = []
+    changed = 0
+    for _ in range(MAX_REPAIR_ROUNDS):
+        covered = set()
+        for word, (start, direction) in key_tuples.items():
+            covered.update(placement_cells(size, start, direction, len(word)))
+        stuck = []
+        for word, extra in ambiguous.items():
+            if not extra:
+                stuck.append(word)
+            for cells in extra:
+                free = [cell for cell in cells if cell not in covered]
+                if not free:
+                    stuck.append(word)
+                    continue
+                cell = rng.choice(free)
+                letters[cell] = rng.choice(FILL_LETTERS.replace(letters[cell], ''))
+                changed += 1
+        for word in stuck:
+            if word in key_tuples:
+                del key_tuples[word]
+                dropped.append(word)
+        rows = ["".join(letters[r * size:(r + 1) * size]) for r in range(size)]
+        ambiguous = find_ambiguous(rows, key_tuples)
+        if not ambiguous:
+            break
+    else:
+        # Still ambiguous after every round: drop what's left so the key is never wrong
+        for word in ambiguous:
+            del key_tuples[word]
+            dropped.append(word)
+    return rows, key_tuples, changed, dropped
@@ -0,0 +1,213 @@
+"""
+Cold-start tooling: the worker warm-up hook used by gunicorn.conf.py, an import-time profile,
+and a boot-to-first-PDF timer.
+
+    python startup.py imports [--top 25]            # what `import app` spends its time on
+    python startup.py first-pdf [--runs 3]          # boots gunicorn and times the first served PDF
+                                [--no-preload] [--no-warmup] [--themes ocean] [--word-count 100]
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import subprocess
+import urllib.parse
+import urllib.request
+
+# --- Warm-Up Configuration ---
+WARMUP_ENABLED = os.environ.get('WARMUP', '1') != '0'
+# Also open keep-alive connections to the word providers (off by default so boot never waits on them)
+WARMUP_CONNECT = os.environ.get('WARMUP_CONNECT', '0') == '1'
+WARMUP_GRID_SIZES = range(10, 26)
+
+
+def _timed(timings, name, fn):
+    start = time.perf_counter()
+    try:
+        result = fn()
+    except Exception as e:
+        print(f"⚠️ Warm-up step '{name}' failed: {type(e).__name__}: {e}", file=sys.stderr)
+        result = None
+    timings[name] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def warm_fonts():
+    """
+    Loads font metrics (registering any TrueType defaults) and grid layouts, and renders one
+    throwaway page through the full drawing path.
+    """
+    import io
+    import generator
+    from fonts import ensure_font
+    from reportlab.pdfgen import canvas
+    from placement import place_words
+
+    for font in (generator.GRID_FONT, generator.WORD_FONT, generator.HEADING_FONT):
+        ensure_font(font)
+    for page_w, page_h in generator.PAGE_SIZE_MAP.values():
+        for size in WARMUP_GRID_SIZES:
+            generator.grid_geometry(generator.GRID_FONT, generator.GRID_FONT_SIZE, size, page_w, page_h)
+
+    page_w, page_h = generator.PAGE_SIZE_MAP['letter']
+    margin = generator.LEFT_MARGIN
+    puzzle = place_words(['WARM', 'START'], 10)
+    pdf = canvas.Canvas(io.BytesIO(), pagesize=(page_w, page_h), pageCompression=generator.PDF_PAGE_COMPRESSION)
+    y = generator.draw_grid(pdf, puzzle, page_w, page_h, margin, highlight=True, border=False)
+    generator.draw_page_frame(pdf, "Warm", puzzle.size, page_w, page_h, "Warm-up", y - generator.WORDS_SECTION_OFFSET)
+    generator.draw_wrapped_lines(pdf, ", ".join(puzzle.words), margin, y - 2 * generator.WORDS_SECTION_OFFSET,
+                                 generator.WORD_FONT, generator.WORD_FONT_SIZE, 14, page_w, page_h,
+                                 margin, margin, margin)
+    pdf.showPage()
+    pdf.save()
+
+
+def warm_engines():
+    """Imports both placement engines and builds a tiny puzzle with each (their first use is slow)."""
+    from puzzle_builder import PUZZLE_ENGINES, _build_puzzle
+    for engine in PUZZLE_ENGINES:
+        _build_puzzle(0, ['WARM', 'START'], 10, 3, engine, None)
+
+
+def warm_http():
+    """Creates the pooled HTTP session and fetch threads, optionally connecting to each provider."""
+    import generator
+    from concurrent.futures import wait
+
+    session = generator.get_http_session()
+    executor = generator.get_fetch_executor()
+    if WARMUP_CONNECT:
+        bases = (generator.DATAMUSE_BASE_URL, generator.CONCEPTNET_BASE_URL)
+        wait([executor.submit(session.head, base, timeout=generator.UPSTREAM_TIMEOUT) for base in bases])
+
+
+def warm_shared():
+    """Fork-safe warm-up (no sockets, threads or SQLite handles), run once in the gunicorn master when preloading."""
+    timings = {}
+    _timed(timings, 'fonts', warm_fonts)
+    _timed(timings, 'engines', warm_engines)
+    _timed(timings, 'lexicon', lambda: __import__('lexicon').get_lexicon())
+    return timings
+
+
+def warm_worker():
+    """Per-process warm-up: HTTP pool, theme cache, puzzle build pool (plus the shared steps if not preloaded)."""
+    from theme_cache import theme_cache
+    from puzzle_builder import warm_build_pool, PUZZLE_BUILD_WORKERS
+
+    timings = warm_shared()
+    _timed(timings, 'http', warm_http)
+    if theme_cache is not None:
+        _timed(timings, 'theme_cache', theme_cache.preload)
+    # With a single build worker, unseeded builds run in-process and the pool is rarely needed
+    if PUZZLE_BUILD_WORKERS > 1:
+        _timed(timings, 'build_pool', warm_build_pool)
+    return timings
+
+
+def report(label, timings):
+    total = sum(timings.values())
+    steps = ", ".join(f"{name} {ms:.0f}ms" for name, ms in timings.items())
+    print(f"✅ {label} warm-up finished in {total:.0f}ms ({steps})", file=sys.stderr)
+
+
+# --- Import-Time Profile ---
+
+def import_profile(module='app'):
+    """Runs `python -X importtime -c 'import <module>'` and returns [(cumulative_us, self_us, name)]."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # Nesting is shown by indentation after the single separator space
+        rows.append((int(cumulative_us), int(self_us), name[1:].rstrip()))
+    return rows
+
+
+def print_import_profile(rows, top):
+    total = max((r[0] for r in rows if not r[2].startswith(' ')), default=0)
+    print(f"{'cumulative ms':>13} {'self ms':>8}  module")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>13.1f} {self_us / 1000:>8.1f}  {name}")
+    print(f"import app: {total / 1000:.1f}ms, {len(rows)} modules")
+
+
+# --- Boot-to-First-PDF Timer ---
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def time_first_pdf(preload=True, warmup=True, themes='ocean', word_count=100, timeout=120):
+    """
+    Boots gunicorn with gunicorn.conf.py and times: boot until the port answers,
+    and boot until the first /generate PDF is fully received. Returns a dict of milliseconds.
+    """
+    port = _free_port()
+    env = dict(os.environ, GUNICORN_PRELOAD='1' if preload else '0', WARMUP='1' if warmup else '0')
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--bind', f"127.0.0.1:{port}", '--workers', '1',
+                               'app:app'], env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(f"gunicorn did not answer within {timeout}s")
+            try:
+                urllib.request.urlopen(base + '/metrics', timeout=1).read()
+                break
+            except OSError:
+                time.sleep(0.02)
+        listening = time.perf_counter()
+
+        body = urllib.parse.urlencode({'themes': themes, 'word_count': word_count, 'size': 15}).encode()
+        with urllib.request.urlopen(base + '/generate', data=body, timeout=timeout) as response:
+            pdf = response.read()
+        if not pdf.startswith(b'%PDF'):
+            raise RuntimeError("/generate did not return a PDF")
+        done = time.perf_counter()
+        return {
+            'boot_to_listening_ms': round((listening - start) * 1000),
+            'first_request_ms': round((done - listening) * 1000),
+            'boot_to_first_pdf_ms': round((done - start) * 1000),
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold-start profiling for the web app.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    imports = sub.add_parser('imports', help="Import-time profile of the app module")
+    imports.add_argument('--top', type=int, default=25)
+    first = sub.add_parser('first-pdf', help="Time from gunicorn boot to the first served PDF")
+    first.add_argument('--runs', type=int, default=3)
+    first.add_argument('--no-preload', action='store_true')
+    first.add_argument('--no-warmup', action='store_true')
+    first.add_argument('--themes', default='ocean')
+    first.add_argument('--word-count', type=int, default=100)
+    args = parser.parse_args(argv)
+
+    if args.command == 'imports':
+        print_import_profile(import_profile('app'), args.top)
+        return 0
+
+    print(f"{'run':>3} {'listening ms':>13} {'first request ms':>17} {'first PDF ms':>13}")
+    for run in range(1, args.runs + 1):
+        result = time_first_pdf(preload=not args.no_preload, warmup=not args.no_warmup,
+                                themes=args.themes, word_count=args.word_count)
+        print(f"{run:>3} {result['boot_to_listening_ms']:>13} {result['first_request_ms']:>17} "
+              f"{result['boot_to_first_pdf_ms']:>13}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
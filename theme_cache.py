@@ -0,0 +1,220 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# --- Theme Word Cache Configuration ---
+# The on-disk store lives next to the app so every gunicorn worker (separate
+# processes) opens the same SQLite file and shares fetched theme words.
+THEME_CACHE_PATH = os.environ.get(
+    'THEME_CACHE_PATH', os.path.join(os.getcwd(), 'cache', 'theme_words.sqlite3'))
+THEME_CACHE_TTL = int(os.environ.get('THEME_CACHE_TTL', 7 * 24 * 3600))  # seconds
+THEME_CACHE_MAX_ENTRIES = int(os.environ.get('THEME_CACHE_MAX_ENTRIES', 5000))
+THEME_CACHE_MEMORY_ENTRIES = int(os.environ.get('THEME_CACHE_MEMORY_ENTRIES', 512))
+THEME_CACHE_ENABLED = os.environ.get('THEME_CACHE_ENABLED', '1') != '0'
+# Bump whenever the provider parsers change which words they keep; the version is part of the
+# stored source, so entries filtered the old way are never served and simply age out
+THEME_CACHE_VERSION = 2
+_SOURCE_SUFFIX = f":v{THEME_CACHE_VERSION}"
+
+
+class ThemeWordCache:
+    """Two-level (memory + SQLite) cache of per-theme word lists with TTL and size eviction."""
+
+    def __init__(self, path=THEME_CACHE_PATH, ttl=THEME_CACHE_TTL,
+                 max_entries=THEME_CACHE_MAX_ENTRIES, memory_entries=THEME_CACHE_MEMORY_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()  # (source, theme) -> (stored_at, words)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._disk_ok = True
+
+    # --- SQLite Helpers ---
+
+    def _connect(self):
+        """Returns a per-thread connection, creating the table on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        # A short busy timeout lets concurrent workers queue up for the write lock
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS theme_words ("
+            " source TEXT NOT NULL,"
+            " theme TEXT NOT NULL,"
+            " words TEXT NOT NULL,"
+            " stored_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (source, theme))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_theme_words_accessed ON theme_words (accessed_at)")
+        conn.commit()
+        self._local.conn = conn
+        return conn
+
+    def _disk_call(self, fn):
+        """Runs a disk operation, disabling the disk tier (memory-only) if SQLite is unusable."""
+        if not self._disk_ok:
+            return None
+        try:
+            return fn(self._connect())
+        except sqlite3.OperationalError as e:
+            # Locked databases are transient; just skip the disk tier for this call
+            print(f"⚠️ Theme cache disk error: {e}", file=sys.stderr)
+            return None
+        except (sqlite3.DatabaseError, OSError) as e:
+            print(f"⚠️ Theme cache disk disabled: {e}", file=sys.stderr)
+            self._disk_ok = False
+            return None
+
+    # --- Public API ---
+
+    @staticmethod
+    def _key(source, theme):
+        return source + _SOURCE_SUFFIX, theme.strip().lower()
+
+    def get(self, source, theme):
+        """Returns the cached word list for (source, theme), or None on a miss."""
+        key = self._key(source, theme)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return list(entry[1])
+                del self._memory[key]
+
+        def read(conn):
+            row = conn.execute(
+                "SELECT words, stored_at FROM theme_words WHERE source = ? AND theme = ?", key
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] >= self.ttl:
+                conn.execute("DELETE FROM theme_words WHERE source = ? AND theme = ?", key)
+                conn.commit()
+                return None
+            conn.execute(
+                "UPDATE theme_words SET accessed_at = ? WHERE source = ? AND theme = ?", (now,) + key
+            )
+            conn.commit()
+            return row
+
+        row = self._disk_call(read)
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            words = json.loads(row[0])
+            self._remember(key, row[1], words)
+            self.hits += 1
+            self.disk_hits += 1
+            return list(words)
+
+    def set(self, source, theme, words):
+        """Stores a word list in both tiers, evicting the least recently used entries."""
+        key = self._key(source, theme)
+        now = time.time()
+        words = list(words)
+
+        with self._lock:
+            self._remember(key, now, words)
+
+        def write(conn):
+            conn.execute(
+                "INSERT OR REPLACE INTO theme_words (source, theme, words, stored_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                key + (json.dumps(words), now, now)
+            )
+            # Size-based eviction: drop expired rows, then the least recently used overflow
+            cur = conn.execute("DELETE FROM theme_words WHERE stored_at < ?", (now - self.ttl,))
+            evicted = cur.rowcount
+            cur = conn.execute(
+                "DELETE FROM theme_words WHERE rowid IN ("
+                " SELECT rowid FROM theme_words ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            evicted += cur.rowcount
+            conn.commit()
+            return evicted
+
+        evicted = self._disk_call(write)
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+
+    def _remember(self, key, stored_at, words):
+        """Adds an entry to the in-memory LRU tier (caller holds the lock)."""
+        self._memory[key] = (stored_at, words)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def preload(self, limit=None):
+        """Loads the most recently used unexpired disk entries into memory. Returns how many were loaded."""
+        limit = self.memory_entries if limit is None else min(limit, self.memory_entries)
+        cutoff = time.time() - self.ttl
+        rows = self._disk_call(lambda conn: conn.execute(
+            "SELECT source, theme, words, stored_at FROM theme_words WHERE stored_at >= ? AND source LIKE ?"
+            " ORDER BY accessed_at DESC LIMIT ?", (cutoff, '%' + _SOURCE_SUFFIX, limit)).fetchall())
+        if not rows:
+            return 0
+        with self._lock:
+            # Oldest first, so the most recently used entries end up at the LRU's hot end
+            for source, theme, words, stored_at in reversed(rows):
+                self._remember((source, theme), stored_at, json.loads(words))
+        return len(rows)
+
+    def clear(self):
+        """Empties both tiers."""
+        with self._lock:
+            self._memory.clear()
+
+        def wipe(conn):
+            conn.execute("DELETE FROM theme_words")
+            conn.commit()
+
+        self._disk_call(wipe)
+
+    def stats(self):
+        """Returns hit/miss counters for this process plus the shared disk entry count."""
+        disk_entries = self._disk_call(
+            lambda conn: conn.execute("SELECT COUNT(*) FROM theme_words").fetchone()[0])
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'disk_entries': disk_entries,
+                'ttl_seconds': self.ttl,
+                'max_entries': self.max_entries,
+            }
+
+
+# Process-wide cache instance shared by the fetchers in generator.py
+theme_cache = ThemeWordCache() if THEME_CACHE_ENABLED else None
+